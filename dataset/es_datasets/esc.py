@@ -1,6 +1,6 @@
 import json
-import copy
 from base.dataset import EmotionalSupportDataset
+from utils.context import PrefixView, FrozenDict
 
 
 class ESConv(EmotionalSupportDataset):
@@ -58,11 +58,11 @@ class ESConv(EmotionalSupportDataset):
         :return: a list of instances.
         """
         instances = []
-        task_background = {
+        task_background = FrozenDict({
             "emotion_type": conv['emotion_type'],
             "problem_type": conv['problem_type'],
             "situation": conv['situation'],
-        }
+        })
         utts = []
         goals = ["None"]
 
@@ -71,7 +71,7 @@ class ESConv(EmotionalSupportDataset):
             # in the bargain, the user is the seller
             # the system is the buyer
             if utt['speaker'] == 'usr':
-                utts.append({'role': 'user', 'content': utt['text']})
+                utts.append(FrozenDict({'role': 'user', 'content': utt['text']}))
             # the system turn
             elif utt['speaker'] == 'sys':
                 goal = utt['strategy']
@@ -81,13 +81,14 @@ class ESConv(EmotionalSupportDataset):
                     "conv_id": conv_id,
                     "response": utt['text'],
                     "goal": goal,
-                    "pre_goals": copy.deepcopy(goals),
-                    "dialogue_context": copy.deepcopy(utts),
-                    "task_background": copy.deepcopy(task_background),
+                    "pre_goals": PrefixView(goals, len(goals)),
+                    "dialogue_context": PrefixView(utts, len(utts)),
+                    # the task background is shared by all instances of the conversation
+                    "task_background": task_background,
                 }
                 instances.append(instance)
                 # update the dialogue context
-                utts.append({'role': 'assistant', 'content': utt['text']})
+                utts.append(FrozenDict({'role': 'assistant', 'content': utt['text']}))
                 # update the goal path
                 goals.append(goal)
 
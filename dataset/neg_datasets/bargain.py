@@ -1,7 +1,7 @@
 import json
-import copy
 from itertools import product
 from base.dataset import NegotiationDataset
+from utils.context import PrefixView, FrozenDict
 
 
 class CraiglistBargain(NegotiationDataset):
@@ -73,13 +73,13 @@ class CraiglistBargain(NegotiationDataset):
         :return: a list of instances.
         """
         instances = []
-        task_background = {
+        task_background = FrozenDict({
             "item_name": conv['item_name'],
             "buyer_price": conv['buyer_price'],
             "buyer_item_description": conv['buyer_item_description'],
             "seller_price": conv['seller_price'],
             "seller_item_description": conv['seller_item_description']
-        }
+        })
         utts = []
         goals = ["None"]
 
@@ -90,7 +90,7 @@ class CraiglistBargain(NegotiationDataset):
             # in the bargain, the user is the seller
             # the system is the buyer
             if utt['speaker'] == 'usr':
-                utts.append({'role': 'user', 'content': utt['text']})
+                utts.append(FrozenDict({'role': 'user', 'content': utt['text']}))
             # the system turn
             elif utt['speaker'] == 'sys':
                 goal = utt['strategy']
@@ -124,9 +124,10 @@ class CraiglistBargain(NegotiationDataset):
                     "conv_id": conv_id,
                     "response": utt['text'],
                     "goal": goal,
-                    "pre_goals": copy.deepcopy(goals),
-                    "dialogue_context": copy.deepcopy(utts),
-                    "task_background": copy.deepcopy(task_background),
+                    "pre_goals": PrefixView(goals, len(goals)),
+                    "dialogue_context": PrefixView(utts, len(utts)),
+                    # the task background is shared by all instances of the conversation
+                    "task_background": task_background,
                     "done": done,
                     "usr_response": user_res
                 }
@@ -138,7 +139,7 @@ class CraiglistBargain(NegotiationDataset):
                         break
 
                 # update the dialogue context
-                utts.append({'role': 'assistant', 'content': utt['text']})
+                utts.append(FrozenDict({'role': 'assistant', 'content': utt['text']}))
                 # update the goal path
                 goals.append(goal)
         # for instance in instances:
@@ -1,9 +1,9 @@
 import json
 import pickle
 import re
-import copy
 from base.dataset import RecommendationDataset
 from config.constants import DURECDIAL_TARGET_GOALS
+from utils.context import PrefixView, FrozenDict
 
 
 class DuRecdial(RecommendationDataset):
@@ -125,6 +125,8 @@ class DuRecdial(RecommendationDataset):
                 
         # assign the topic set to the task background
         task_background['topic_set'] = list(set(all_topics))
+        # the task background is shared by all instances of the conversation
+        task_background = FrozenDict(task_background)
         
         # greet goal and topic
         self.goals.append("Greetings")
@@ -140,10 +142,10 @@ class DuRecdial(RecommendationDataset):
             self.topics.append(topic)
 
             if role % 2 == 0:
-                utts.append({'role': 'user', 'content': utt})
+                utts.append(FrozenDict({'role': 'user', 'content': utt}))
             # the agent starts the conversaiton.
             elif role == -1:
-                utts.append({'role': 'assistant', 'content': utt})
+                utts.append(FrozenDict({'role': 'assistant', 'content': utt}))
                 goals.append(goal)
                 topics.append(topic)
             # system response
@@ -198,15 +200,15 @@ class DuRecdial(RecommendationDataset):
                     to_target_goal_path = [goal]
                     to_target_topic_path = [topic]
 
-                goal_path = copy.deepcopy(to_target_goal_path)
-                topic_path = copy.deepcopy(to_target_topic_path)
+                goal_path = to_target_goal_path
+                topic_path = to_target_topic_path
 
                 # to_target_goal_path.append(task_background['target_goal'])
                 # to_target_topic_path.append(task_background['target_topic'])
 
                 # reverse the lists.
-                to_target_goal_path.reverse()
-                to_target_topic_path.reverse()
+                to_target_goal_path = goal_path[::-1]
+                to_target_topic_path = topic_path[::-1]
 
                 # constructing an instance.
                 instance = {
@@ -217,10 +219,11 @@ class DuRecdial(RecommendationDataset):
                     "reversed_goals": to_target_goal_path,
                     "reversed_topics": to_target_topic_path,
                     "knowledge": knowledge,
-                    "pre_goals": copy.deepcopy(goals),
-                    "pre_topics": copy.deepcopy(topics),
-                    "dialogue_context": copy.deepcopy(utts),
-                    "task_background": copy.deepcopy(task_background),
+                    "pre_goals": PrefixView(goals, len(goals)),
+                    "pre_topics": PrefixView(topics, len(topics)),
+                    "dialogue_context": PrefixView(utts, len(utts)),
+                    # the task background is shared by all instances of the conversation
+                    "task_background": task_background,
                     "goal_path": goal_path,
                     "topic_path": topic_path,
                     "usr_response": user_res,
@@ -228,7 +231,7 @@ class DuRecdial(RecommendationDataset):
                 }
                 
                 instances.append(instance)
-                utts.append({'role': 'assistant', 'content': utt})
+                utts.append(FrozenDict({'role': 'assistant', 'content': utt}))
                 goals.append(goal)
                 topics.append(topic)
                                 
@@ -1,22 +1,33 @@
+import os
+import bisect
 import json
 import pickle
 import re
-import copy
 import ast
 
 import pandas as pd
 
 from base.dataset import RecommendationDataset
+from utils.context import PrefixView, FrozenDict
+
+YEAR_PATTERN = re.compile(r'\(\d+\)')
 
 
 # from config.constants import DURECDIAL_TARGET_GOALS
 
 
-def get_movie_knowledge(movie_name, movie_db):
-    row = movie_db[movie_db['title'] == movie_name]
-    attributes = ['actors', 'director', 'genre', 'language']
+MOVIE_ATTRIBUTES = ['actors', 'director', 'genre', 'language']
+
+
+def movie_triples(movie_name, row):
+    """
+    function that constructs the knowledge triples of a movie
+    :param movie_name: the title of the movie
+    :param row: the rows of the movie database whose title is the given movie name
+    :return: a list of [movie, attribute, value] triples
+    """
     all_knowledge = []
-    for att in attributes:
+    for att in MOVIE_ATTRIBUTES:
         knowledge = row[att].values
         if len(knowledge) > 10:
             knowledge = knowledge[:1]
@@ -32,10 +43,89 @@ def get_movie_knowledge(movie_name, movie_db):
     return all_knowledge
 
 
-def create_knowledge_base(mentioned_movies, movie_db):
+def get_movie_knowledge(movie_name, movie_db):
+    row = movie_db[movie_db['title'] == movie_name]
+    return movie_triples(movie_name, row)
+
+
+class MovieKnowledgeBase(object):
+
+    def __init__(self, db_path, index_path=None):
+        """
+        constructor for class movie knowledge base
+        the knowledge base maps movie titles to their knowledge triples. the index is built once from the movie
+        database, saved next to it and loaded lazily on the first lookup.
+        :param db_path: the path to the movie database
+        :param index_path: the path to the saved index, by default derived from the database path
+        """
+        self.db_path = db_path
+        self.index_path = index_path if index_path is not None else os.path.splitext(db_path)[0] + ".index.pkl"
+        self.index = None
+
+    def build_index(self):
+        """
+        method that builds the title to triples index from the movie database
+        :return: a dictionary that maps titles to lists of triples
+        """
+        movie_db = read_tsv_file(self.db_path)
+        index = {}
+        for title, row in movie_db.groupby('title', sort=False):
+            index[title] = movie_triples(title, row)
+        return index
+
+    def load(self):
+        """
+        method that loads the index, the index is rebuilt if the movie database has changed
+        :return: a dictionary that maps titles to lists of triples
+        """
+        if self.index is not None:
+            return self.index
+
+        # the index is keyed by the size and the modification time of the movie database
+        stat = os.stat(self.db_path)
+        key = (stat.st_size, stat.st_mtime_ns)
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'rb') as f:
+                saved = pickle.load(f)
+            if saved['key'] == key:
+                self.index = saved['index']
+                return self.index
+
+        self.index = self.build_index()
+        tmp_path = f"{self.index_path}.tmp{os.getpid()}"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'key': key, 'index': self.index}, f)
+        os.replace(tmp_path, self.index_path)
+        return self.index
+
+    def get(self, movie_name):
+        """
+        method that returns the knowledge triples of a movie
+        :param movie_name: the title of the movie
+        :return: a list of triples, empty if the movie is not in the database
+        """
+        return [list(triple) for triple in self.load().get(movie_name, [])]
+
+
+# knowledge bases shared by the train, dev and test splits
+movie_knowledge_bases = {}
+
+
+def get_movie_knowledge_base(db_path):
+    """
+    function that returns the knowledge base of the given movie database, created on the first call
+    :param db_path: the path to the movie database
+    :return: an instance of the movie knowledge base class
+    """
+    if db_path not in movie_knowledge_bases:
+        movie_knowledge_bases[db_path] = MovieKnowledgeBase(db_path)
+    return movie_knowledge_bases[db_path]
+
+
+def create_knowledge_base(mentioned_movies, movie_kb):
     knowledge_base = []
     for movie_name in mentioned_movies:
-        knowledge = get_movie_knowledge(movie_name, movie_db)
+        knowledge = movie_kb.get(movie_name)
         knowledge_base.extend(knowledge)
     return knowledge_base
 
@@ -52,11 +142,42 @@ def read_tsv_file(file_path):
     return df
 
 
-def construct_conversation(temp_df):
-    conv = []
-    for _, row in temp_df.iterrows():
-        conv.append(row['text'])
-    return conv
+def parse_movies(movies):
+    """
+    function that parses the ';' separated list of movies mentioned in an utterance
+    :param movies: the raw movies string, nan if no movie is mentioned
+    :return: a list of movie names
+    """
+    if len(str(movies)) > 4:
+        return [x.strip() for x in movies.split(";")]
+    return []
+
+
+def normalize_topic(topic):
+    """
+    function that removes the release year from a topic and lowercases it
+    :param topic: the topic
+    :return: the normalized topic
+    """
+    if isinstance(topic, str):
+        topic = YEAR_PATTERN.sub('', topic)
+        topic = topic.lower()
+    return topic
+
+
+def parse_turns(df):
+    """
+    function that parses the columns of the dataframe once for all utterances
+    :param df: the dataframe of the INSPIRED dataset
+    :return: the dataframe with the parsed speaker, movie list and normalized topic columns
+    """
+    df = df.copy()
+    df['speaker'] = df['speaker'].str.lower()
+    df['movie_list'] = df['movies'].map(parse_movies)
+    # the topic of a turn is the first mentioned movie, otherwise the goal
+    df['topic'] = [movies[0] if len(movies) > 0 else goal for movies, goal in zip(df['movie_list'], df['expert_label'])]
+    df['topic'] = df['topic'].map(normalize_topic)
+    return df
 
 
 class Inspired(RecommendationDataset):
@@ -91,14 +212,13 @@ class Inspired(RecommendationDataset):
         Returns:
             _type_: list of dictionary each element corresponds to a repurposed conversation,
         """
-        all_dialogue_ids = df['dialog_id'].unique()
-        # group all examples by their conversation ids
-        df = df.groupby('dialog_id').apply(lambda x: x)
+        # parse the movies and topics of all utterances once
+        df = parse_turns(df)
         new_data = []
 
-        movie_db = read_tsv_file(self.db_path)
-        for id in all_dialogue_ids:
-            temp_df = df[df['dialog_id'] == id]
+        movie_kb = get_movie_knowledge_base(self.db_path)
+        # group all examples by their conversation ids, keeping the order of the conversations
+        for id, temp_df in df.groupby('dialog_id', sort=False):
             target_goal = None
 
             # convert string to dict
@@ -117,22 +237,27 @@ class Inspired(RecommendationDataset):
             except:
                 print(temp_movie_dict)
 
+            turns = {
+                "speaker": temp_df['speaker'].tolist(),
+                "text": temp_df['text'].tolist(),
+                "goal": temp_df['expert_label'].tolist(),
+                "movies": temp_df['movie_list'].tolist(),
+                "topic": temp_df['topic'].tolist()
+            }
+
             check = False
             all_mentioned_movies = []
+            target_name = target_topic.split('(')[0].strip().lower()
             # get target goal and topic
-            for _, row in temp_df.iterrows():
+            for speaker, text, goal, mentioned_movies in zip(turns['speaker'], turns['text'], turns['goal'],
+                                                             turns['movies']):
                 # mentioned movies ảe not nan and the current utterance is belong to the recommender.
-                if len(str(row['movies'])) > 4 and row['speaker'].lower() == 'recommender':
-
-                    # get mentioned movies in the current utterance.
-                    mentioned_movies = row['movies'].split(";")
-                    mentioned_movies = [x.strip() for x in mentioned_movies]
+                if len(mentioned_movies) > 0 and speaker == 'recommender':
                     all_mentioned_movies.extend(mentioned_movies)
 
                     # if the target topic in the mentioned movies
-                    if target_topic in mentioned_movies and target_topic.split('(')[0].strip().lower() in row[
-                        'text'].lower():
-                        target_goal = row['expert_label']
+                    if target_topic in mentioned_movies and target_name in text.lower():
+                        target_goal = goal
                         check = True
             # if we can not find the target.
             if not check:
@@ -140,21 +265,20 @@ class Inspired(RecommendationDataset):
 
             # constructing the knowledge base
             all_mentioned_movies = [x.split("(")[0].strip() for x in all_mentioned_movies]
-            knowledge_base = create_knowledge_base(all_mentioned_movies, movie_db)
+            knowledge_base = create_knowledge_base(all_mentioned_movies, movie_kb)
 
-            target_topic = re.sub(r'\(\d+\)', '', target_topic)
-            target_topic = target_topic.lower()
+            target_topic = normalize_topic(target_topic)
 
             new_data.append({
-                "conv": temp_df,
+                "turns": turns,
                 "knowledge": knowledge_base,
                 "target_goal": target_goal,
                 "target_topic": target_topic,
-                "conversation": construct_conversation(temp_df),
+                "conversation": turns['text'],
                 "user_profile": {},
 
                 # just for convenience
-                "goal_type_list": ["Greetings"] if temp_df.iloc[0]['speaker'].lower() == 'recommender' else [""]
+                "goal_type_list": ["Greetings"] if turns['speaker'][0] == 'recommender' else [""]
             })
 
         return new_data
@@ -186,101 +310,52 @@ class Inspired(RecommendationDataset):
         """
         # get the conversations
         instances = []
-        history = [{'role': 'user', 'content': ''}]
+        history = [FrozenDict({'role': 'user', 'content': ''})]
         turn_id = 0
-        temp_df = conv['conv']
-        task_background = {
+        turns = conv['turns']
+        task_background = FrozenDict({
             "target_goal": conv['target_goal'],
             "target_topic": conv['target_topic'],
             "user_profile": conv['user_profile'],
-        }
+        })
         goals = []
         topics = []
-        for idx, row in temp_df.iterrows():
-            if row['speaker'].lower() == 'seeker':
-                history.append({'role': 'user', 'content': row['text']})
 
-            if row['speaker'].lower() == 'recommender' and row['expert_label'] == 'no_strategy':
-                history.append({'role': 'recommender', 'content': row['text']})
+        # a single reverse pass to find the last turn with the target goal and topic
+        # the target paths of all turns end at this turn.
+        tmp = len(turns['speaker']) - 1
+        while tmp > 0:
+            if turns['goal'][tmp] == task_background['target_goal'] and \
+                    turns['topic'][tmp] == task_background['target_topic']:
+                break
+            tmp -= 1
 
-            if row['speaker'].lower() == 'recommender':
-                # create an example here.
-                if len(str(row['movies'])) > 4:
-                    mentioned_movies = row['movies'].split(";")
-                    mentioned_movies = [x.strip() for x in mentioned_movies]
-                else:
-                    mentioned_movies = []
+        # positions of the recommender turns, used to slice the target paths
+        recommender_ids = [i for i, speaker in enumerate(turns['speaker']) if speaker == 'recommender']
+        path_end = bisect.bisect_right(recommender_ids, tmp)
+
+        for idx, speaker in enumerate(turns['speaker']):
+            if speaker == 'seeker':
+                history.append(FrozenDict({'role': 'user', 'content': turns['text'][idx]}))
 
-                to_target_goal_path = []
-                to_target_topic_path = []
+            if speaker == 'recommender' and turns['goal'][idx] == 'no_strategy':
+                history.append(FrozenDict({'role': 'recommender', 'content': turns['text'][idx]}))
+
+            if speaker == 'recommender':
+                # create an example here.
+                mentioned_movies = turns['movies'][idx]
 
                 # goal is the sociable strategy
-                goal = row['expert_label']
+                goal = turns['goal'][idx]
 
                 # topic is the first mentioned movie
                 # if these is no mentioned movie, the topic is the goal
                 topic = mentioned_movies[0] if len(mentioned_movies) > 0 else goal
 
-                # creating the reversed goal, topic paths
-                tmp = len(temp_df) - 1
-                while tmp > 0:
-                    # get the specific turn tmp-th in the conversation.
-                    tmp_row = temp_df.iloc[tmp]
-                    # get the coressponding topic of that turn.
-                    if len(str(tmp_row['movies'])) > 4:
-                        tmp_mentioned_movies = tmp_row['movies'].split(";")
-                        tmp_mentioned_movies = [x.strip() for x in tmp_mentioned_movies]
-                    else:
-                        tmp_mentioned_movies = []
-
-                    # get the goal and topic
-                    tmp_goal = tmp_row['expert_label']
-                    tmp_topic = tmp_mentioned_movies[0] if len(tmp_mentioned_movies) > 0 else tmp_goal
-
-                    if isinstance(tmp_topic, str):
-                        tmp_topic = re.sub(r'\(\d+\)', '', tmp_topic)
-                        tmp_topic = tmp_topic.lower()
-
-                        # print(tmp_goal, tmp_topic, tmp, task_background['target_goal'], task_background['target_topic'] )
-
-                    # if the tmp_goal is the target goal and tmp_topic is the target topic
-                    if tmp_goal == task_background['target_goal'] and \
-                            tmp_topic == task_background['target_topic']:
-                        # we break the loop
-                        # print('in here', tmp_topic)
-                        # assert 1==0
-                        break
-                    tmp -= 1
-
-                # loop until we meet the target goal, topic
-                # increase the tmp idx
-                # append the goal, topic to the paths.
-                tmp_idx = turn_id
-                # print(tmp, tmp_idx)
-                # assert 1==0
-                while tmp_idx <= tmp:
-                    tmp_row = temp_df.iloc[tmp_idx]
-                    # if this is the recommender turn
-                    if tmp_row['speaker'].lower() == 'recommender':
-                        # we get the goal and topic
-                        if len(str(tmp_row['movies'])) > 4:
-                            tmp_mentioned_movies = tmp_row['movies'].split(";")
-                            tmp_mentioned_movies = [x.strip() for x in tmp_mentioned_movies]
-                        else:
-                            tmp_mentioned_movies = []
-
-                        # get the goal and topic
-                        tmp_goal = tmp_row['expert_label']
-                        tmp_topic = tmp_mentioned_movies[0] if len(tmp_mentioned_movies) > 0 else tmp_goal
-
-                        # preprocess the tmp topic
-                        tmp_topic = re.sub(r'\(\d+\)', '', tmp_topic)
-                        tmp_topic = tmp_topic.lower()
-
-                        # append the goal and topic to the target_paths
-                        to_target_goal_path.append(tmp_goal)
-                        to_target_topic_path.append(tmp_topic)
-                    tmp_idx += 1
+                # the goal, topic paths of the recommender turns from turn_id to the target turn
+                path_ids = recommender_ids[bisect.bisect_left(recommender_ids, turn_id):path_end]
+                to_target_goal_path = [turns['goal'][i] for i in path_ids]
+                to_target_topic_path = [turns['topic'][i] for i in path_ids]
 
                 # append the target goal, topic to the end of the list
                 # to_target_topic_path.append(task_background['target_topic'])
@@ -294,22 +369,22 @@ class Inspired(RecommendationDataset):
                 # print(to_target_topic_path)
                 # assert 1==0
 
-                goal_path = copy.deepcopy(to_target_goal_path)
-                topic_path = copy.deepcopy(to_target_topic_path)
+                goal_path = to_target_goal_path
+                topic_path = to_target_topic_path
 
                 # to_target_goal_path.append(task_background['target_goal'])
                 # to_target_topic_path.append(task_background['target_topic'])
 
                 # reverse the lists.
-                to_target_goal_path.reverse()
-                to_target_topic_path.reverse()
+                to_target_goal_path = goal_path[::-1]
+                to_target_topic_path = topic_path[::-1]
 
                 # use regex to preprocess topic
-                topic = re.sub(r'\(\d+\)', '', topic)
+                topic = YEAR_PATTERN.sub('', topic)
                 topic = topic.lower()
 
                 # response is the current text
-                res = process_text(row['text'])
+                res = process_text(turns['text'][idx])
 
                 # get the action path to the target
                 # creata the path from the next action to the target action
@@ -346,9 +421,9 @@ class Inspired(RecommendationDataset):
                     'turn_id': turn_id,
 
                     # hittorical goal and action path
-                    'pre_goals': copy.deepcopy(goals),
-                    'pre_topics': copy.deepcopy(topics),
-                    'dialogue_context': copy.deepcopy(history),
+                    'pre_goals': PrefixView(goals, len(goals)),
+                    'pre_topics': PrefixView(topics, len(topics)),
+                    'dialogue_context': PrefixView(history, len(history)),
                     'response': res,
 
                     # customized knowledge base for INSPIRED.
@@ -383,6 +458,6 @@ class Inspired(RecommendationDataset):
 
                 topics.append(topic)
                 goals.append(goal)
-                history.append({'role': 'assistant', 'content': res})
+                history.append(FrozenDict({'role': 'assistant', 'content': res}))
                 turn_id += 1
         return instances
@@ -2,6 +2,7 @@ import os
 import json
 
 from base.logger import Logger
+from utils.context import to_serializable
 
 
 class FileLogger(Logger):
@@ -108,6 +109,6 @@ class FileLogger(Logger):
                 # make the each record is in dictionary format
                 assert isinstance(instance, dict)
                 # convert dictionary to string
-                json_string = json.dumps(instance)
+                json_string = json.dumps(instance, default=to_serializable)
                 # save the json string to file
                 f.write(json_string + "\n")
@@ -15,6 +15,10 @@ class ContextualMODPLConfig(ModelConfig):
     run_offline_eval = True
     run_online_eval = True
     sampled_times = 10
+    # number of game steps (llm calls) executed concurrently during rl sampling
+    n_rollout_workers = 1
+    # number of conversations simulated concurrently during online evaluation
+    n_eval_workers = 1
     gamma = 0.99
     epsilon = 1.0
     num_train_rl_epochs = 100
@@ -24,8 +28,17 @@ class ContextualMODPLConfig(ModelConfig):
     preference_learning_rate = 5e-4
     num_train_preference_epochs = 3
     preference_warmup_steps = 200
+    # number of trajectory states encoded in one forward pass during preference training
+    preference_encode_batch_size = 64
     freeze_plm = True
     objective_embedding_size = 6
+
+    # cache of the frozen plm state embeddings
+    # evicted embeddings are spilled to a memory-mapped file if state_cache_dir is given
+    use_state_cache = True
+    state_cache_size = 50000
+    state_cache_dir = None
+    state_cache_spill_size = 500000
     reward_hidden_size = 64
     mlp_hidden_size = 128
 
@@ -42,12 +55,23 @@ class ContextualMODPLConfig(ModelConfig):
 
     # number of sampled preferences
     n_preferences = 128
+    # number of quantized preferences generated at once by the preference sampler
+    preference_pool_size = 10000
+    # True if the sampled preferences are a low-discrepancy cover of the weight simplex
+    stratified_preferences = False
     objective_weight = None
     
     # hyper parameters for controlling the gpi step
     alpha = 0.7
     task_eps = 0.1
     use_gpi = True
+    # number of preferences processed at once by the gpi operators, all preferences if None
+    gpi_chunk_size = None
+
+    # target network update
+    # tau = 1.0 copies the parameters every target_update_interval steps, tau < 1.0 is a polyak update
+    target_update_tau = 1.0
+    target_update_interval = 1
 
     # preference and ppo buffer length
     preference_buffer_length = 512
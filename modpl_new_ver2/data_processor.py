@@ -1,4 +1,4 @@
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 import torch
 import numpy as np
 import re
@@ -19,6 +19,115 @@ def generate_bins(low, high, n):
     return bins
 
 
+class ContextEncoder(object):
+
+    def __init__(self, max_segments=200000, max_contexts=20000):
+        """
+        constructor for class context encoder
+        the encoder caches the token ids of text segments (the context prefix and the utterances) and the token ids
+        of encoded dialogue contexts. a context is encoded incrementally by appending the ids of its new utterances
+        to the ids of its longest cached prefix.
+        only utterances which start with a special (role) token are encoded as separate segments, since special
+        tokens delimit the tokenizer's segments the result is identical to tokenizing the whole input string.
+        :param max_segments: the maximum number of cached text segments
+        :param max_contexts: the maximum number of cached dialogue contexts
+        """
+        self.max_segments = max_segments
+        self.max_contexts = max_contexts
+        self.segment_cache = OrderedDict()
+        # hash of the dialogue prefix -> (dialogue prefix, token ids)
+        self.context_cache = OrderedDict()
+
+    def tokenize(self, tokenizer, text):
+        """
+        method that converts a text segment to token ids
+        :param tokenizer: a huggingface tokenizer
+        :param text: the text segment
+        :return: a list of token ids
+        """
+        key = (tokenizer.name_or_path, len(tokenizer), text)
+        if key in self.segment_cache:
+            self.segment_cache.move_to_end(key)
+            return self.segment_cache[key]
+        ids = tokenizer.convert_tokens_to_ids(tokenizer.tokenize(text))
+        self.segment_cache[key] = ids
+        if len(self.segment_cache) > self.max_segments:
+            self.segment_cache.popitem(last=False)
+        return ids
+
+    def split_segments(self, tokenizer, prefix_str, utterances):
+        """
+        method that splits a dialogue context into segments which can be tokenized independently
+        an utterance which does not start with a special token is merged into the preceding segment.
+        :param tokenizer: a huggingface tokenizer
+        :param prefix_str: the text preceding the dialogue context
+        :param utterances: a list of utterance strings
+        :return: a list of segments, the first one contains the prefix string
+        """
+        special_tokens = tuple(tokenizer.all_special_tokens)
+        segments = [prefix_str]
+        for utt in utterances:
+            if utt.startswith(special_tokens):
+                segments.append(utt)
+            else:
+                segments[-1] += utt
+        return segments
+
+    def encode(self, tokenizer, prefix_str, utterances, max_sequence_length=512):
+        """
+        method that encodes a dialogue context
+        :param tokenizer: a huggingface tokenizer
+        :param prefix_str: the text preceding the dialogue context
+        :param utterances: a list of utterance strings, usually each one starts with a role token
+        :param max_sequence_length: max sequence length
+        :return: the list of token ids, truncated and wrapped with the cls and sep tokens
+        """
+        segments = self.split_segments(tokenizer, prefix_str, utterances)
+        dialogue = (tokenizer.name_or_path, len(tokenizer)) + tuple(segments)
+
+        # the key of each dialogue prefix is chained from the key of the previous one
+        # the dialogue prefix is stored along with its ids and compared on a hit, since hashes can collide
+        keys = []
+        key = hash(dialogue[:3])
+        keys.append(key)
+        for segment in segments[1:]:
+            key = hash((key, segment))
+            keys.append(key)
+
+        # look up the longest cached dialogue prefix
+        n_cached = len(keys) - 1
+        while n_cached >= 0:
+            entry = self.context_cache.get(keys[n_cached])
+            if entry is not None and entry[0] == dialogue[:n_cached + 3]:
+                break
+            n_cached -= 1
+
+        if n_cached >= 0:
+            self.context_cache.move_to_end(keys[n_cached])
+            ids = self.context_cache[keys[n_cached]][1]
+        else:
+            n_cached = 0
+            ids = self.tokenize(tokenizer, segments[0])
+
+        # only the new segments are tokenized
+        if n_cached < len(keys) - 1:
+            ids = list(ids)
+            for segment in segments[n_cached + 1:]:
+                ids.extend(self.tokenize(tokenizer, segment))
+            self.context_cache[keys[-1]] = (dialogue, ids)
+            if len(self.context_cache) > self.max_contexts:
+                self.context_cache.popitem(last=False)
+
+        # the truncation is applied at the end
+        input_ids = ids[-(max_sequence_length - 2):]
+        input_ids = [tokenizer.cls_token_id] + input_ids + [tokenizer.sep_token_id]
+        return input_ids
+
+
+# the context encoder shared by the data processors
+context_encoder = ContextEncoder()
+
+
 class ContextualMODPLDataProcessorForRecommendation(DataProcessorForRecommendation):
 
     def __call__(self, tokenizer, instance, max_sequence_length=512, action_to_id=None, n_objectives=3):
@@ -49,13 +158,14 @@ class ContextualMODPLDataProcessorForRecommendation(DataProcessorForRecommendati
             w = np.array([x for t in range(n_objectives)])
 
         # processing the dialogue context
-        dialogue_str = ""
+        utterances = []
         for utt in dialogue_context:
             if utt['role'] == "user":
-                dialogue_str += USER_TOKEN
+                utterances.append(USER_TOKEN + utt['content'])
             elif utt['role'] == 'assistant':
-                dialogue_str += SYSTEM_TOKEN
-            dialogue_str += utt['content']
+                utterances.append(SYSTEM_TOKEN + utt['content'])
+            else:
+                utterances.append(utt['content'])
 
         # processing the previous planned path
         path_str = ""
@@ -67,10 +177,8 @@ class ContextualMODPLDataProcessorForRecommendation(DataProcessorForRecommendati
             path_str += SEP_TOKEN
 
         # convert features to token ids
-        input_str = f"{PATH_TOKEN}: {path_str} {TARGET}: {target_goal} {target} {CONTEXT_TOKEN}: {dialogue_str}"
-        input_ids = tokenizer.convert_tokens_to_ids(tokenizer.tokenize(input_str))
-        input_ids = input_ids[-(max_sequence_length - 2):]
-        input_ids = [tokenizer.cls_token_id] + input_ids + [tokenizer.sep_token_id]
+        prefix_str = f"{PATH_TOKEN}: {path_str} {TARGET}: {target_goal} {target} {CONTEXT_TOKEN}: "
+        input_ids = context_encoder.encode(tokenizer, prefix_str, utterances, max_sequence_length)
 
         goals_to_ids, _ = action_to_id
         # we only predict the goal
@@ -218,13 +326,14 @@ class ContextualMODPLDataProcessorForNegotiation(DataProcessorForNegotiation):
             w = np.array([x for t in range(n_objectives)])
 
         # processing the dialogue context
-        dialogue_str = ""
+        utterances = []
         for utt in dialogue_context:
             if utt['role'] == "user":
-                dialogue_str += SELLER_TOKEN
+                utterances.append(SELLER_TOKEN + utt['content'])
             elif utt['role'] == 'assistant':
-                dialogue_str += BUYER_TOKEN
-            dialogue_str += utt['content']
+                utterances.append(BUYER_TOKEN + utt['content'])
+            else:
+                utterances.append(utt['content'])
 
         # processing the previous planned path
         path_str = ""
@@ -236,10 +345,8 @@ class ContextualMODPLDataProcessorForNegotiation(DataProcessorForNegotiation):
             path_str += SEP_TOKEN
 
         # convert features to token ids
-        input_str = f"{PATH_TOKEN}: {path_str} {CONTEXT_TOKEN}: {dialogue_str}"
-        input_ids = tokenizer.convert_tokens_to_ids(tokenizer.tokenize(input_str))
-        input_ids = input_ids[-(max_sequence_length - 2):]
-        input_ids = [tokenizer.cls_token_id] + input_ids + [tokenizer.sep_token_id]
+        prefix_str = f"{PATH_TOKEN}: {path_str} {CONTEXT_TOKEN}: "
+        input_ids = context_encoder.encode(tokenizer, prefix_str, utterances, max_sequence_length)
 
         # the ground truth label
         buyer_price = instance['task_background']['buyer_price']
@@ -304,13 +411,14 @@ class ContextualMODPLDataProcessorForEmotionalSupport(DataProcessorForEmotionalS
             w = np.array([x for t in range(n_objectives)])
 
         # processing the dialogue context
-        dialogue_str = ""
+        utterances = []
         for utt in dialogue_context:
             if utt['role'] == "user":
-                dialogue_str += SEEKER_TOKEN
+                utterances.append(SEEKER_TOKEN + utt['content'])
             elif utt['role'] == 'assistant':
-                dialogue_str += SUPPORTER_TOKEN
-            dialogue_str += utt['content']
+                utterances.append(SUPPORTER_TOKEN + utt['content'])
+            else:
+                utterances.append(utt['content'])
 
         # processing the previous planned path
         path_str = ""
@@ -320,10 +428,8 @@ class ContextualMODPLDataProcessorForEmotionalSupport(DataProcessorForEmotionalS
             path_str += SEP_TOKEN
 
         # convert features to token ids
-        input_str = f"{PATH_TOKEN}: {path_str} {CONTEXT_TOKEN}: {dialogue_str}"
-        input_ids = tokenizer.convert_tokens_to_ids(tokenizer.tokenize(input_str))
-        input_ids = input_ids[-(max_sequence_length - 2):]
-        input_ids = [tokenizer.cls_token_id] + input_ids + [tokenizer.sep_token_id]
+        prefix_str = f"{PATH_TOKEN}: {path_str} {CONTEXT_TOKEN}: "
+        input_ids = context_encoder.encode(tokenizer, prefix_str, utterances, max_sequence_length)
 
         # the ground truth label
         label = action_to_id[instance['goal']]
@@ -1,9 +1,12 @@
+import copy
+
 import torch
 import torch.nn as nn
 from torch.distributions import Categorical
 from transformers import AutoTokenizer, AutoModel
 
 from base.model import Model
+from utils.cache import EmbeddingCache, hash_token_ids
 
 from loguru import logger
 
@@ -34,6 +37,15 @@ class ContextualMODPLModel(Model):
             for name, params in self.plm.named_parameters():
                 params.requires_grad_(False)
 
+        # content-addressed cache of the state embeddings
+        # only valid if the parameters of the pretrained language model are frozen
+        self.state_cache = None
+        if self.model_config.freeze_plm and self.model_config.use_state_cache:
+            self.state_cache = EmbeddingCache(dim=self.model_config.lm_size,
+                                              max_entries=self.model_config.state_cache_size,
+                                              spill_dir=self.model_config.state_cache_dir,
+                                              max_spill_entries=self.model_config.state_cache_spill_size)
+
         self.drop_out = nn.Dropout(p=self.model_config.dropout)
 
         # objective embedding
@@ -122,13 +134,65 @@ class ContextualMODPLModel(Model):
         else:
             raise Exception("Forward function only used for pretraining")
 
+    def encode_state(self, features):
+        """
+        method that computes the cls embeddings of a batch of padded states
+        if the state cache is enabled, embeddings of previously encoded states are looked up
+        and the plm is only run on the remaining states.
+        :param features: a dictionary of input_ids and attention_mask
+        :return: a tensor of shape [bs, lm_size]
+        """
+        if self.state_cache is None:
+            return self.plm(**features)[0][:, 0, :]
+
+        input_ids = features['input_ids']
+        attention_mask = features['attention_mask']
+        lengths = attention_mask.sum(dim=-1).tolist()
+
+        # looking up the cache using the unpadded token ids
+        keys = [hash_token_ids(input_ids[i, :lengths[i]]) for i in range(input_ids.size(0))]
+        embeddings = [self.state_cache.get(key) for key in keys]
+        miss_ids = [i for i, embedding in enumerate(embeddings) if embedding is None]
+
+        # encoding the missing states in one forward pass
+        # the plm is run in eval mode so that the cached embedding only depends on the token ids
+        if len(miss_ids) > 0:
+            max_length = max([lengths[i] for i in miss_ids])
+            miss_features = {
+                "input_ids": input_ids[miss_ids, :max_length],
+                "attention_mask": attention_mask[miss_ids, :max_length]
+            }
+            is_training = self.plm.training
+            self.plm.eval()
+            with torch.no_grad():
+                miss_embeddings = self.plm(**miss_features)[0][:, 0, :]
+            self.plm.train(is_training)
+
+            for i, embedding in zip(miss_ids, miss_embeddings):
+                self.state_cache.put(keys[i], embedding)
+                embeddings[i] = embedding
+
+        return torch.stack([embedding.to(input_ids.device) for embedding in embeddings], dim=0)
+
+    def load_state_dict(self, state_dict, strict=True):
+        """
+        method that loads the parameters of the model
+        cached state embeddings are removed since the parameters of the plm might have changed
+        :param state_dict: the state dict of the model
+        :param strict: whether to strictly enforce that the keys match
+        :return: the missing and unexpected keys
+        """
+        if self.state_cache is not None:
+            self.state_cache.clear()
+        return super().load_state_dict(state_dict, strict=strict)
+
     def compute_features(self, batch):
         """
         function that estimate the reward for a particular state and preference
         :return: a float score indicating the reward for the current turn.
         """
         # computing state feature
-        state = self.plm(**batch['next_state'])[0][:, 0, :]
+        state = self.encode_state(batch['next_state'])
         # objective embedding
         state = self.projector(state)
         # compute the feature representation a.k.a estimated reward
@@ -169,22 +233,31 @@ class ContextualMODPLModel(Model):
         :param w: a batch of sampled preference computed using the sample_preference method.
         :return:
         """
-        # no further gradient update on the objective embedding or the backbone plm
+        state, next_state = self.compute_states(batch)
+        # only update the objective embedding and the projector
+        objective_embedding = self.objective_embedding(w)
+        return state, next_state, objective_embedding
+
+    def compute_states(self, batch):
+        """
+        method that computes the projected representations of the states and the next states of a batch
+        the representations do not depend on the preferences, thus they can be shared by several preference chunks.
+        :param batch: the features of the given states
+        :return: the state representations and the next state representations (None if there are no next states)
+        """
+        # no further gradient update on the backbone plm
         with torch.no_grad():
-            state = self.plm(**batch['context'])[0][:, 0, :]
+            state = self.encode_state(batch['context'])
             # cls token as the state
             if 'next_state' in batch:
-                next_state = self.plm(**batch['next_state'])[0][:, 0, :]
+                next_state = self.encode_state(batch['next_state'])
                 next_state = self.projector(next_state)
             else:
                 next_state = None
 
-        # only update the objective embedding and the projector
-        objective_embedding = self.objective_embedding(w)
+        # only update the projector
         state = self.projector(state)
-
-        # applying the dropout layer
-        return state, next_state, objective_embedding
+        return state, next_state
 
     def compute_state_value(self, state, objective_embedding):
         """
@@ -212,3 +285,48 @@ class ContextualMODPLModel(Model):
         dist = Categorical(action_probs)
         action = dist.sample()
         return dist.log_prob(action)
+
+
+class ContextualMODPLTargetNetwork(nn.Module):
+
+    def __init__(self, model):
+        """
+        constructor for class target network
+        the target network only clones the trainable heads of the given model, the frozen plm is not copied.
+        :param model: an instance of the contextual MODPL model
+        """
+        super().__init__()
+        self.projector = copy.deepcopy(model.projector)
+        self.objective_embedding = copy.deepcopy(model.objective_embedding)
+        self.actor = copy.deepcopy(model.actor)
+
+        # the target network is never updated by the optimizer
+        for params in self.parameters():
+            params.requires_grad_(False)
+
+    def heads(self, model):
+        """
+        method that pairs the heads of the target network with the heads of the given model
+        :param model: an instance of the contextual MODPL model
+        :return: a list of (target module, online module) pairs
+        """
+        return [
+            (self.projector, model.projector),
+            (self.objective_embedding, model.objective_embedding),
+            (self.actor, model.actor)
+        ]
+
+    @torch.no_grad()
+    def update(self, model, tau=1.0):
+        """
+        method that updates the parameters of the target network in place
+        :param model: an instance of the contextual MODPL model
+        :param tau: the polyak coefficient, 1.0 means a hard update i.e. copying the parameters
+        :return: None
+        """
+        for target_module, module in self.heads(model):
+            for target_params, params in zip(target_module.parameters(), module.parameters()):
+                if tau >= 1.0:
+                    target_params.copy_(params)
+                else:
+                    target_params.mul_(1.0 - tau).add_(params, alpha=tau)
@@ -2,7 +2,6 @@ import copy
 import math
 import os
 import random
-from itertools import count
 
 from tqdm import tqdm
 import numpy as np
@@ -17,13 +16,18 @@ from transformers import AdamW, get_linear_schedule_with_warmup
 
 from modpl_new_ver2.data_processor import ContextualMODPLDataProcessorForRecommendation, ContextualMODPLTorchDataset, \
     ContextualMODPLDataProcessorForNegotiation, ContextualMODPLDataProcessorForEmotionalSupport
+from modpl_new_ver2.model import ContextualMODPLTargetNetwork
 from base.trainer import Trainer
 from logger.wandb_logger import WanDBLogger
 from logger.terminal_logger import TerminalLogger
 from logger.file_logger import FileLogger
 
 from utils.game import save_conversation_for_human_evaluation
-from utils.game import random_weights
+from utils.game import random_weights, PreferenceSampler
+from utils.rollout import RolloutEngine
+import utils.prompt as prompt_utils
+from utils.buffer import ReplayBuffer
+from utils.gpi import scalarize, gpi_scores, envelope_scores, gather_action_values
 
 from collections import deque
 from collections import defaultdict
@@ -100,6 +104,19 @@ class ContextualMODPLTrainer(Trainer):
         self.model = accelerator.unwrap_model(self.model)
         self.tokenizer = self.model.tokenizer
 
+        # the target network used in the actor training step
+        self.target_model = None
+
+        # the sampler of preference weight vectors used for rl sampling, actor training and gpi
+        self.preference_sampler = PreferenceSampler(self.model_config.n_objectives,
+                                                    pool_size=self.model_config.preference_pool_size,
+                                                    seed=self.game_config.seed,
+                                                    stratified=self.model_config.stratified_preferences)
+
+        # the data processor and the inverse action mapping used at inference time
+        self.data_processor = None
+        self.inverse_action_mapping_cache = None
+
     def process_dataset(self, dataset):
         """
         method that process the given dataset and return processed data instances
@@ -117,18 +134,6 @@ class ContextualMODPLTrainer(Trainer):
         :param num_workers: number of workers used for loading the dataset
         :return: a instance of torch dataloader class
         """
-
-        # the data processor for the  recommendation scenario
-        if self.game_config.name == RECOMMENDATION:
-            convert_example_to_feature = ContextualMODPLDataProcessorForRecommendation
-        # the data processor for the negotiation scenario
-        elif self.game_config.name == NEGOTIATION:
-            convert_example_to_feature = ContextualMODPLDataProcessorForNegotiation
-        # the data processor for the emotional support conversation
-        elif self.game_config.name == EMOTIONAL_SUPPORT:
-            convert_example_to_feature = ContextualMODPLDataProcessorForEmotionalSupport
-        else:
-            raise Exception("Invalid scenario....")
         # construct the torch dataset
         torch_dataset = ContextualMODPLTorchDataset(
             tokenizer=self.tokenizer,
@@ -137,7 +142,7 @@ class ContextualMODPLTrainer(Trainer):
             max_sequence_length=self.model_config.max_sequence_length,
             device=self.device,
             n_objectives=self.model_config.n_objectives,
-            convert_example_to_feature=convert_example_to_feature()
+            convert_example_to_feature=self.get_data_processor()
         )
         # construct the data loader
         dataloader = DataLoader(
@@ -149,6 +154,79 @@ class ContextualMODPLTrainer(Trainer):
         )
         return dataloader
 
+    def get_data_processor(self):
+        """
+        method that returns the data processor of the current scenario
+        :return: an instance of the data processor class
+        """
+        if self.data_processor is None:
+            # the data processor for the  recommendation scenario
+            if self.game_config.name == RECOMMENDATION:
+                self.data_processor = ContextualMODPLDataProcessorForRecommendation()
+            # the data processor for the negotiation scenario
+            elif self.game_config.name == NEGOTIATION:
+                self.data_processor = ContextualMODPLDataProcessorForNegotiation()
+            # the data processor for the emotional support conversation
+            elif self.game_config.name == EMOTIONAL_SUPPORT:
+                self.data_processor = ContextualMODPLDataProcessorForEmotionalSupport()
+            else:
+                raise Exception("Invalid scenario....")
+        return self.data_processor
+
+    def get_inverse_action_mapping(self, action_mapping):
+        """
+        method that returns the mapping from indexes to actions
+        the inverse mapping is only recomputed if a different action mapping is given
+        :param action_mapping: a dictionary that maps action to index
+        :return: a dictionary that maps index to action
+        """
+        if self.inverse_action_mapping_cache is None or self.inverse_action_mapping_cache[0] is not action_mapping:
+            if isinstance(action_mapping, tuple):
+                inverse_action_mapping = {v: k for k, v in action_mapping[0].items()}
+            else:
+                inverse_action_mapping = {v: k for k, v in action_mapping.items()}
+            self.inverse_action_mapping_cache = (action_mapping, inverse_action_mapping)
+        return self.inverse_action_mapping_cache[1]
+
+    def collate_state(self, instance, action_mapping):
+        """
+        method that converts a single state to a batch of tensors without constructing a data loader
+        :param instance: the given state
+        :param action_mapping: a dictionary that maps action to index
+        :return: a batch which contains the input features of the state
+        """
+        return self.collate_states([instance], action_mapping)
+
+    def collate_states(self, instances, action_mapping):
+        """
+        method that converts a list of states to a right-padded batch of tensors without constructing a data loader
+        :param instances: a list of states
+        :param action_mapping: a dictionary that maps action to index
+        :return: a batch which contains the input features of the states
+        """
+        data_processor = self.get_data_processor()
+        all_input_ids = []
+        for instance in instances:
+            input_ids, _, _, _ = data_processor(self.tokenizer, instance,
+                                                self.model_config.max_sequence_length,
+                                                action_mapping,
+                                                self.model_config.n_objectives)
+            all_input_ids.append(list(input_ids))
+
+        max_length = max([len(input_ids) for input_ids in all_input_ids])
+        pad_token_id = self.tokenizer.pad_token_id
+        input_ids = torch.as_tensor([ids + [pad_token_id] * (max_length - len(ids)) for ids in all_input_ids],
+                                    dtype=torch.long, device=self.device)
+        attention_mask = torch.as_tensor([[1] * len(ids) + [0] * (max_length - len(ids)) for ids in all_input_ids],
+                                         dtype=torch.long, device=self.device)
+        batch = {
+            "context": {
+                "input_ids": input_ids,
+                "attention_mask": attention_mask,
+            }
+        }
+        return batch
+
     def create_criterion(self):
         """
         method that create the loss function to train the model
@@ -375,14 +453,18 @@ class ContextualMODPLTrainer(Trainer):
             batch_instances = preference_instances[prev_step: next_step]
             prev_step = next_step
 
-            # batch accumulated estimated reward
-            batch_accumulated_estimated_reward = []
             batch_preference_weights = []
             batch_accumulated_returns = []
 
+            # flatten the states of all trajectories in the current batch
+            # segment ids map each state to its trajectory, discounts are gamma ** i
+            batch_states = []
+            segment_ids = []
+            discounts = []
+
             # for each instance in the batch instances
             # for each trajectory in the current batch
-            for instance in batch_instances:
+            for traj_id, instance in enumerate(batch_instances):
 
                 # get preference weight
                 batch_preference_weights.append(torch.FloatTensor(instance[1]).to(self.device))
@@ -391,38 +473,38 @@ class ContextualMODPLTrainer(Trainer):
                 # monte-carlo return
                 batch_accumulated_returns.append(instance[2])
 
-                # get the accumulated reward score
-                accumualated_estimated_reward = 0.0
-
-                # loop over all state in the trajectory
-                # computing the td-error loss
                 for i, state in enumerate(instance[0]):
+                    batch_states.append(state)
+                    segment_ids.append(traj_id)
+                    discounts.append(self.model_config.gamma ** i)
+
+            # create data loader to compute the estimated reward function
+            # the states of all trajectories are encoded in a few large forward passes
+            train_loader = self.construct_dataloaders(batch_states,
+                                                      batch_size=self.model_config.preference_encode_batch_size,
+                                                      shuffle=False,
+                                                      goal2id=action_mapping,
+                                                      num_workers=self.model_config.num_workers)
 
-                    # create data loader to compute the estimated reward function
-                    train_loader = self.construct_dataloaders([state],
-                                                              batch_size=1,
-                                                              shuffle=True,
-                                                              goal2id=action_mapping,
-                                                              num_workers=self.model_config.num_workers)
-
-                    # computing the feature representation
-                    # computing Phi(s_{t+1})
-                    for batch in train_loader:
-                        # computing the feature representation
-                        estimated_reward = self.model.compute_features(batch)
-                        # computing the accumulated estimated reward
-                        # e.g phi(s') = \phi(s) + gamma ** i * estimated_reward
-                        # an approximate version of V_{c}^{\pi}
-                        accumualated_estimated_reward = accumualated_estimated_reward + (
-                            self.model_config.gamma) ** i * estimated_reward
-
-                batch_accumulated_estimated_reward.append(accumualated_estimated_reward)
+            # computing the feature representation
+            # computing Phi(s_{t+1})
+            estimated_rewards = []
+            for batch in train_loader:
+                estimated_rewards.append(self.model.compute_features(batch))
+            estimated_rewards = torch.cat(estimated_rewards, dim=0)
+
+            # computing the accumulated estimated reward of each trajectory with one segment sum
+            # e.g phi(s') = \phi(s) + gamma ** i * estimated_reward
+            # an approximate version of V_{c}^{\pi}
+            segment_ids = torch.LongTensor(segment_ids).to(estimated_rewards.device)
+            discounts = torch.Tensor(discounts).to(estimated_rewards.device).unsqueeze(-1)
+            batch_accumulated_estimated_reward = torch.zeros(len(batch_instances), estimated_rewards.size(-1),
+                                                             device=estimated_rewards.device)
+            batch_accumulated_estimated_reward = batch_accumulated_estimated_reward.index_add(
+                0, segment_ids, discounts * estimated_rewards).squeeze(-1)
 
             # optimizing the MSE loss between accumulated estimated reward and MC-sampled scalarized rewards
             batch_accumulated_returns = torch.Tensor(batch_accumulated_returns).to(self.device)
-
-            # stacking the accumulated estimated reward tensor
-            batch_accumulated_estimated_reward = torch.cat(batch_accumulated_estimated_reward, dim=0).squeeze(-1)
             preference_optimizer.zero_grad()
 
             # mask of reward
@@ -478,7 +560,7 @@ class ContextualMODPLTrainer(Trainer):
                   critic_scheduler):
         """
         method that perform the actor critic training part
-        :param ppo_buffer: the buffer that stores data instances for actor-critic training
+        :param ppo_buffer: the replay buffer that stores transitions for actor-critic training
         :param action_mapping: a dictionary that maps goal, topic to ids
         :param actor_optimizer: the optimizer for training the actor model
         :param actor_scheduler: the scheduler for training the actor model
@@ -500,257 +582,205 @@ class ContextualMODPLTrainer(Trainer):
         mean_actor_loss = []
         mean_crtic_loss = []
 
-        # cloning model used for KL regularization Q learning
-        self.kl_model = copy.deepcopy(self.model)
-
-        # constructing a memory buffer
         # target_network
         # used in deep double Q learning
-        self.target_model = copy.deepcopy(self.model)
+        # only the heads are cloned, the target network shares the frozen plm with the model
+        if self.target_model is None:
+            self.target_model = ContextualMODPLTargetNetwork(self.model).to(self.device)
+        self.target_model.update(self.model)
 
         # define a variable capturing ids of previous batch data.
         for i in tqdm(range(self.model_config.num_train_ppo_epochs)):
 
             # otherwise we sample a batch of data from prev_step to next_step
             # to train the model
-            indices = np.random.choice(len(ppo_buffer), self.model_config.train_rl_batch_size)
-            batch_instances = [ppo_buffer[i] for i in indices.tolist()]
-
-            # states
-            states = [x[0] for x in batch_instances]
-
-            # action
-            if isinstance(action_mapping, tuple):
-                batch_act = [action_mapping[0][state['act']] for state in states]
+            batch = ppo_buffer.sample(self.model_config.train_rl_batch_size, device=self.device)
+
+            # actions, rewards and done flags
+            batch_act = batch['actions']
+            rewards = batch['rewards']
+            batch_done = batch['dones']
+
+            # sample a batch of preference weights
+            # sampled preferences from the memory buffer
+            # sampled_preferences = random.choices(self.preference_memory, k=self.model_config.n_preferences)
+            # sampled_preferences = torch.Tensor(sampled_preferences).to(self.device)
+            # if we draw preferences from a uniform distribution
+            # w_{current}
+            # NOTE: we start the training process by training the model with extreme preferences
+            # e.g: [1, 0], [0, 1 ], [0.5, 0.5]
+            # if self.ppo_global_step < self.model_config.n_warmup_epochs:
+            #     sampled_preferences = list(self.model_config.obj_to_weight.values())
+            #     sampled_preferences = [x for x in sampled_preferences if x is not None]
+            #     sampled_preferences = np.array(sampled_preferences)
+            # # NOTE: if we draw preferences from a uniform distribution
+            # else:    
+
+            sampled_preferences = self.preference_sampler.sample(self.model_config.n_preferences)
+            self.memory_buffer.extend(sampled_preferences)
+
+            # we add the sampled preferences to the memory buffer
+            # self.preference_memory.extend(sampled_preferences)
+            sampled_preferences = torch.from_numpy(sampled_preferences).to(self.device).requires_grad_(False)
+            n_preferences = sampled_preferences.size(0)
+
+            # sample update preferences from the memory buffer
+            # w_{prev}
+            if len(self.memory_buffer) < self.model_config.n_preferences:
+                prev_sampled_preferences = sampled_preferences
+            # sampled previous learned preferences from the memory
             else:
-                batch_act = [action_mapping[state['act']] for state in states]
-
-            batch_act = torch.LongTensor(batch_act).to(self.device)
-
-            # get the rewards
-            rewards = [x[1] for x in batch_instances]
-            rewards = torch.cat(rewards, dim=0)
-
-            # get the done flags
-            batch_done = [x[3] for x in batch_instances]
-            batch_done = torch.Tensor(batch_done).to(self.device)
-
-            train_loader = self.construct_dataloaders(states,
-                                                      batch_size=self.model_config.train_rl_batch_size,
-                                                      shuffle=False,
-                                                      goal2id=action_mapping,
-                                                      num_workers=self.model_config.num_workers)
-
-            # loop over the train loader
-            for batch in train_loader:
-                # sample a batch of preference weights
-                # sampled preferences from the memory buffer
-                # sampled_preferences = random.choices(self.preference_memory, k=self.model_config.n_preferences)
-                # sampled_preferences = torch.Tensor(sampled_preferences).to(self.device)
-                # if we draw preferences from a uniform distribution
-                # w_{current}
-                # NOTE: we start the training process by training the model with extreme preferences
-                # e.g: [1, 0], [0, 1 ], [0.5, 0.5]
-                # if self.ppo_global_step < self.model_config.n_warmup_epochs:
-                #     sampled_preferences = list(self.model_config.obj_to_weight.values())
-                #     sampled_preferences = [x for x in sampled_preferences if x is not None]
-                #     sampled_preferences = np.array(sampled_preferences)
-                # # NOTE: if we draw preferences from a uniform distribution
-                # else:    
-
-                sampled_preferences = random_weights(self.model_config.n_objectives, n=self.model_config.n_preferences)
-                self.memory_buffer.extend(sampled_preferences)
-
-                # we add the sampled preferences to the memory buffer
-                # self.preference_memory.extend(sampled_preferences)
-                sampled_preferences = torch.Tensor(sampled_preferences).to(self.device).requires_grad_(False)
-
-                # computing feature representations
-                state, next_state, w_embedding = self.model.compute_state_resp(batch, sampled_preferences)
-                bs = state.size(0)
-
-                # n_preferences = self.model_config.n_preferences
-                n_preferences = len(sampled_preferences)
-
-                # extend state, next state, w_embedding
-                w_embedding = w_embedding.repeat(1, bs).view(-1, w_embedding.size(-1))
-                
-                # state
-                state = state.repeat(n_preferences, 1).view(-1, state.size(-1))
-                
-                # next state
-                next_state = next_state.repeat(n_preferences, 1).view(-1, next_state.size(-1))
-
-                # action
-                action = batch_act.repeat(sampled_preferences.size(0), 1).view(-1)
-
-                # construct the feature vector
+                prev_sampled_preferences = self.preference_sampler.sample_from(self.memory_buffer,
+                                                                               self.model_config.n_preferences)
+                prev_sampled_preferences = torch.from_numpy(prev_sampled_preferences).to(self.device)
+
+            # the preferences are processed in chunks to bound the peak memory
+            # the gradients of the chunks are accumulated before the update
+            chunk_size = self.model_config.gpi_chunk_size
+            if chunk_size is None:
+                chunk_size = n_preferences
+
+            # computing feature representations
+            # the states are encoded once and shared by all preference chunks
+            state, next_state = self.model.compute_states(batch)
+            bs = state.size(0)
+
+            actor_optimizer.zero_grad()
+            actor_loss = 0
+            for start in range(0, n_preferences, chunk_size):
+                preferences = sampled_preferences[start:start + chunk_size]
+                prev_preferences = prev_sampled_preferences[start:start + chunk_size]
+                n_chunk = preferences.size(0)
+
+                # only the objective embedding depends on the preferences of the chunk
+                w_embedding = self.model.objective_embedding(preferences)
+
+                # each (preference, state) pair is a row of the feature matrix
+                # rows are ordered preference-major, i.e. the row p * bs + b pairs preference p with state b
                 feature = torch.cat([
-                    state,
-                    w_embedding
-                ], dim=-1)
+                    state.unsqueeze(0).expand(n_chunk, -1, -1),
+                    w_embedding.unsqueeze(1).expand(-1, bs, -1)
+                ], dim=-1).view(n_chunk * bs, -1)
 
-                # computing the logit using the actor network
-                # Q(s,a,w)
-                Q = self.model.actor(feature)
+                # the preference and the action of each row
+                w_batch = preferences.repeat_interleave(bs, dim=0)
+                action = batch_act.repeat(n_chunk)
 
                 # computing the logit using the actor network
                 # Q(s,a,w)
-                action_size = Q.view(Q.size(0), -1, self.model_config.n_objectives).size(1)
+                Q = self.model.actor(feature)
                 Q = Q.view(Q.size(0), -1, self.model_config.n_objectives)
+                action_size = Q.size(1)
 
-                # shape = [bs, n_tasks, n_objectives]
-                Q1 = Q.gather(1, action.view(-1, 1, 1).expand(Q.size(0), 1, self.model_config.n_objectives)).view(-1,
-                                                                                                                  self.model_config.n_objectives)
+                # shape = [bs, n_objectives]
+                Q1 = gather_action_values(Q, action)
 
                 # NOTE: Successor Feature Training
                 # Policy Improvement
                 with torch.no_grad():
-                    
                     self.model.eval()
                     next_feature = torch.cat([
-                        next_state,
-                        w_embedding
-                    ], dim=-1)
+                        next_state.unsqueeze(0).expand(n_chunk, -1, -1),
+                        w_embedding.unsqueeze(1).expand(-1, bs, -1)
+                    ], dim=-1).view(n_chunk * bs, -1)
 
                     # computing the logit using the actor network
                     # Q(s',a,w)
                     Q_next = self.target_model.actor(next_feature).detach()
                     Q_next = Q_next.view(-1, action_size, self.model_config.n_objectives)
 
-                    # calculate repeated sample_preferences.
-                    repeated_sample_preference = sampled_preferences.repeat(1, bs).view(-1, self.model_config.n_objectives)
-                    repeated_sample_preference = repeated_sample_preference.unsqueeze(1).repeat(1, action_size, 1)
-
-                    # cosine distance
-                    cosim = torch.nn.functional.cosine_similarity(repeated_sample_preference, Q_next, dim = -1)
-
-                    # computing the logit using the actor network
-                    scalarized_scores = \
-                       (repeated_sample_preference * Q_next).sum(dim = -1).view(-1, action_size)
-                    
-                    scalarized_scores = scalarized_scores * cosim
+                    # scalarized scores weighted by the cosine distance
                     # get the action-value function of the best action.
-                    idx = scalarized_scores.max(1)[1]
-                    Q_next_target = Q_next.gather(1, idx.view(-1, 1, 1).expand(idx.size(0),
-                                                                     1,
-                                                                     self.model_config.n_objectives)).squeeze()
-
+                    idx = envelope_scores(Q_next, w_batch).max(1)[1]
+                    Q_next_target = gather_action_values(Q_next, idx)
 
                 # NOTE: Generalized Policy Imrpovement
                 # compute target Q(s',a',s) here
                 # no gradient step here
                 with torch.no_grad():
                     self.model.eval()
-                    # sample update preferences from the memory buffer
-                    # w_{prev}
-                    if len(self.memory_buffer) < self.model_config.n_preferences:
-                        prev_sampled_preferences = sampled_preferences
-                    # sampled previous learned preferences from the memory
-                    else:
-                        prev_sampled_preferences = random.choices(self.memory_buffer, k=self.model_config.n_preferences)
-
-                    prev_sampled_preferences = torch.Tensor(prev_sampled_preferences).to(self.device).requires_grad_(False)
-                    # update the memory buffer
                     # compute the objective embedding for previous updated preferences
-                    _, _, prev_w_embedding = self.model.compute_state_resp(batch, prev_sampled_preferences)
-                    prev_w_embedding = prev_w_embedding.repeat(1, bs).view(-1, prev_w_embedding.size(-1))
+                    prev_w_embedding = self.model.objective_embedding(prev_preferences)
 
                     # construct the next feature
                     # concatenate next state and prev_w_embedding
                     next_feature = torch.cat([
-                        next_state,
-                        prev_w_embedding
-                    ], dim=-1)
+                        next_state.unsqueeze(0).expand(n_chunk, -1, -1),
+                        prev_w_embedding.unsqueeze(1).expand(-1, bs, -1)
+                    ], dim=-1).view(n_chunk * bs, -1)
 
                     Q_prime = self.target_model.actor(next_feature).detach()
                     Q_prime = Q_prime.view(-1, action_size, self.model_config.n_objectives)
 
                     tmp_Q_prime = self.model.actor(next_feature).detach()
-                    tmp_Q_prime = tmp_Q_prime.view(-1, self.model_config.n_objectives)
-
-                    # bs, n_sample * n_action, 2
-                    # 1, 2, n_sample
-                    repeated_sample_preference = sampled_preferences.repeat(bs, 1)
-                    repeated_sample_preference = repeated_sample_preference.unsqueeze(2).repeat(1, action_size,
-                                                                                                1).view(-1,
-                                                                                                        self.model_config.n_objectives)
-                    
+                    tmp_Q_prime = tmp_Q_prime.view(-1, action_size, self.model_config.n_objectives)
+
+                    # the row r is scalarized with the sampled preference r mod n_preferences
+                    rows = torch.arange(start * bs, (start + n_chunk) * bs, device=self.device)
+                    gpi_w_batch = sampled_preferences[rows % n_preferences]
+
+                    # convex envelope Q ids
                     # computing the cosine similarity between the sampled preferences and the computed Q target
                     # encouraging similar q targets and preferences
-                    co_sim = torch.nn.functional.cosine_similarity(repeated_sample_preference, tmp_Q_prime).view(-1,
-                                                                                                                 action_size)
-                    # computing scalarized Q targets
-                    scalarized_scores = \
-                        torch.bmm(repeated_sample_preference.unsqueeze(1), tmp_Q_prime.unsqueeze(2)).view(-1,
-                                                                                                          action_size)
-                    # convex envelope Q ids
                     if self.game_config.name == NEGOTIATION:
-                        idx = (co_sim * scalarized_scores).max(1)[1]
-                        
+                        idx = envelope_scores(tmp_Q_prime, gpi_w_batch).max(1)[1]
+
                     elif self.game_config.name == RECOMMENDATION:
-                        idx = scalarized_scores.max(1)[1]
-                        
-                    # Bs, n_sample, n_sample, 2 x Bs, n_sample, n_sample, n_action, 2
-                    # scalarized_Q_prime = torch.matmul(repeated_sample_preference, Q_prime.permute(0, 1, 3))
-                    # scalarized_Q_prime = scalarized_Q_prime.view(state.shape[0], sampled_preferences.shape[0], -1)
-                    # print(idx)
+                        idx = scalarize(tmp_Q_prime, gpi_w_batch).max(1)[1]
+
                     # collect target Q
-                    Q2 = Q_prime.gather(1, idx.view(-1, 1, 1).expand(idx.size(0),
-                                                                     1,
-                                                                     self.model_config.n_objectives)).squeeze() 
-                
+                    Q2 = gather_action_values(Q_prime, idx)
 
                 # compute target_q
                 # compute the target TD error.
                 # this is used to update the value function of the current policies.
-                w_batch = sampled_preferences.repeat(1, bs).view(-1, self.model_config.n_objectives)
-                rewards = rewards.repeat(sampled_preferences.size(0), 1).view(-1,
-                                                                              self.model_config.n_objectives)
+                chunk_rewards = rewards.repeat(n_chunk, 1)
+                dones = batch_done.repeat(n_chunk).view(-1, 1)
 
-                dones = batch_done.repeat(sampled_preferences.size(0), 1).view(-1,
-                                                                               1)
-                
-                wQ = torch.bmm(w_batch.unsqueeze(1), Q1.unsqueeze(2)).squeeze()
+                wQ = (w_batch * Q1).sum(dim=-1)
 
-                # computing TD targets   
-                # use standard policy improvement                                                                            
+                # computing TD targets
+                # use standard policy improvement
                 if not self.model_config.use_gpi:
                     # TD target
-                    TQ = rewards + self.model_config.gamma * (1 - dones) * Q_next_target
+                    TQ = chunk_rewards + self.model_config.gamma * (1 - dones) * Q_next_target
                     # NOTE: PI TD error
-                    wTQ_next = torch.bmm(w_batch.unsqueeze(1), TQ.unsqueeze(2)).squeeze()
-                    actor_loss =  F.mse_loss(wQ.view(-1), wTQ_next.view(-1), reduction = 'mean')
+                    wTQ_next = (w_batch * TQ).sum(dim=-1)
+                    chunk_loss = F.mse_loss(wQ.view(-1), wTQ_next.view(-1), reduction='mean')
                 # use GPI-based policy improvement
                 else:
                     # TD target
-                    TQ = rewards + self.model_config.gamma * (1 - dones) * Q2
+                    TQ = chunk_rewards + self.model_config.gamma * (1 - dones) * Q2
                     # scalarization
-                    # wQ = torch.bmm(w_batch.unsqueeze(1), Q1.unsqueeze(2)).squeeze()
-                    wTQ = torch.bmm(w_batch.unsqueeze(1), TQ.unsqueeze(2)).squeeze()
+                    wTQ = (w_batch * TQ).sum(dim=-1)
 
                     # NOTE: GPI TD error
-                    actor_loss = self.model_config.alpha * F.mse_loss(wQ.view(-1), wTQ.view(-1), reduction = 'mean')
-                    actor_loss += (1 - self.model_config.alpha) * F.mse_loss(Q1.view(-1), TQ.view(-1), reduction = 'mean')    
-
-                # update the parameters of actor and critic
-                actor_optimizer.zero_grad()
-                actor_loss.backward()
-                actor_optimizer.step()
-
-                # update the learning rate
-                actor_scheduler.step()
-                critic_scheduler.step()
-                critic_loss = 0
-
-                # update the target network
-                if (i + 1) % 1 == 0:
-                    self.target_model.load_state_dict(self.model.state_dict())
-
-                # collect the mean actor and critic loss
-                mean_actor_loss.append(actor_loss)
-                mean_crtic_loss.append(critic_loss)
-                progress_bar.update(1)
+                    chunk_loss = self.model_config.alpha * F.mse_loss(wQ.view(-1), wTQ.view(-1), reduction='mean')
+                    chunk_loss += (1 - self.model_config.alpha) * F.mse_loss(Q1.view(-1), TQ.view(-1),
+                                                                             reduction='mean')
+
+                # the loss of a chunk is weighted by its share of the sampled preferences
+                chunk_loss = chunk_loss * n_chunk / n_preferences
+                # the graph of the shared state projection is kept for the following chunks
+                chunk_loss.backward(retain_graph=start + chunk_size < n_preferences)
+                actor_loss += chunk_loss.detach()
+
+            # update the parameters of actor and critic
+            actor_optimizer.step()
+
+            # update the learning rate
+            actor_scheduler.step()
+            critic_scheduler.step()
+            critic_loss = 0
+
+            # update the target network
+            if (i + 1) % self.model_config.target_update_interval == 0:
+                self.target_model.update(self.model, tau=self.model_config.target_update_tau)
+
+            # collect the mean actor and critic loss
+            mean_actor_loss.append(actor_loss)
+            mean_crtic_loss.append(critic_loss)
+            progress_bar.update(1)
 
         # compute the mean actor and critic loss
         mean_actor_loss = sum(mean_actor_loss) / len(mean_actor_loss)
@@ -819,7 +849,12 @@ class ContextualMODPLTrainer(Trainer):
         self.model.to(self.device)
 
         # create a buffer to store experienced interactions for ppo training
-        ppo_buffer = deque(maxlen=self.model_config.ppo_buffer_length)
+        # transitions are stored as token ids in preallocated arrays
+        ppo_buffer = ReplayBuffer(self.model_config.ppo_buffer_length,
+                                  max_sequence_length=self.model_config.max_sequence_length,
+                                  n_objectives=self.model_config.n_objectives,
+                                  pad_token_id=self.tokenizer.pad_token_id,
+                                  seed=self.game_config.seed)
 
         # create a memory buffer to record past trained preferences
         self.memory_buffer = deque(maxlen=self.model_config.preference_buffer_length)
@@ -835,119 +870,81 @@ class ContextualMODPLTrainer(Trainer):
 
             # using the current policy model
             # this is the execution phase in the algorithm.
-            for i_episode in tqdm(range(self.model_config.sampled_times), desc='sampling'):
-                # randomly sample one case
-                # sample 1 item
-                case = np.random.choice(cases)
-                # # NOTE: we inititialy start the training with extreme corner weights
-                # if self.ppo_global_step <= self.model_config.n_warmup_epochs:
-                #     objs = list(self.model_config.obj_to_weight.keys())
-                #     objs.remove("uniform")
-                #     choice = np.random.randint(low=0, high=len(objs))
-                #     w = self.model_config.obj_to_weight[objs[choice]]
-                # # after that we train the model with randomly sampled weights
-                # else:
-                #     #     # sample a preference vector using the trained preference params
-                #     #     # this step is not differentiable
-                w = random_weights(self.model_config.n_objectives)
-
-                # randomly sample persona information
-                # i.e a random user is sampled
-                simulator = np.random.choice(simulators)
+            # randomly sample the case, the preference weight vector and the simulator of each episode
+            # i.e a random user is sampled
+            episode_cases = [np.random.choice(cases) for _ in range(self.model_config.sampled_times)]
+            episode_ws = self.preference_sampler.sample(self.model_config.sampled_times).tolist()
+            # the simulators are sampled with replacement, the rollout engine serializes the steps of
+            # episodes which share a simulator
+            simulator_ids = np.random.choice(len(simulators), self.model_config.sampled_times)
+            episode_simulators = [simulators[int(idx)] for idx in simulator_ids]
+
+            # trajectories to store simulated interactions
+            trajectories = [[] for _ in range(self.model_config.sampled_times)]
+            episode_rewards = [[] for _ in range(self.model_config.sampled_times)]
+
+            def policy(states, state_ws):
+                # predict the actions using the sampled w and the trained model
+                # a ~ \pi(a|s,w)
+                return self.predict_batch(states, state_ws, action_mapping, is_test=False)
+
+            def on_episode_start(i_episode, state):
                 loguru_logger.info('\n================New Episode:{}===================='.format(i_episode))
+                self.log_episode(state, episode_ws[i_episode])
 
-                # reset the game state
-                # sampled initial state s(0)
-                # construct a new game state based on the given case and the current simulator
-                state = self.game.reset(case, simulator)
-
-                # assign the preference weight vector
-                state['w'] = w
-
-                # store the preference to the mem buffer
-                # self.mem_buffer.append(w)
-
-                # recommendation scenario
-                if self.game_config.name == RECOMMENDATION:
-                    loguru_logger.info(f"[Target Item]: {state['task_background']['target_topic']}")
-                    loguru_logger.info(f"[Target Goal]: {state['task_background']['target_goal']}")
-
-                # negotiation scenario
-                elif self.game_config.name == NEGOTIATION:
-                    loguru_logger.info(f"[Item Name]: {state['task_background']['item_name']}")
-                    loguru_logger.info(f"[Seller Desired Price]: {state['task_background']['seller_price']}")
-                    loguru_logger.info(f"[Buyer Desired Price]: {state['task_background']['buyer_price']}")
-
-                loguru_logger.info(f"[System]: {state['dialogue_context'][0]['content']}")
-                loguru_logger.info(f"[USER]: {state['dialogue_context'][1]['content']}")
-
-                # more than 1 objectives, therefore the reward is a vector
-                done = False
-
-                # trajectories to store simulated interactions
-                trajectory = []
-                rewards = []
-                loguru_logger.info(f"Objective Weight: [{w}]")
-
-                # interactive simulations
-                # executing step: c
-                for t in count():  # user dialog
-
-                    # old state
-                    old_state = copy.deepcopy(state)
-
-                    # predict the action using the sampled w and the trained model
-                    # a ~ \pi(a|s,w)
-                    action, _, _ = self.predict(state, torch.FloatTensor(w).to(self.device), action_mapping,
-                                                       is_computing_reward=False, use_gpi=False)
-
-                    # employing the action to observe the next state
-                    # and the corresponding rewards
-                    state, reward, done, _ = self.game.step(state, action, self.generation_method, simulator)
-
-                    # storing the reward
-                    # this is the reward obtain via Monte-Carlo sampling
-                    reward = torch.tensor([reward], device=device, dtype=torch.float)
-                    rewards.append(reward)
-
-                    # collect information
-                    # s, s', a, a', done to compute the TD error loss
-                    old_state['next_state'] = copy.deepcopy(state)
-                    old_state['act'] = action
-                    old_state['done'] = 1 if done in (1, -1) else done
-                    trajectory.append(old_state)
-
-                    # storing the experiences to the ppo buffer
-                    # each experience is (state, next_state, r, log_prob)
-                    if train_step >= 0:
-                        # computing the estimated reward function
-                        # _, _, estimated_reward = self.predict(old_state, torch.FloatTensor(w).to(self.device),
-                        #                                       action_mapping, is_computing_reward=True, use_gpi=False)
-
-                        # a failed case
-                        # but for training if only consider 0, 1 for on-going or terminated conversation.
-                        if done == -1:
-                            done = 1
-
-                        ppo_buffer.append([
-                            # state, next_state, reward, log_prob, done
-                            # old_state, estimated_reward, log_prob, done
-                            old_state, reward, 1, abs(done)
-                        ])
-
-                    if done:
-                        break
+            def on_transition(i_episode, old_state, action, state, reward, done, o_done):
+                # storing the reward
+                # this is the reward obtain via Monte-Carlo sampling
+                reward = torch.tensor([reward], device=device, dtype=torch.float)
+                episode_rewards[i_episode].append(reward)
+
+                # collect information
+                # s, s', a, a', done to compute the TD error loss
+                old_state['next_state'] = copy.deepcopy(state)
+                old_state['act'] = action
+                old_state['done'] = 1 if done in (1, -1) else done
+                trajectories[i_episode].append(old_state)
+
+                # a failed case
+                # but for training if only consider 0, 1 for on-going or terminated conversation.
+                if done == -1:
+                    done = 1
+
+                # storing the experiences to the ppo buffer
+                # each experience is (state ids, next state ids, action id, reward, done)
+                input_ids, _, _, next_input_ids = self.get_data_processor()(self.tokenizer, old_state,
+                                                                            self.model_config.max_sequence_length,
+                                                                            action_mapping,
+                                                                            self.model_config.n_objectives)
+                if isinstance(action_mapping, tuple):
+                    action_id = action_mapping[0][action]
+                else:
+                    action_id = action_mapping[action]
+                ppo_buffer.add(input_ids, next_input_ids, action_id, reward.detach().cpu().numpy(), abs(done))
 
+            def on_episode_end(i_episode, state):
                 # calculating the accumulated return for one episode with the current simulator
                 accumulated_return = 0
-                for i, reward in enumerate(rewards):
+                for i, reward in enumerate(episode_rewards[i_episode]):
                     accumulated_return = accumulated_return + (self.model_config.gamma) ** i * reward
 
                 # update the preference buffer
                 preference_buffer.append(
-                    [trajectory, w, accumulated_return.detach().cpu().numpy().tolist()[0]]
+                    [trajectories[i_episode], episode_ws[i_episode],
+                     accumulated_return.detach().cpu().numpy().tolist()[0]]
                 )
 
+            # run the sampled episodes concurrently
+            rollout_engine = RolloutEngine(self.game, self.generation_method,
+                                           n_workers=self.model_config.n_rollout_workers)
+            rollout_engine.rollout(episode_cases, episode_simulators, episode_ws, policy,
+                                   on_episode_start=on_episode_start,
+                                   on_transition=on_transition,
+                                   on_episode_end=on_episode_end)
+
+            if prompt_utils.llm_cache is not None:
+                loguru_logger.info(f"LLM response cache: {prompt_utils.llm_cache.stats()}")
+
             # update the USFA
             # updating the parameters of universal successor features
             # loguru_logger.warning(f"Global epoch: {train_step}, Training the preference model ....")
@@ -1024,13 +1021,12 @@ class ContextualMODPLTrainer(Trainer):
         :param is_computing_reward: True if we are computing the estimated reward function
         :return: an predicted action
         """
-        # create the inverse action mapping
-        if isinstance(action_mapping, tuple):
-            # create the inverse action mapping
-            inverse_action_mapping = {v: k for k, v in action_mapping[0].items()}
-        else:    
-            inverse_action_mapping = {v: k for k, v in action_mapping.items()}        
-        
+        # predict the action with the fast inference path
+        if not is_computing_reward:
+            action, log_prob = self.predict_action(instance, w, action_mapping=action_mapping, is_test=is_test,
+                                                   use_gpi=use_gpi, n=n)
+            return action, log_prob, None
+
         # create the data loader
         data_loader = self.construct_dataloaders([instance],
                                                  batch_size=1,
@@ -1038,63 +1034,117 @@ class ContextualMODPLTrainer(Trainer):
                                                  shuffle=True,
                                                  num_workers=self.model_config.num_workers)
 
-        # # prepare the dataloader and model using accelerator
-        # data_Loader, self.model = self.accelerator.prepare(data_loader, self.model)
-
         # evaluation phase
         # computing the estimated reward
-        if is_computing_reward:
-            self.model.eval()
-            # make sure no gradient pass through here.
-            with torch.no_grad():
-                # predict the action
-                for batch in data_loader:
-                    # predict the action
-                    # we also compute the reward using the next state
-                    reward = None
-                    if is_computing_reward:
-                        # computing the estimated reward
-                        reward = self.model.compute_features(batch)
-                        action = None
-                        log_prob = None
-        else:
-            # predict the action
+        self.model.eval()
+        # make sure no gradient pass through here.
+        with torch.no_grad():
             for batch in data_loader:
-                w_gpi = random_weights(self.model_config.n_objectives, n=n)
-                w_gpi = torch.Tensor(w_gpi).unsqueeze(1)
-
-                # compute the state representation
-                reward = None
-                state_resp, _, w_embedding = self.model.compute_state_resp(batch, w)
-                # feature = self.model.projector(state_resp)
-                feature = state_resp
-                # construct the feature vector
-                feature = torch.cat([feature, w_embedding.unsqueeze(0)], dim=-1)
-                # computing the logit using the actor network
-                # Q(s,a,w)
-
-                logits = self.model.actor(feature)
-                logits = logits.view(1, -1, self.model_config.n_objectives)
-                # applying GPI
-                if use_gpi:
-                    # sample a batch of w
-                    logits = logits.repeat(n, 1, 1)
-                    logits = torch.bmm(logits, w_gpi.permute(0, 2, 1))
-                    logits = logits.max(dim=0)[0]
-                    logits = logits.permute(1, 0)
-                    # computing the q value and next q values
-                # Inference
-                else:
-                    logits = torch.bmm(logits, batch['w'].unsqueeze(1).permute(0, 2, 1)).squeeze(-1)
-                    print(batch['w'], logits)
-
-                action, log_prob = self.select_action(logits, is_test=is_test)
-                action = inverse_action_mapping[action]
-                print(action, log_prob)
+                # computing the estimated reward using the next state
+                reward = self.model.compute_features(batch)
+                action = None
+                log_prob = None
 
         # return action and log prob
         return action, log_prob, reward
 
+    def predict_action(self, instance, w, action_mapping=None, is_test=True, use_gpi=True, n=10, preferences=None):
+        """
+        method that predicts the action of a single state
+        this is the low-latency path called at every turn, the state is collated directly to tensors
+        and the forward pass runs in inference mode.
+        :param instance: the given state
+        :param w: the preference vector
+        :param action_mapping: a dictionary that maps action to index
+        :param is_test: True if it is inference time else False
+        :param use_gpi: True if we apply generalized policy improvement
+        :param n: the number of sampled preferences used for GPI
+        :param preferences: a reusable set of preferences used for GPI, n preferences are sampled if None
+        :return: the predicted action and its log prob
+        """
+        inverse_action_mapping = self.get_inverse_action_mapping(action_mapping)
+        batch = self.collate_state(instance, action_mapping)
+        w = torch.as_tensor(np.array(w), dtype=torch.float, device=self.device).view(1, -1)
+
+        with torch.inference_mode():
+            # compute the state representation
+            state_resp, _, w_embedding = self.model.compute_state_resp(batch, w)
+            # construct the feature vector
+            feature = torch.cat([state_resp, w_embedding.view(1, -1)], dim=-1)
+
+            # computing the logit using the actor network
+            # Q(s,a,w)
+            logits = self.model.actor(feature)
+            logits = logits.view(1, -1, self.model_config.n_objectives)
+
+            # applying GPI
+            if use_gpi:
+                # sample a batch of w if no preference set is given
+                if preferences is None:
+                    preferences = self.preference_sampler.sample(n)
+                preferences = torch.as_tensor(np.array(preferences), dtype=torch.float, device=self.device)
+                logits = gpi_scores(logits, preferences, chunk_size=self.model_config.gpi_chunk_size)
+            else:
+                logits = torch.bmm(logits, w.unsqueeze(-1)).squeeze(-1)
+
+            action, log_prob = self.select_action(logits, is_test=is_test)
+        return inverse_action_mapping[action], log_prob
+
+    def predict_batch(self, instances, ws, action_mapping=None, is_test=False):
+        """
+        method that predicts the actions of a batch of states in a single forward pass
+        :param instances: a list of states
+        :param ws: a list of preference vectors, one per state
+        :param action_mapping: a dictionary that maps action to index
+        :param is_test: True if it is inference time else False
+        :return: a list of predicted actions
+        """
+        inverse_action_mapping = self.get_inverse_action_mapping(action_mapping)
+
+        # collate the states directly to tensors, no data loader is constructed at every turn
+        batch = self.collate_states(instances, action_mapping)
+        w = torch.as_tensor(np.array(ws), dtype=torch.float, device=self.device)
+        actions = []
+        with torch.inference_mode():
+            # compute the state representation
+            state_resp, _, w_embedding = self.model.compute_state_resp(batch, w)
+            feature = torch.cat([state_resp, w_embedding], dim=-1)
+
+            # computing the logit using the actor network
+            # Q(s,a,w)
+            logits = self.model.actor(feature)
+            logits = logits.view(feature.size(0), -1, self.model_config.n_objectives)
+
+            # scalarizing the q values with the preference vector of each state
+            logits = torch.bmm(logits, w.unsqueeze(-1)).squeeze(-1)
+            for row in logits:
+                action, _ = self.select_action(row.unsqueeze(0), is_test=is_test)
+                actions.append(inverse_action_mapping[action])
+        return actions
+
+    def log_episode(self, state, w):
+        """
+        method that logs the task background and the first turns of an episode
+        :param state: the initial state of the episode
+        :param w: the preference weight vector of the episode
+        :return: None
+        """
+        loguru_logger.info(f"Objective Weight: [{w}]")
+
+        # recommendation scenario
+        if self.game_config.name == RECOMMENDATION:
+            loguru_logger.info(f"[Target Item]: {state['task_background']['target_topic']}")
+            loguru_logger.info(f"[Target Goal]: {state['task_background']['target_goal']}")
+
+        # negotiation scenario
+        elif self.game_config.name == NEGOTIATION:
+            loguru_logger.info(f"[Item Name]: {state['task_background']['item_name']}")
+            loguru_logger.info(f"[Seller Desired Price]: {state['task_background']['seller_price']}")
+            loguru_logger.info(f"[Buyer Desired Price]: {state['task_background']['buyer_price']}")
+
+        loguru_logger.info(f"[System]: {state['dialogue_context'][0]['content']}")
+        loguru_logger.info(f"[USER]: {state['dialogue_context'][1]['content']}")
+
     def select_action(self, logits, is_test=True, eps=0.1):
         """
         method that select an action from the output logits
@@ -1140,6 +1190,44 @@ class ContextualMODPLTrainer(Trainer):
         results = self.eval_epoch(test_loader, self.create_criterion())
         return results
 
+    def get_evaluation_weight(self, stage='dev', obj='uniform'):
+        """
+        method that returns the preference weight vector used for online evaluation
+        :param stage: the evaluation stage, either dev or test
+        :param obj: the prioritized objective during development
+        :return: a preference weight vector
+        """
+        # IMPORTANT: the preference weight determine which aspects should be prioritied during inference
+        # e.g: [0.7,0.2,0.1]: this preference favours the success rate
+        # e.g: [0.2,0.7,0.1]: this preference favours other utitilies, such as fairness, item_freq or toxicity
+        # e.g: [0.2, 0.2, 0.7]: this preference favours the avg turn metric.
+        if stage == 'test':
+            # specified objective weight
+            # for the adatability experiment
+            if self.model_config.objective_weight is not None:
+                w = np.array(self.model_config.objective_weight)
+            # specified objective
+            else:
+                # uniform sampled weight
+                if self.model_config.prioritized_objective == "uniform":
+                    w = random_weights(self.model_config.n_objectives, dist="uniform")
+                # evaluate using a given objective weight
+                # set the weight for the prioritized objective
+                # e.g: if the prioritized objective is sl_ratio then the corresponding weight is [1.0, 0.0, 0.0]
+                else:
+                    w = np.array(self.model_config.obj_to_weight[self.model_config.prioritized_objective.strip()])
+
+        # during development, we randomly sample a weight vector
+        elif stage == 'dev':
+            # unfirm sampling
+            if obj == 'uniform':
+                w = random_weights(self.model_config.n_objectives, dist="uniform")
+            else:
+                w = np.array(self.model_config.obj_to_weight[obj.strip()])
+        else:
+            raise Exception("Invalid evaluation stage ...")
+        return w
+
     def online_test(self, cases, device=None, simulators=None, action_mapping=None, stage='dev', obj='uniform'):
         """
         method that evaluate the rl-finetuned model on the test set
@@ -1171,130 +1259,88 @@ class ContextualMODPLTrainer(Trainer):
         self.model.to(device)
         # simulator = simulators[0]
         
-        # conversations
-        convs = []
-
-        # loop over the item set
-        for idx, (case, simulator) in tqdm(enumerate(list(zip(cases[:20], simulators)))):
-
+        # the evaluated (case, simulator) pairs
+        pairs = list(zip(cases[:20], simulators))
+        eval_cases = [case for case, _ in pairs]
+        eval_simulators = [simulator for _, simulator in pairs]
+
+        # the preference weight vectors are determined before the simulations
+        # therefore the results do not depend on the number of evaluation workers
+        ws = [self.get_evaluation_weight(stage, obj) for _ in pairs]
+
+        # per-conversation results
+        # episode-level reward
+        # more than 1 objectives, therefore the reward is a vector
+        epi_rewards = [[] for _ in pairs]
+
+        # flag for checking if the target is mentioned during the conversation
+        o_flags = [False for _ in pairs]
+
+        # a flag to check if the conversation is successful
+        # for computing the success rate
+        is_successful_flags = [False for _ in pairs]
+        conv_turns = [0 for _ in pairs]
+        prev_rewards = [0 for _ in pairs]
+
+        def policy(states, state_ws):
+            # predict the actions greedily
+            return self.predict_batch(states, state_ws, action_mapping, is_test=True)
+
+        def on_episode_start(idx, state):
             loguru_logger.info('\n================Item Num:{}===================='.format(idx))
-
-            # IMPORTANT: the preference weight determine which aspects should be prioritied during inference
-            # e.g: [0.7,0.2,0.1]: this preference favours the success rate
-            # e.g: [0.2,0.7,0.1]: this preference favours other utitilies, such as fairness, item_freq or toxicity
-            # e.g: [0.2, 0.2, 0.7]: this preference favours the avg turn metric.
-            if stage == 'test':
-                # specified objective weight
-                # for the adatability experiment
-                if self.model_config.objective_weight is not None:
-                    w = np.array(self.model_config.objective_weight)
-                # specified objective
-                else:
-                    # uniform sampled weight
-                    if self.model_config.prioritized_objective == "uniform":
-                        w = random_weights(self.model_config.n_objectives, dist="uniform")
-                    # evaluate using a given objective weight
-                    # set the weight for the prioritized objective
-                    # e.g: if the prioritized objective is sl_ratio then the corresponding weight is [1.0, 0.0, 0.0]
-                    else:
-                        w = np.array(self.model_config.obj_to_weight[self.model_config.prioritized_objective.strip()])
-
-            # during development, we randomly sample a weight vector
-            elif stage == 'dev':
-                # unfirm sampling
-                if obj == 'uniform':
-                    w = random_weights(self.model_config.n_objectives, dist="uniform")
-                else:
-                    w = np.array(self.model_config.obj_to_weight[obj.strip()])
-
-            # reset the game state
-            # construct a new game state based on the given case and the current simulator
-            state = self.game.reset(case, simulator)
-
-            loguru_logger.info(f"Objective Weight: [{w}]")
-
-            # recommendation scenario
-            if self.game_config.name == RECOMMENDATION:
-                loguru_logger.info(f"[Target Item]: {state['task_background']['target_topic']}")
-                loguru_logger.info(f"[Target Goal]: {state['task_background']['target_goal']}")
-
-            # negotiation scenario
-            elif self.game_config.name == NEGOTIATION:
-                loguru_logger.info(f"[Item Name]: {state['task_background']['item_name']}")
-                loguru_logger.info(f"[Seller Desired Price]: {state['task_background']['seller_price']}")
-                loguru_logger.info(f"[Buyer Desired Price]: {state['task_background']['buyer_price']}")
-
-            loguru_logger.info(f"[System]: {state['dialogue_context'][0]['content']}")
-            loguru_logger.info(f"[USER]: {state['dialogue_context'][1]['content']}")
-
-            # episode-level reward
-            # more than 1 objectives, therefore the reward is a vector
-            epi_reward = []
-            done = False
-
-            # flag for checking if the target is mentioned during the conversation
-            o_flag = False
-
-            # assign the preference weight vector
-            state['w'] = w
-
-            # a flag to check if the conversation is successful
-            # for computing the success rate
-            is_successful = False
-            conv_turn = 0
-
-            # interactive simulation
-            prev_reward = 0
-            
-            # execution phase
-            for t in count():  # user  dialog
-
-                # predict the action
-                action, log_prob, _ = self.predict(state, torch.FloatTensor(w).to(self.device), action_mapping,
-                                                   is_computing_reward=False, use_gpi=False, is_test=True)
-
-                #  count the number of each action
-                strategy_statistics[action] +=1
-
-                # employing the action to observe the next state
-                # and the corresponding rewards
-                state, reward, done, o_done = self.game.step(state, action, self.generation_method, simulator)
-
-                # storing the reward
-                # this is reward obtained using monte-carlo sampling
-                reward = torch.tensor([reward], device=device, dtype=torch.float)
-                epi_reward.append(reward)
-
-                # recommendation: check if target is mentioned during the conversation
-                # negotiation: check if there is a deal between user and system
-                # emotional support conversation: ......
-                if o_done == 1:
-                    o_flag = True
-                    
-                # current turn reward + past reward
-                tmp_reward = (reward + prev_reward).tolist()[0]
-
-                # cummulated reward
-                turn_level_results[t].append(tmp_reward)
-                prev_reward = reward
-
-                # evaluate the outcome of the conversation
-                if done:
-                    # successful case
-                    # if the llm_reward is greater than epsilon.
-                    # recommendation: check if target is mentioned during the conversation.
-                    # negotiation: check if there is a deal between user and system.
-                    # emotional support conversation: check if the mental problem of the seeker is resolved.
-                    if done == 1 and o_flag:
-                        # increase the SR
-                        SR += 1
-                        is_successful = True
-                    conv_turn = len(state['dialogue_context'])
-                    # total_reward += epi_reward
-                    break
-            
-            # store the conversations
-            convs.append(state)
+            self.log_episode(state, ws[idx])
+
+        def on_transition(idx, old_state, action, state, reward, done, o_done):
+            #  count the number of each action
+            strategy_statistics[action] += 1
+
+            # storing the reward
+            # this is reward obtained using monte-carlo sampling
+            reward = torch.tensor([reward], device=device, dtype=torch.float)
+            t = len(epi_rewards[idx])
+            epi_rewards[idx].append(reward)
+
+            # recommendation: check if target is mentioned during the conversation
+            # negotiation: check if there is a deal between user and system
+            # emotional support conversation: ......
+            if o_done == 1:
+                o_flags[idx] = True
+
+            # current turn reward + past reward
+            tmp_reward = (reward + prev_rewards[idx]).tolist()[0]
+
+            # cummulated reward
+            turn_level_results[t].append(tmp_reward)
+            prev_rewards[idx] = reward
+
+            # evaluate the outcome of the conversation
+            if done:
+                # successful case
+                # if the llm_reward is greater than epsilon.
+                # recommendation: check if target is mentioned during the conversation.
+                # negotiation: check if there is a deal between user and system.
+                # emotional support conversation: check if the mental problem of the seeker is resolved.
+                if done == 1 and o_flags[idx]:
+                    is_successful_flags[idx] = True
+                conv_turns[idx] = len(state['dialogue_context'])
+
+        # execution phase
+        # the conversations are simulated concurrently
+        rollout_engine = RolloutEngine(self.game, self.generation_method,
+                                       n_workers=self.model_config.n_eval_workers)
+        convs = rollout_engine.rollout(eval_cases, eval_simulators, ws, policy,
+                                       on_episode_start=on_episode_start,
+                                       on_transition=on_transition)
+
+        # merge the per-conversation results into the online evaluator
+        # following the order of the given cases
+        for idx in range(len(pairs)):
+            epi_reward = epi_rewards[idx]
+            is_successful = is_successful_flags[idx]
+            conv_turn = conv_turns[idx]
+            if is_successful:
+                # increase the SR
+                SR += 1
 
             # compute the cumulative reward at each turn
             # cumsum_turn_results = np.cumsum(epi_reward, axis=0)
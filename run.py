@@ -8,12 +8,14 @@ import wandb
 
 from utils.utils import get_datasets_by_names, get_model_by_names, reformat_args, \
     get_metrics_by_names, load_config_from_yaml_file, get_scenario_by_name, get_loggers_by_names, parse_args, \
-    get_text_generation_model_by_name, load_user_simulators, create_user_simulators
+    get_text_generation_model_by_name, load_user_simulators, create_user_simulators, user_simulators_exist
 
 from config.config import DatasetConfigForRecommendation
 from eval.offline import OfflineEvaluator
 from eval.online import OnlineEvaluator
 from utils.utils import set_seed
+from utils.prompt import warm_up
+from utils.snapshot import load_or_create_dataset
 from config.constants import BART_GENERATION, VICUNA, RECOMMENDATION, NEGOTIATION, EMOTIONAL_SUPPORT
 #
 # from modpl_new.config import ContextualMODPLConfig
@@ -56,6 +58,9 @@ if __name__ == '__main__':
         'model_type': args['model_type'], # type of the llm model,
     })
 
+    # load the llm pipeline ahead of the first simulated conversation
+    warm_up(game_config.model_type)
+
     # construct a set of datasets.
     dataset_config_classes_and_config_paths = get_datasets_by_names(args['scenario'], args['datasets'])
 
@@ -90,41 +95,34 @@ if __name__ == '__main__':
             )
 
         # create the dataset
-        dataset = dataset_class(dataset_config)
+        # or load the processed dataset from its snapshot
+        dataset = load_or_create_dataset(dataset_class, dataset_config,
+                                         snapshot_dir=args['snapshot_dir'],
+                                         domain=args['domain'],
+                                         overwrite=args['overwrite_snapshot'])
 
         # creating the user simulators if it does not exists.
-        if not os.path.exists(dataset_config.save_dev_simulator_path) or args['overwrite_sim']:
+        if not user_simulators_exist(dataset_config.save_dev_simulator_path) or args['overwrite_sim']:
             # generate user profiles
             train_user_profiles, dev_user_profiles, test_user_profiles = dataset.get_user_profiles()
             logger.info("Creating Dev Set User Simulators ......")
-            dev_user_simulators = create_user_simulators(game_simulator_class, dev_user_profiles,
-                                                         saved_filed_path=dataset_config.save_dev_simulator_path)
+            create_user_simulators(game_simulator_class, dev_user_profiles,
+                                   saved_filed_path=dataset_config.save_dev_simulator_path)
             logger.info("Creating Test User Simulators .....")
-            test_user_simulators = create_user_simulators(game_simulator_class, test_user_profiles,
-                                                          saved_filed_path=dataset_config.save_test_simulator_path)
-        # load the user simulators from file
-        else:
-            # load the simulator from files
-            dev_user_simulators = load_user_simulators(simulator_file_path=dataset_config.save_dev_simulator_path)
-            test_user_simulators = load_user_simulators(simulator_file_path=dataset_config.save_test_simulator_path)
+            create_user_simulators(game_simulator_class, test_user_profiles,
+                                   saved_filed_path=dataset_config.save_test_simulator_path)
 
+        # load the user simulators from file
         # setting the model type and the flag of using persona
         # according to the model type in the game config class.
-        new_dev_user_simulators = []
-        for simulator in dev_user_simulators:
-            # set the model type
-            simulator.set_model_type(game_config.model_type)
-            # set the flag of using persona
-            simulator.is_using_persona(args['use_persona'])
-            new_dev_user_simulators.append(simulator)
-
-        new_test_user_simulators = []
-        for simulator in test_user_simulators:
-            # set the model type
-            simulator.set_model_type(game_config.model_type)
-            # set the flag of using persona
-            simulator.is_using_persona(args['use_persona'])
-            new_test_user_simulators.append(simulator)
+        new_dev_user_simulators = load_user_simulators(simulator_file_path=dataset_config.save_dev_simulator_path,
+                                                       simulator_class=game_simulator_class,
+                                                       model_type=game_config.model_type,
+                                                       use_persona=args['use_persona'])
+        new_test_user_simulators = load_user_simulators(simulator_file_path=dataset_config.save_test_simulator_path,
+                                                        simulator_class=game_simulator_class,
+                                                        model_type=game_config.model_type,
+                                                        use_persona=args['use_persona'])
 
         # construct the pipeline for each model and run the pipeline on a specific scenario
         for (
@@ -0,0 +1,28 @@
+from collections import defaultdict
+
+from utils.prompt import call_llm_batch
+
+
+def respond_many(simulators, states, **kwargs):
+    """
+    function that generates the user responses of several conversations, each with its own simulator
+    the prompts of simulators which share the same llm and generation parameters are sent in one batched llm call.
+    :param simulators: a list of user simulators, one per conversation
+    :param states: a list of states of the conversations
+    :param kwargs: other keywords parameters of the construct_response_prompt method, e.g. the dataset name
+    :return: a list of generated responses, aligned with the given states
+    """
+    assert len(simulators) == len(states)
+
+    # group the conversations by the generation parameters
+    groups = defaultdict(list)
+    for idx, simulator in enumerate(simulators):
+        groups[(simulator.model_type, simulator.response_temperature, simulator.max_gen_token)].append(idx)
+
+    results = [None] * len(states)
+    for (model_type, temperature, max_token), ids in groups.items():
+        prompts = [simulators[idx].construct_response_prompt(states[idx], **kwargs) for idx in ids]
+        responses = call_llm_batch(prompts, n=1, temperature=temperature, max_token=max_token, model_type=model_type)
+        for idx, response in zip(ids, responses):
+            results[idx] = response[0]
+    return results
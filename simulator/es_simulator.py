@@ -4,19 +4,26 @@ from utils.prompt import call_llm
 
 class EmotionalSupportSimulator(Simulator):
 
-    def __init__(self, user_profile, use_persona=False):
+    # the sampling temperature of the user responses
+    response_temperature = 0.0001
+
+    def __init__(self, user_profile, use_persona=False, user_profile_description=None):
         """
         constructor for class emotional support simulator
         :param user_profile:
+        :param use_persona: True if we use the persona description
+        :param user_profile_description: a pre-generated persona description, generated by the llm if None
         """
         self.use_persona = use_persona
-        self.user_profile_description = self.generate_persona_description(user_profile)
+        if user_profile_description is None:
+            user_profile_description = self.generate_persona_description(user_profile)
+        self.user_profile_description = user_profile_description
 
-    def respond(self, state):
+    def construct_response_prompt(self, state):
         """
-        method that generates the simulated user response from the seeker in emotional support conversation
+        method that constructs the prompt used to generate the user response
         :param state: the current state of the conversation
-        :return:
+        :return: a list of messages
         """
         dialogue_context = state['dialogue_context']
         problem_type = state['task_background']['problem_type']
@@ -56,14 +63,26 @@ class EmotionalSupportSimulator(Simulator):
             {'role': 'user', 'content': 'Please reply with only one short and succinct sentence.'}
         )
 
+        return messages
+
+    def respond(self, state):
+        """
+        method that generates the user response given the current state of the conversation
+        :param state: the current state of the conversation
+        :return: the generated response by the user.
+        """
+        messages = self.construct_response_prompt(state)
         # calling the llm for response generation
-        response = call_llm(messages, n=1, temperature=0.0001, max_token=self.max_gen_token, model_type=self.model_type)
+        response = call_llm(messages, n=1, temperature=self.response_temperature, max_token=self.max_gen_token,
+                            model_type=self.model_type)
         return response[0]
 
-    def generate_persona_description(self, user_profile):
+    @classmethod
+    def construct_persona_prompt(cls, user_profile):
         """
-        method that generate a persona description given the situation of the patient (problem_type, emotion_type, situation)
-        :return: an user profile description
+        method that constructs the prompt used to generate the persona description
+        :param user_profile: the situation of the patient (problem_type, emotion_type, situation)
+        :return: a list of messages
         """
         prompt = f"""
         You need to incorporate the following information and generate a cohesive persona description.
@@ -77,6 +96,14 @@ class EmotionalSupportSimulator(Simulator):
         messages = [
             {"role": "system", "content": prompt}
         ]
+        return messages
+
+    def generate_persona_description(self, user_profile):
+        """
+        method that generate a persona description given the situation of the patient (problem_type, emotion_type, situation)
+        :return: an user profile description
+        """
+        messages = self.construct_persona_prompt(user_profile)
         output = call_llm(messages, n=1,
                           temperature=self.temperature,
                           max_token=self.max_description_tokens,
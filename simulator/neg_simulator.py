@@ -6,20 +6,27 @@ from utils.prompt import call_llm
 
 class NegotiationSimulator(Simulator):
 
-    def __init__(self, user_profile, use_persona=False):
+    # the sampling temperature of the user responses
+    response_temperature = 0.00000001
+
+    def __init__(self, user_profile, use_persona=False, user_profile_description=None):
         """
         constructor for class negotiation simulator
         :param user_profile: a tuple of big5 persona and decision making style
+        :param use_persona: True if we use the persona description
+        :param user_profile_description: a pre-generated persona description, generated by the llm if None
         """
         self.use_persona = use_persona
         # generating the profile description
-        self.user_profile_description = self.generate_persona_description(user_profile)
+        if user_profile_description is None:
+            user_profile_description = self.generate_persona_description(user_profile)
+        self.user_profile_description = user_profile_description
 
-    def respond(self, state):
+    def construct_response_prompt(self, state):
         """
-        method that generates the user response for the negotiation scenario
+        method that constructs the prompt used to generate the user response
         :param state: the current state of the conversation
-        :return: the generated response by the user.
+        :return: a list of messages
         """
         dialogue_context = state['dialogue_context']
         item_name = state['task_background']['item_name']
@@ -97,18 +104,29 @@ class NegotiationSimulator(Simulator):
              }
         )
 
-        # messages.extend(dialogue_context)
+        return messages
+
+    def respond(self, state):
+        """
+        method that generates the user response given the current state of the conversation
+        :param state: the current state of the conversation
+        :return: the generated response by the user.
+        """
+        messages = self.construct_response_prompt(state)
         t = time.time()
 
         # calling the llm for response generation
-        response = call_llm(messages, n=1, temperature=0.00000001, max_token=self.max_gen_token, model_type=self.model_type)
+        response = call_llm(messages, n=1, temperature=self.response_temperature, max_token=self.max_gen_token,
+                            model_type=self.model_type)
         print("Simulator Generation Time: ", time.time() - t)
         return response[0]
 
-    def generate_persona_description(self, user_profile):
+    @classmethod
+    def construct_persona_prompt(cls, user_profile):
         """
-        method that generate a persona description given the big5 personality and decision making style (persona, decision_type)
-        :return: an user profile description
+        method that constructs the prompt used to generate the persona description
+        :param user_profile: a tuple of big5 persona and decision making style
+        :return: a list of messages
         """
         assert len(user_profile) == 2
         prompt = f"""
@@ -122,6 +140,14 @@ class NegotiationSimulator(Simulator):
         messages = [
             {"role": "system", "content": prompt}
         ]
+        return messages
+
+    def generate_persona_description(self, user_profile):
+        """
+        method that generate a persona description given the big5 personality and decision making style (persona, decision_type)
+        :return: an user profile description
+        """
+        messages = self.construct_persona_prompt(user_profile)
         output = call_llm(messages, n=1, temperature=self.temperature, max_token=self.max_description_tokens,
                           model_type=self.model_type)
         # return the user persona description
@@ -5,22 +5,30 @@ from config.constants import DURECDIAL, INSPIRED
 
 class RecommendationSimulator(Simulator):
 
-    def __init__(self, user_profile, use_persona=False):
+    # the sampling temperature of the user responses
+    response_temperature = 0.0001
+
+    def __init__(self, user_profile, use_persona=False, user_profile_description=None):
         """
         constructor for class Recommendation Simulator
         :param user_profile: the profile of the user, in the format of a dictionary
+        :param use_persona: True if we use the persona description
+        :param user_profile_description: a pre-generated profile description, generated by the llm if None
         """
         # generating the profile description
         self.user_profile = user_profile
         self.use_persona = use_persona
         # self.user_profile_description = ''
-        self.user_profile_description = self.generate_persona_description(user_profile)
+        if user_profile_description is None:
+            user_profile_description = self.generate_persona_description(user_profile)
+        self.user_profile_description = user_profile_description
 
-    def respond(self, state, dataset='durecdial'):
+    def construct_response_prompt(self, state, dataset='durecdial'):
         """
-        method that generate a response given the user profile description and the dialogue context
-        :param state: the current dialogue context in the format of list of dictionary
-        :return: a generated response in the format of string
+        method that constructs the prompt used to generate the user response
+        :param state: the current state of the conversation
+        :param dataset: the name of the dataset
+        :return: a list of messages
         """
         dialogue_context = state['dialogue_context']
 
@@ -68,11 +76,23 @@ class RecommendationSimulator(Simulator):
             {'role': 'user', 'content': 'Please reply with only one short and succinct sentence.'}
         )
 
+        return messages
+
+    def respond(self, state, dataset='durecdial'):
+        """
+        method that generates the user response given the current state of the conversation
+        :param state: the current state of the conversation
+        :param dataset: the name of the dataset
+        :return: the generated response by the user.
+        """
+        messages = self.construct_response_prompt(state, dataset=dataset)
         # calling the llm for response generation
-        response = call_llm(messages, n=1, temperature=0.0001, max_token=self.max_gen_token, model_type=self.model_type)
+        response = call_llm(messages, n=1, temperature=self.response_temperature, max_token=self.max_gen_token,
+                            model_type=self.model_type)
         return response[0]
 
-    def convert_profile_to_string(self, user_profile):
+    @staticmethod
+    def convert_profile_to_string(user_profile):
         """
         method that convert the user profile dictionary to a string format
         :return: a string format of the user profile
@@ -83,21 +103,31 @@ class RecommendationSimulator(Simulator):
                 user_profile_description += f"{k}: {v} \n"
         return user_profile_description
 
-    def generate_persona_description(self, user_profile):
+    @classmethod
+    def construct_persona_prompt(cls, user_profile):
         """
-        method that generate a profile description given the user profile dictionary
-        :return: an user profile description
+        method that constructs the prompt used to generate the profile description
+        :param user_profile: the profile of the user, in the format of a dictionary
+        :return: a list of messages
         """
         prompt = f"""
         You need to incorporate the following user profile and generate a cohesive profile description.
         You need to ensure the description is easy to understand.
         ********
-        {self.convert_profile_to_string(user_profile)}
+        {cls.convert_profile_to_string(user_profile)}
         ********
         """
         messages = [
             {"role": "system", "content": prompt}
         ]
+        return messages
+
+    def generate_persona_description(self, user_profile):
+        """
+        method that generate a profile description given the user profile dictionary
+        :return: an user profile description
+        """
+        messages = self.construct_persona_prompt(user_profile)
         output = call_llm(messages, n=1, temperature=self.temperature, max_token=self.max_description_tokens,
                           model_type=self.model_type)
         # return the user persona description
@@ -0,0 +1,122 @@
+import os
+import json
+import threading
+from collections.abc import Sequence
+
+# bump the version whenever the format of the records changes
+SIMULATOR_STORE_VERSION = 1
+
+
+def get_simulator_store_path(file_path):
+    """
+    function that returns the path of the simulator store corresponding to a (legacy) simulator file path
+    :param file_path: the path to the simulator file, e.g. data/neg_data/craigslist/dev_sim.pkl
+    :return: the path to the json lines store, e.g. data/neg_data/craigslist/dev_sim.jsonl
+    """
+    return os.path.splitext(file_path)[0] + ".jsonl"
+
+
+def save_simulator_store(file_path, simulator_class, user_profiles, descriptions):
+    """
+    function that saves the user profiles and their persona descriptions to a json lines store
+    the first line is a header, each following line is the record of one simulator.
+    :param file_path: the path to the store
+    :param simulator_class: the class of the user simulator
+    :param user_profiles: a list of user profiles
+    :param descriptions: a list of persona descriptions, aligned with the user profiles
+    :return: None
+    """
+    tmp_path = f"{file_path}.tmp{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        header = {"version": SIMULATOR_STORE_VERSION, "simulator": simulator_class.__name__}
+        f.write(json.dumps(header) + "\n")
+        for profile, description in zip(user_profiles, descriptions):
+            f.write(json.dumps({"profile": profile, "description": description}) + "\n")
+    os.replace(tmp_path, file_path)
+
+
+class SimulatorStore(Sequence):
+
+    def __init__(self, file_path, simulator_class, model_type=None, use_persona=False):
+        """
+        constructor for class simulator store
+        the store indexes the records of a json lines file, simulators are only created when they are accessed.
+        :param file_path: the path to the store
+        :param simulator_class: the class of the user simulator
+        :param model_type: the llm model type of the simulators
+        :param use_persona: True if the simulators use the persona descriptions
+        """
+        self.file_path = file_path
+        self.simulator_class = simulator_class
+        self.model_type = model_type
+        self.use_persona = use_persona
+
+        # byte offsets of the records
+        self.offsets = []
+        with open(file_path, 'rb') as f:
+            header = json.loads(f.readline())
+            if header['version'] != SIMULATOR_STORE_VERSION:
+                raise Exception(f"Unsupported simulator store version: {header['version']}")
+            offset = f.tell()
+            for line in iter(f.readline, b''):
+                self.offsets.append(offset)
+                offset += len(line)
+
+        self.ids = list(range(len(self.offsets)))
+        # created simulators, shared with the subsets of the store
+        self.simulators = {}
+        self.lock = threading.Lock()
+
+    def read_record(self, i):
+        """
+        method that reads the i-th record of the store
+        :param i: the index of the record in the file
+        :return: a dictionary with the profile and the persona description
+        """
+        with open(self.file_path, 'rb') as f:
+            f.seek(self.offsets[i])
+            return json.loads(f.readline())
+
+    def get_simulator(self, i):
+        """
+        method that creates the simulator of the i-th record of the store
+        :param i: the index of the record in the file
+        :return: an instance of the simulator class
+        """
+        with self.lock:
+            if i not in self.simulators:
+                record = self.read_record(i)
+                simulator = self.simulator_class(record['profile'], user_profile_description=record['description'])
+                if self.model_type is not None:
+                    simulator.set_model_type(self.model_type)
+                simulator.is_using_persona(self.use_persona)
+                self.simulators[i] = simulator
+            return self.simulators[i]
+
+    def subset(self, indices):
+        """
+        method that returns a view of the store which only contains the given indices
+        :param indices: a list of indices
+        :return: an instance of the simulator store class
+        """
+        store = object.__new__(SimulatorStore)
+        store.__dict__.update(self.__dict__)
+        store.ids = [self.ids[i] for i in indices]
+        return store
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.subset(range(*index.indices(len(self))))
+        return self.get_simulator(self.ids[index])
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
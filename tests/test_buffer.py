@@ -0,0 +1,46 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+torch = pytest.importorskip("torch")
+
+from utils.buffer import ReplayBuffer
+
+
+def test_buffer_wraps_around():
+    buffer = ReplayBuffer(3, max_sequence_length=4, n_objectives=2, pad_token_id=0, seed=0)
+    for i in range(5):
+        buffer.add([i + 1] * (i + 1), [i + 2], action=i, reward=[i, -i], done=float(i == 4))
+
+    assert len(buffer) == 3
+    assert buffer.position == 2
+    # the two oldest transitions are overwritten
+    assert sorted(buffer.actions.tolist()) == [2, 3, 4]
+    assert buffer.rewards[buffer.actions == 4].tolist() == [[4.0, -4.0]]
+    # the state is truncated to the max sequence length and the stale ids are padded
+    assert buffer.input_ids[1].tolist() == [5, 5, 5, 5]
+    assert buffer.lengths[1] == 4
+    assert buffer.input_ids[0].tolist() == [4, 4, 4, 4]
+    assert buffer.next_input_ids[0].tolist() == [5, 0, 0, 0]
+
+
+def test_to_features_trims_the_padding():
+    buffer = ReplayBuffer(4, max_sequence_length=8, n_objectives=1, pad_token_id=0)
+    buffer.add([1, 2], [1], action=0, reward=[0.0], done=0.0)
+    buffer.add([3, 4, 5], [1], action=1, reward=[1.0], done=1.0)
+
+    features = buffer.to_features(buffer.input_ids[:2], buffer.lengths[:2])
+    assert features['input_ids'].tolist() == [[1, 2, 0], [3, 4, 5]]
+    assert features['attention_mask'].tolist() == [[1, 1, 0], [1, 1, 1]]
+
+
+def test_sample_shapes():
+    buffer = ReplayBuffer(8, max_sequence_length=6, n_objectives=3, seed=0)
+    for i in range(4):
+        buffer.add([1] * (i + 1), [2] * (i + 2), action=i, reward=[1.0, 2.0, 3.0], done=0.0)
+
+    batch = buffer.sample(5)
+    assert batch['context']['input_ids'].size(0) == 5
+    assert batch['context']['input_ids'].size(1) == batch['context']['attention_mask'].sum(dim=1).max().item()
+    assert batch['actions'].dtype == torch.int64
+    assert batch['rewards'].shape == (5, 3)
+    assert batch['dones'].shape == (5,)
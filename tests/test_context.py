@@ -0,0 +1,80 @@
+import copy
+import json
+import pickle
+
+import pytest
+
+from utils.context import PrefixView, FrozenDict, to_serializable
+
+
+def test_prefix_view_reads_the_shared_prefix():
+    source = [1, 2, 3, 4]
+    view = PrefixView(source, 2)
+
+    assert len(view) == 2
+    assert list(view) == [1, 2]
+    assert view[-1] == 2
+    assert view[0:5] == [1, 2]
+    assert view == [1, 2]
+    assert view + [9] == [1, 2, 9]
+    with pytest.raises(IndexError):
+        view[2]
+
+
+def test_prefix_view_copy_on_write():
+    source = [1, 2, 3]
+    view = PrefixView(source, 2)
+    other = PrefixView(source, 2)
+
+    view.append(5)
+    view[0] = 0
+    assert view == [0, 2, 5]
+    # neither the shared list nor the other views are modified
+    assert source == [1, 2, 3]
+    assert other == [1, 2]
+
+
+def test_prefix_view_copies_are_lists():
+    source = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}]
+    view = PrefixView(source, 2)
+
+    copied = copy.deepcopy(view)
+    assert type(copied) is list and copied == source
+    copied[0]["content"] = "bye"
+    assert source[0]["content"] == "hi"
+
+    assert type(copy.copy(view)) is list
+    pickled = pickle.loads(pickle.dumps(view))
+    assert type(pickled) is list and pickled == source
+    assert json.loads(json.dumps(view, default=to_serializable)) == source
+
+
+def test_frozen_dict_is_read_only():
+    background = FrozenDict({"target_goal": "Movie recommendation", "topic_set": ["Heat"]})
+
+    with pytest.raises(TypeError):
+        background["target_goal"] = "Chat"
+    with pytest.raises(TypeError):
+        del background["target_goal"]
+    with pytest.raises(TypeError):
+        background.update(target_goal="Chat")
+    with pytest.raises(TypeError):
+        background.pop("target_goal")
+    with pytest.raises(TypeError):
+        background.setdefault("target_topic", "Heat")
+    assert background == {"target_goal": "Movie recommendation", "topic_set": ["Heat"]}
+
+
+def test_frozen_dict_copies_are_mutable_dicts():
+    background = FrozenDict({"target_goal": "Movie recommendation", "topic_set": ["Heat"]})
+
+    for copied in [background.copy(), copy.copy(background), copy.deepcopy(background),
+                   pickle.loads(pickle.dumps(background))]:
+        assert type(copied) is dict and copied == background
+        copied["target_goal"] = "Chat"
+    assert background["target_goal"] == "Movie recommendation"
+
+    # the nested values are copied by a deep copy only
+    copy.deepcopy(background)["topic_set"].append("Up")
+    assert background["topic_set"] == ["Heat"]
+    assert json.loads(json.dumps(background)) == background
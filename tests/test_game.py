@@ -0,0 +1,55 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from utils.game import PreferenceSampler, cube_to_simplex
+
+
+def assert_on_simplex(w, p):
+    assert np.all(w >= 0)
+    # the rounding moves each coordinate by at most half a quantization step
+    assert np.allclose(w.sum(axis=1), 1.0, atol=w.shape[1] * p / 2 + 1e-6)
+    assert np.allclose(np.round(w / p) * p, w, atol=1e-6)
+
+
+@pytest.mark.parametrize("dist", ["dirichlet", "gaussian"])
+def test_sampler_is_deterministic_and_on_simplex(dist):
+    sampler = PreferenceSampler(3, pool_size=16, dist=dist, p=0.01, seed=0)
+    other = PreferenceSampler(3, pool_size=16, dist=dist, p=0.01, seed=0)
+
+    # the samples cross the boundary of the pool
+    w = np.concatenate([sampler.sample(10), sampler.sample(10)], axis=0)
+    assert w.shape == (20, 3)
+    assert np.array_equal(w, np.concatenate([other.sample(10), other.sample(10)], axis=0))
+    assert_on_simplex(w, 0.01)
+
+
+def test_stratified_sampler_is_deterministic_and_on_simplex():
+    sampler = PreferenceSampler(3, p=0.01, seed=1, stratified=True)
+    other = PreferenceSampler(3, p=0.01, seed=1, stratified=True)
+
+    w = sampler.sample(8)
+    assert w.shape == (8, 3)
+    assert np.array_equal(w, other.sample(8))
+    assert_on_simplex(w, 0.01)
+
+
+def test_cube_to_simplex():
+    u = np.random.default_rng(0).random((100, 3))
+    w = cube_to_simplex(u)
+    assert w.shape == (100, 4)
+    assert np.all(w >= 0)
+    assert np.allclose(w.sum(axis=1), 1.0)
+
+
+def test_sample_from_memory():
+    sampler = PreferenceSampler(2, pool_size=4, seed=0)
+    memory = [[0.1, 0.9], [0.5, 0.5]]
+    w = sampler.sample_from(memory, 5)
+    assert w.shape == (5, 2)
+    assert all(list(x) in np.array(memory, dtype=np.float32).tolist() for x in w.tolist())
+
+
+def test_unknown_distribution():
+    with pytest.raises(ValueError):
+        PreferenceSampler(3, dist="beta")
@@ -0,0 +1,50 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from utils.gpi import scalarize, gpi_scores, envelope_scores, gather_action_values
+
+
+def naive_scalarize(q_values, preferences):
+    scores = torch.zeros(q_values.size(0), q_values.size(1))
+    for n in range(q_values.size(0)):
+        for a in range(q_values.size(1)):
+            scores[n, a] = sum(q_values[n, a, k] * preferences[n, k] for k in range(q_values.size(2)))
+    return scores
+
+
+def test_scalarize():
+    q_values = torch.randn(4, 5, 3)
+    preferences = torch.rand(4, 3)
+    assert torch.allclose(scalarize(q_values, preferences), naive_scalarize(q_values, preferences), atol=1e-5)
+
+
+@pytest.mark.parametrize("chunk_size", [None, 1, 2, 7])
+def test_gpi_scores(chunk_size):
+    q_values = torch.randn(4, 5, 3)
+    preferences = torch.rand(6, 3)
+
+    expected = torch.full((4, 5), float('-inf'))
+    for w in preferences:
+        expected = torch.maximum(expected, naive_scalarize(q_values, w.expand(4, -1)))
+    assert torch.allclose(gpi_scores(q_values, preferences, chunk_size=chunk_size), expected, atol=1e-5)
+
+
+def test_envelope_scores():
+    q_values = torch.randn(4, 5, 3)
+    preferences = torch.rand(4, 3)
+
+    expected = torch.zeros(4, 5)
+    for n in range(4):
+        for a in range(5):
+            score = torch.dot(q_values[n, a], preferences[n])
+            cosine = score / (q_values[n, a].norm() * preferences[n].norm())
+            expected[n, a] = score * cosine
+    assert torch.allclose(envelope_scores(q_values, preferences), expected, atol=1e-5)
+
+
+def test_gather_action_values():
+    q_values = torch.randn(4, 5, 3)
+    actions = torch.tensor([0, 4, 2, 2])
+    expected = torch.stack([q_values[n, a] for n, a in enumerate(actions.tolist())])
+    assert torch.equal(gather_action_values(q_values, actions), expected)
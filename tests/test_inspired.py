@@ -0,0 +1,31 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("base.dataset")
+
+from dataset.rec_datasets.inspired import MovieKnowledgeBase, get_movie_knowledge, read_tsv_file
+
+
+def write_movie_db(path):
+    df = pd.DataFrame({
+        "title": ["Heat", "Alien", "Heat", "Up"],
+        "actors": ["Al Pacino, Robert De Niro", "Sigourney Weaver", "Val Kilmer", None],
+        "director": ["Michael Mann", "Ridley Scott", "Michael Mann", "Pete Docter"],
+        "genre": ["Crime, Drama", "Horror", "Crime", "Animation"],
+        "language": ["English", "English", None, "English"],
+    })
+    df.to_csv(path, sep="\t", index=False)
+
+
+def test_index_matches_get_movie_knowledge(tmp_path):
+    db_path = str(tmp_path / "movie_database.tsv")
+    write_movie_db(db_path)
+    movie_db = read_tsv_file(db_path)
+
+    movie_kb = MovieKnowledgeBase(db_path)
+    for title in ["Heat", "Alien", "Up", "Unknown"]:
+        assert movie_kb.get(title) == get_movie_knowledge(title, movie_db)
+
+    # the index is saved and loaded by a new knowledge base
+    assert (tmp_path / "movie_database.index.pkl").exists()
+    assert MovieKnowledgeBase(db_path).get("Heat") == get_movie_knowledge("Heat", movie_db)
@@ -0,0 +1,133 @@
+import copy
+import json
+import os
+import pickle
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("loguru")
+
+from utils.context import PrefixView, FrozenDict
+from utils.snapshot import load_or_create_dataset, DatasetSnapshot, SnapshotColumn
+
+
+class FakeConfig(object):
+
+    def __init__(self, train_data_path, max_turns=10):
+        self.dataset_name = "fake"
+        self.train_data_path = train_data_path
+        self.max_turns = max_turns
+
+
+class FakeDataset(object):
+    n_processed = 0
+
+    def __init__(self, dataset_config):
+        FakeDataset.n_processed += 1
+        self.dataset_config = dataset_config
+        self.goals = []
+        self.train_instances = []
+        with open(dataset_config.train_data_path) as f:
+            for conv_id, line in enumerate(f):
+                conv = json.loads(line)
+                task_background = FrozenDict({"item_name": conv['item_name'], "topic_set": conv['topics']})
+                utts = []
+                goals = ["None"]
+                for turn in conv['turns'][:dataset_config.max_turns]:
+                    self.goals.append(turn['goal'])
+                    self.train_instances.append({
+                        "conv_id": conv_id,
+                        "goal": turn['goal'],
+                        "pre_goals": PrefixView(goals, len(goals)),
+                        "dialogue_context": PrefixView(utts, len(utts)),
+                        "task_background": task_background,
+                        "done": 0,
+                    })
+                    utts.append(FrozenDict({"role": "user", "content": turn['text']}))
+                    goals.append(turn['goal'])
+
+
+def write_raw_file(path, n_turns=3):
+    with open(path, "w") as f:
+        for item in ["bike", "lamp"]:
+            turns = [{"goal": f"goal {i % 2}", "text": f"{item} turn {i}"} for i in range(n_turns)]
+            f.write(json.dumps({"item_name": item, "topics": [item, "price"], "turns": turns}) + "\n")
+
+
+@pytest.fixture
+def raw_path(tmp_path):
+    path = str(tmp_path / "train.jsonl")
+    write_raw_file(path)
+    return path
+
+
+def test_snapshot_round_trip(tmp_path, raw_path):
+    snapshot_dir = str(tmp_path / "snapshots")
+    config = FakeConfig(raw_path)
+    FakeDataset.n_processed = 0
+    dataset = load_or_create_dataset(FakeDataset, config, snapshot_dir=snapshot_dir)
+    loaded = load_or_create_dataset(FakeDataset, config, snapshot_dir=snapshot_dir)
+
+    # the second dataset is loaded from the snapshot
+    assert FakeDataset.n_processed == 1
+    assert isinstance(loaded.train_instances, SnapshotColumn)
+    assert loaded.dataset_config is config
+    assert loaded.goals == dataset.goals
+    assert len(loaded.train_instances) == len(dataset.train_instances) == 6
+    assert list(loaded.train_instances) == dataset.train_instances
+
+    # the utterances, goals and task background of a conversation are restored once and shared
+    first, last = loaded.train_instances[0], loaded.train_instances[2]
+    assert isinstance(last['dialogue_context'], PrefixView)
+    assert last['dialogue_context'].source is first['dialogue_context'].source
+    assert last['pre_goals'].source is first['pre_goals'].source
+    assert last['task_background'] is first['task_background']
+    assert isinstance(last['task_background'], FrozenDict)
+    assert isinstance(last['dialogue_context'][0], FrozenDict)
+    with pytest.raises(TypeError):
+        last['task_background']['item_name'] = "car"
+
+    # copies of the column are plain lists
+    assert copy.deepcopy(loaded.train_instances) == dataset.train_instances
+    assert pickle.loads(pickle.dumps(loaded.train_instances)) == dataset.train_instances
+
+
+def test_snapshot_stores_shared_objects_once(tmp_path, raw_path):
+    config = FakeConfig(raw_path)
+    dataset = FakeDataset(config)
+    snapshot = DatasetSnapshot(str(tmp_path), config)
+    assert snapshot.save(dataset)
+
+    objects = np.load(os.path.join(snapshot.path, "objects.offsets.npy"))
+    # per conversation: the utterances, the goals and the task background
+    assert len(objects) - 1 == 6
+
+
+def test_snapshot_is_invalidated(tmp_path, raw_path):
+    snapshot_dir = str(tmp_path / "snapshots")
+    FakeDataset.n_processed = 0
+    load_or_create_dataset(FakeDataset, FakeConfig(raw_path), snapshot_dir=snapshot_dir)
+
+    # a change of the config
+    dataset = load_or_create_dataset(FakeDataset, FakeConfig(raw_path, max_turns=2), snapshot_dir=snapshot_dir)
+    assert FakeDataset.n_processed == 2
+    assert len(dataset.train_instances) == 4
+
+    # a change of the raw data file
+    write_raw_file(raw_path, n_turns=4)
+    dataset = load_or_create_dataset(FakeDataset, FakeConfig(raw_path), snapshot_dir=snapshot_dir)
+    assert FakeDataset.n_processed == 3
+    assert len(dataset.train_instances) == 8
+
+    loaded = load_or_create_dataset(FakeDataset, FakeConfig(raw_path), snapshot_dir=snapshot_dir)
+    assert FakeDataset.n_processed == 3
+    assert list(loaded.train_instances) == dataset.train_instances
+
+
+def test_unfaithful_records_are_not_stored(tmp_path, raw_path):
+    config = FakeConfig(raw_path)
+    dataset = FakeDataset(config)
+    dataset.train_instances[0]['goal'] = ("goal 0", "topic")
+    assert not DatasetSnapshot(str(tmp_path), config).save(dataset)
+    assert os.listdir(str(tmp_path)) == ["train.jsonl"]
@@ -0,0 +1,74 @@
+import json
+import pickle
+
+import pytest
+
+from simulator.store import SimulatorStore, save_simulator_store, get_simulator_store_path
+
+
+class FakeSimulator(object):
+
+    def __init__(self, profile, user_profile_description=None):
+        self.profile = profile
+        self.description = user_profile_description
+        self.model_type = None
+        self.use_persona = False
+
+    def set_model_type(self, model_type):
+        self.model_type = model_type
+
+    def is_using_persona(self, use_persona):
+        self.use_persona = use_persona
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    path = get_simulator_store_path(str(tmp_path / "dev_sim.pkl"))
+    profiles = [{"name": f"user {i}", "age": i} for i in range(5)]
+    descriptions = [f"description {i}" for i in range(5)]
+    save_simulator_store(path, FakeSimulator, profiles, descriptions)
+    return path
+
+
+def test_store_round_trip(store_path):
+    assert store_path.endswith("dev_sim.jsonl")
+    store = SimulatorStore(store_path, FakeSimulator, model_type="llama3", use_persona=True)
+
+    assert len(store) == 5
+    simulator = store[3]
+    assert simulator.profile == {"name": "user 3", "age": 3}
+    assert simulator.description == "description 3"
+    assert simulator.model_type == "llama3"
+    assert simulator.use_persona
+    # simulators are only created once
+    assert store[3] is simulator
+    assert store[-1].profile["age"] == 4
+
+
+def test_store_slicing(store_path):
+    store = SimulatorStore(store_path, FakeSimulator)
+    subset = store[1:5:2]
+
+    assert len(subset) == 2
+    assert [s.profile["age"] for s in subset] == [1, 3]
+    # the subsets share the created simulators with the store
+    assert subset[0] is store[1]
+    assert [s.profile["age"] for s in subset[1:]] == [3]
+
+
+def test_store_pickle(store_path):
+    store = SimulatorStore(store_path, FakeSimulator)[2:]
+    restored = pickle.loads(pickle.dumps(store))
+    assert len(restored) == 3
+    assert restored[0].profile == {"name": "user 2", "age": 2}
+
+
+def test_store_version(store_path):
+    with open(store_path) as f:
+        lines = f.readlines()
+    lines[0] = json.dumps({"version": -1, "simulator": "FakeSimulator"}) + "\n"
+    with open(store_path, "w") as f:
+        f.writelines(lines)
+
+    with pytest.raises(Exception):
+        SimulatorStore(store_path, FakeSimulator)
@@ -0,0 +1,100 @@
+import numpy as np
+import torch
+
+
+class ReplayBuffer(object):
+
+    def __init__(self, capacity, max_sequence_length, n_objectives, pad_token_id=0, seed=None):
+        """
+        constructor for class replay buffer
+        the buffer stores transitions in preallocated ring arrays, i.e. the token ids of the state and the next state,
+        the action id, the reward vector and the done flag. once the buffer is full, the oldest transitions are
+        overwritten.
+        :param capacity: the maximum number of stored transitions
+        :param max_sequence_length: the maximum length of the token ids
+        :param n_objectives: the number of objectives, i.e. the size of the reward vectors
+        :param pad_token_id: the id of the padding token
+        :param seed: random seed used to sample minibatches
+        """
+        self.capacity = capacity
+        self.max_sequence_length = max_sequence_length
+        self.pad_token_id = pad_token_id
+        self.rng = np.random.default_rng(seed)
+
+        # state and next state token ids
+        self.input_ids = np.full((capacity, max_sequence_length), pad_token_id, dtype=np.int32)
+        self.lengths = np.zeros(capacity, dtype=np.int32)
+        self.next_input_ids = np.full((capacity, max_sequence_length), pad_token_id, dtype=np.int32)
+        self.next_lengths = np.zeros(capacity, dtype=np.int32)
+
+        # actions, reward vectors and done flags
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros((capacity, n_objectives), dtype=np.float32)
+        self.dones = np.zeros(capacity, dtype=np.float32)
+
+        self.position = 0
+        self.size = 0
+
+    def add(self, input_ids, next_input_ids, action, reward, done):
+        """
+        method that stores a transition
+        :param input_ids: the token ids of the state
+        :param next_input_ids: the token ids of the next state
+        :param action: the action id
+        :param reward: the reward vector
+        :param done: the done flag
+        :return: None
+        """
+        i = self.position
+        input_ids = input_ids[:self.max_sequence_length]
+        next_input_ids = next_input_ids[:self.max_sequence_length]
+
+        self.input_ids[i] = self.pad_token_id
+        self.input_ids[i, :len(input_ids)] = input_ids
+        self.lengths[i] = len(input_ids)
+
+        self.next_input_ids[i] = self.pad_token_id
+        self.next_input_ids[i, :len(next_input_ids)] = next_input_ids
+        self.next_lengths[i] = len(next_input_ids)
+
+        self.actions[i] = action
+        self.rewards[i] = np.asarray(reward, dtype=np.float32).reshape(-1)
+        self.dones[i] = done
+
+        self.position = (self.position + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def to_features(self, input_ids, lengths, device=None):
+        """
+        method that converts padded token ids to input features, the padding is trimmed to the longest sequence
+        :param input_ids: an array of token ids
+        :param lengths: an array of sequence lengths
+        :param device: the device of the output tensors
+        :return: a dictionary of input_ids and attention_mask
+        """
+        max_length = int(lengths.max())
+        input_ids = torch.from_numpy(input_ids[:, :max_length].astype(np.int64))
+        attention_mask = (torch.arange(max_length).unsqueeze(0) < torch.from_numpy(lengths).unsqueeze(1)).long()
+        return {
+            "input_ids": input_ids.to(device),
+            "attention_mask": attention_mask.to(device)
+        }
+
+    def sample(self, batch_size, device=None):
+        """
+        method that samples a random minibatch of transitions (with replacement)
+        :param batch_size: the number of sampled transitions
+        :param device: the device of the output tensors
+        :return: a batch which contains the features of the states and next states, actions, rewards and dones
+        """
+        ids = self.rng.integers(0, self.size, size=batch_size)
+        return {
+            "context": self.to_features(self.input_ids[ids], self.lengths[ids], device),
+            "next_state": self.to_features(self.next_input_ids[ids], self.next_lengths[ids], device),
+            "actions": torch.from_numpy(self.actions[ids]).to(device),
+            "rewards": torch.from_numpy(self.rewards[ids]).to(device),
+            "dones": torch.from_numpy(self.dones[ids]).to(device),
+        }
+
+    def __len__(self):
+        return self.size
@@ -0,0 +1,431 @@
+import os
+import copy
+import atexit
+import json
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import torch
+
+
+def hash_token_ids(token_ids):
+    """
+    function that computes a content-based key for a sequence of token ids
+    :param token_ids: a list (or 1-d tensor) of token ids
+    :return: a hex string which is used as the cache key
+    """
+    if isinstance(token_ids, torch.Tensor):
+        token_ids = token_ids.detach().cpu().numpy()
+    token_ids = np.asarray(token_ids, dtype=np.int64)
+    return hashlib.sha1(token_ids.tobytes()).hexdigest()
+
+
+class EmbeddingCache(object):
+
+    def __init__(self, dim, max_entries=50000, spill_dir=None, max_spill_entries=500000):
+        """
+        constructor for class embedding cache
+        the cache maps a token-id sequence to its (frozen) PLM embedding.
+        recently used embeddings are kept in memory, evicted embeddings are optionally spilled to a
+        memory-mapped file on disk.
+        :param dim: the dimension of the cached embeddings
+        :param max_entries: the maximum number of embeddings kept in memory
+        :param spill_dir: the directory of the on-disk store, None if we do not spill evicted embeddings
+        :param max_spill_entries: the maximum number of embeddings kept in the on-disk store
+        """
+        self.dim = dim
+        self.max_entries = max_entries
+        self.spill_dir = spill_dir
+        self.max_spill_entries = max_spill_entries
+
+        # in-memory lru store, key -> cpu tensor
+        self.memory = OrderedDict()
+
+        # on-disk store, key -> slot in the memory-mapped array
+        self.disk_index = OrderedDict()
+        self.disk_store = None
+        self.free_slots = []
+        self.next_slot = 0
+
+        # hit and miss counters
+        self.hits = 0
+        self.misses = 0
+
+        self.disk_path = None
+        if self.spill_dir is not None:
+            if not os.path.exists(self.spill_dir):
+                os.makedirs(self.spill_dir)
+            self.disk_path = os.path.join(self.spill_dir, f"embeddings_{os.getpid()}_{id(self)}.bin")
+            # the spill file is removed when the process exits
+            atexit.register(self.close_disk_store)
+
+    def open_disk_store(self):
+        """
+        method that creates the memory-mapped spill file on the first spilled embedding
+        :return: the memory-mapped array
+        """
+        if self.disk_store is None:
+            self.disk_store = np.memmap(self.disk_path,
+                                        dtype=np.float32,
+                                        mode='w+',
+                                        shape=(self.max_spill_entries, self.dim))
+        return self.disk_store
+
+    def close_disk_store(self):
+        """
+        method that closes and deletes the memory-mapped spill file
+        :return: None
+        """
+        if self.disk_store is not None:
+            # the mapping is released once the array is garbage collected
+            self.disk_store.flush()
+            self.disk_store = None
+        if self.disk_path is not None and os.path.exists(self.disk_path):
+            os.remove(self.disk_path)
+
+    def get(self, key):
+        """
+        method that looks up the embedding of a given key
+        :param key: the cache key
+        :return: a cpu tensor if the key is in the cache else None
+        """
+        # look up the in-memory store
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return self.memory[key]
+
+        # look up the on-disk store
+        # promote the embedding back to memory
+        if key in self.disk_index:
+            slot = self.disk_index.pop(key)
+            embedding = torch.from_numpy(np.array(self.disk_store[slot]))
+            self.free_slots.append(slot)
+            self._put_in_memory(key, embedding)
+            self.hits += 1
+            return embedding
+
+        self.misses += 1
+        return None
+
+    def put(self, key, embedding):
+        """
+        method that stores an embedding in the cache
+        :param key: the cache key
+        :param embedding: a 1-d tensor
+        :return: None
+        """
+        # clone so that the cached vector does not keep the storage of the whole batch output alive
+        embedding = embedding.detach().float().cpu().clone()
+        self._put_in_memory(key, embedding)
+
+    def _put_in_memory(self, key, embedding):
+        """
+        method that puts an embedding in the in-memory store and evicts the least recently used ones
+        :param key: the cache key
+        :param embedding: a 1-d cpu tensor
+        :return: None
+        """
+        self.memory[key] = embedding
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            evicted_key, evicted_embedding = self.memory.popitem(last=False)
+            if self.disk_path is not None:
+                self._spill(evicted_key, evicted_embedding)
+
+    def _spill(self, key, embedding):
+        """
+        method that writes an evicted embedding to the on-disk store
+        once the store is full, the slot of the oldest spilled embedding is reused
+        :param key: the cache key
+        :param embedding: a 1-d cpu tensor
+        :return: None
+        """
+        if len(self.free_slots) > 0:
+            slot = self.free_slots.pop()
+        elif self.next_slot < self.max_spill_entries:
+            slot = self.next_slot
+            self.next_slot += 1
+        else:
+            _, slot = self.disk_index.popitem(last=False)
+        self.open_disk_store()[slot] = embedding.numpy()
+        self.disk_index[key] = slot
+
+    def clear(self):
+        """
+        method that removes all cached embeddings
+        :return: None
+        """
+        self.memory.clear()
+        self.disk_index.clear()
+        self.close_disk_store()
+        self.free_slots = []
+        self.next_slot = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.memory) + len(self.disk_index)
+
+    def __deepcopy__(self, memo):
+        # the cache is content-addressed, copies of the model share the same cache
+        return self
+
+
+class LLMResponseCache(object):
+
+    def __init__(self, db_path, max_entries=1000000, max_temperature=0.01, flush_every=256):
+        """
+        constructor for class llm response cache
+        the cache persists the responses of (near) deterministic llm calls in a local sqlite database.
+        an entry is keyed on the model, the prompt messages, the temperature, the max number of tokens and the
+        number of samples. once the store is full, the least recently used entries are evicted.
+        the access times of the hits are buffered in memory and written on the next put, every flush_every hits
+        and at exit, so that a hit does not commit a transaction.
+        :param db_path: the path to the sqlite database
+        :param max_entries: the maximum number of cached responses
+        :param max_temperature: calls with a higher temperature are sampled and therefore never cached
+        :param flush_every: the maximum number of buffered access times
+        """
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_temperature = max_temperature
+        self.flush_every = flush_every
+
+        # key -> logical time of the last access, not yet written to the database
+        self.pending_accesses = {}
+
+        # hit and miss counters
+        self.hits = 0
+        self.misses = 0
+
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir != '' and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        # the connection is shared by the rollout threads, accesses are serialized with a lock
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "last_access INTEGER NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self.connection.commit()
+
+        # logical clock used to order the accesses
+        row = self.connection.execute("SELECT MAX(last_access), COUNT(*) FROM responses").fetchone()
+        self.clock = row[0] if row[0] is not None else 0
+        self.n_entries = row[1]
+        atexit.register(self.flush)
+
+    def is_cacheable(self, temperature):
+        """
+        method that checks if a call with the given temperature is deterministic enough to be cached
+        :param temperature: the prompting temperature
+        :return: True if the responses of the call can be cached else False
+        """
+        return temperature <= self.max_temperature
+
+    @staticmethod
+    def make_key(model, messages, temperature, max_token, n=1):
+        """
+        method that computes the cache key of a llm call
+        :param model: the name of the llm
+        :param messages: the prompt messages
+        :param temperature: the prompting temperature
+        :param max_token: the maximum number of output tokens
+        :param n: the number of samples
+        :return: a hex string which is used as the cache key
+        """
+        content = json.dumps([model, messages, temperature, max_token, n], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """
+        method that looks up the cached responses of a given key
+        :param key: the cache key
+        :return: the list of cached responses if the key is in the cache else None
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.clock += 1
+            self.pending_accesses[key] = self.clock
+            if len(self.pending_accesses) >= self.flush_every:
+                self.write_accesses()
+                self.connection.commit()
+            self.hits += 1
+            return json.loads(row[0])
+
+    def write_accesses(self):
+        """
+        method that writes the buffered access times to the database, the caller holds the lock and commits
+        :return: None
+        """
+        if len(self.pending_accesses) > 0:
+            self.connection.executemany("UPDATE responses SET last_access = ? WHERE key = ?",
+                                        [(clock, key) for key, clock in self.pending_accesses.items()])
+            self.pending_accesses = {}
+
+    def flush(self):
+        """
+        method that writes the buffered access times to the database
+        :return: None
+        """
+        with self.lock:
+            self.write_accesses()
+            self.connection.commit()
+
+    def put(self, key, responses):
+        """
+        method that stores the responses of a llm call
+        :param key: the cache key
+        :param responses: the list of generated responses
+        :return: None
+        """
+        with self.lock:
+            # the access times decide which entries are evicted
+            self.write_accesses()
+            self.clock += 1
+            value = json.dumps(responses, ensure_ascii=False)
+            cursor = self.connection.execute("UPDATE responses SET value = ?, last_access = ? WHERE key = ?",
+                                             (value, self.clock, key))
+            if cursor.rowcount == 0:
+                self.connection.execute("INSERT INTO responses (key, value, last_access) VALUES (?, ?, ?)",
+                                        (key, value, self.clock))
+                self.n_entries += 1
+            # evict the least recently used entries
+            if self.n_entries > self.max_entries:
+                self.connection.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)",
+                    (self.n_entries - self.max_entries,)
+                )
+                self.n_entries = self.max_entries
+            self.connection.commit()
+
+    def clear(self):
+        """
+        method that removes all cached responses
+        :return: None
+        """
+        with self.lock:
+            self.connection.execute("DELETE FROM responses")
+            self.connection.commit()
+            self.pending_accesses = {}
+            self.clock = 0
+            self.n_entries = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        method that returns the statistics of the cache
+        :return: a dictionary with the number of entries, hits and misses and the hit rate
+        """
+        n_lookups = self.hits + self.misses
+        return {
+            "entries": self.n_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / n_lookups if n_lookups > 0 else 0.0
+        }
+
+    def __len__(self):
+        return self.n_entries
+
+
+def kv_cache_nbytes(past_key_values):
+    """
+    function that computes the memory footprint of the past key values of a transformer
+    :param past_key_values: a transformers cache object or a legacy tuple of (key, value) tensors per layer
+    :return: the number of bytes
+    """
+    if hasattr(past_key_values, "layers"):
+        tensors = [t for layer in past_key_values.layers for t in (layer.keys, layer.values) if t is not None]
+    elif hasattr(past_key_values, "key_cache"):
+        tensors = list(past_key_values.key_cache) + list(past_key_values.value_cache)
+    else:
+        tensors = [t for layer in past_key_values for t in layer]
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class PrefixKVCache(object):
+
+    def __init__(self, max_bytes):
+        """
+        constructor for class prefix kv cache
+        the cache maps a token-id prefix of a prompt to the past key values of the llm computed on that prefix,
+        so that a prompt which extends a cached prefix only needs to encode its new suffix.
+        the least recently used prefixes are evicted once the cached past key values exceed the memory budget.
+        :param max_bytes: the memory budget of the cached past key values
+        """
+        self.max_bytes = max_bytes
+        # key -> (past key values, size in bytes)
+        self.store = OrderedDict()
+        self.n_bytes = 0
+        self.lock = threading.Lock()
+
+        # hit and miss counters
+        self.hits = 0
+        self.misses = 0
+
+    def longest_prefix(self, token_ids, boundaries):
+        """
+        method that looks up the longest cached prefix of a prompt
+        :param token_ids: the token ids of the prompt
+        :param boundaries: candidate prefix lengths, e.g. the end positions of the chat messages
+        :return: the length of the longest cached prefix and a copy of its past key values, (0, None) if it is a miss
+        """
+        with self.lock:
+            for length in sorted(boundaries, reverse=True):
+                key = hash_token_ids(token_ids[:length])
+                if key in self.store:
+                    self.store.move_to_end(key)
+                    self.hits += 1
+                    # generation appends to the past key values in place
+                    return length, copy.deepcopy(self.store[key][0])
+            self.misses += 1
+            return 0, None
+
+    def put(self, token_ids, past_key_values):
+        """
+        method that caches the past key values of a prompt prefix
+        :param token_ids: the token ids of the prefix
+        :param past_key_values: the past key values computed on the prefix
+        :return: None
+        """
+        key = hash_token_ids(token_ids)
+        n_bytes = kv_cache_nbytes(past_key_values)
+        if n_bytes > self.max_bytes:
+            return
+        past_key_values = copy.deepcopy(past_key_values)
+        with self.lock:
+            if key in self.store:
+                self.store.move_to_end(key)
+                return
+            self.store[key] = (past_key_values, n_bytes)
+            self.n_bytes += n_bytes
+            # evict the least recently used prefixes
+            while self.n_bytes > self.max_bytes:
+                _, (_, evicted_bytes) = self.store.popitem(last=False)
+                self.n_bytes -= evicted_bytes
+
+    def clear(self):
+        """
+        method that removes all cached prefixes
+        :return: None
+        """
+        with self.lock:
+            self.store.clear()
+            self.n_bytes = 0
+
+    def __len__(self):
+        return len(self.store)
@@ -0,0 +1,142 @@
+import copy
+from collections.abc import MutableSequence
+
+
+class PrefixView(MutableSequence):
+
+    def __init__(self, source, end):
+        """
+        constructor for class prefix view
+        a prefix view is a read-only window source[:end] over a list which is shared by all instances of a conversation.
+        the prefix is only materialised into its own list on demand, i.e. when the view is modified.
+        deep copies and pickles of the view are plain lists.
+        :param source: the shared list, e.g. the utterances of a conversation
+        :param end: the end index of the prefix
+        """
+        self.source = source
+        self.end = end
+        self.items = None
+
+    def materialize(self):
+        """
+        method that returns the prefix as a list
+        :return: a list of elements
+        """
+        if self.items is not None:
+            return self.items
+        return self.source[:self.end]
+
+    def own(self):
+        """
+        method that copies the prefix into its own list before the view is modified (copy-on-write)
+        :return: the owned list
+        """
+        if self.items is None:
+            self.items = self.source[:self.end]
+            self.source = None
+        return self.items
+
+    def __len__(self):
+        if self.items is not None:
+            return len(self.items)
+        return self.end
+
+    def __getitem__(self, index):
+        if self.items is not None:
+            return self.items[index]
+        if isinstance(index, slice):
+            return self.source[:self.end][index]
+        if index < 0:
+            index += self.end
+        if index < 0 or index >= self.end:
+            raise IndexError("list index out of range")
+        return self.source[index]
+
+    def __iter__(self):
+        if self.items is not None:
+            return iter(self.items)
+        return (self.source[i] for i in range(self.end))
+
+    def __setitem__(self, index, value):
+        self.own()[index] = value
+
+    def __delitem__(self, index):
+        del self.own()[index]
+
+    def insert(self, index, value):
+        self.own().insert(index, value)
+
+    def append(self, value):
+        self.own().append(value)
+
+    def extend(self, values):
+        self.own().extend(values)
+
+    def __add__(self, other):
+        return self.materialize() + list(other)
+
+    def __radd__(self, other):
+        return list(other) + self.materialize()
+
+    def __eq__(self, other):
+        if isinstance(other, (list, PrefixView)):
+            return self.materialize() == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(self.materialize())
+
+    def __copy__(self):
+        return self.materialize()[:]
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(self.materialize(), memo)
+
+    def __reduce__(self):
+        return list, (self.materialize(),)
+
+
+class FrozenDict(dict):
+    """
+    a read-only dictionary for the records which are shared by all instances of a conversation,
+    e.g. the task background and the utterances. the nested values are not frozen.
+    copies, deep copies and pickles of a frozen dictionary are plain (mutable) dictionaries,
+    and it is serialized by json like a plain dictionary.
+    """
+
+    def readonly(self, *args, **kwargs):
+        raise TypeError(f"{self.__class__.__name__} is shared by several instances and can not be modified, "
+                        f"please modify a copy instead")
+
+    __setitem__ = readonly
+    __delitem__ = readonly
+    __ior__ = readonly
+    clear = readonly
+    pop = readonly
+    popitem = readonly
+    setdefault = readonly
+    update = readonly
+
+    def copy(self):
+        return dict(self)
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(dict(self), memo)
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+def to_serializable(obj):
+    """
+    function that converts prefix views to lists, used as the default function of json.dumps
+    frozen dictionaries are dict subclasses and thus serialized by json without this function.
+    :param obj: an object that is not serializable by json
+    :return: a serializable object
+    """
+    if isinstance(obj, PrefixView):
+        return obj.materialize()
+    raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
@@ -101,14 +101,129 @@ def random_weights(
         w = np.array([[x for t in range(dim)]])
     else:
         raise ValueError(f"Unknown distribution {dist}")
-    new_w = []
-    for y in w:
-        new_w.append([round_nearest(x, p) for x in y])
+    # rounding the weights in bulk
+    new_w = (np.round(w / p) * p).tolist()
     if n == 1:
         return new_w[0]
     return new_w
 
 
+def cube_to_simplex(u):
+    """
+    function that maps points of the unit cube to the weight simplex
+    the map is measure preserving (stick breaking with the marginals of a Dirichlet alpha=1), therefore
+    uniform or low-discrepancy points in the cube remain uniform or low-discrepancy on the simplex.
+    :param u: an array of shape [n, dim - 1] with values in [0, 1)
+    :return: an array of shape [n, dim]
+    """
+    n, dim = u.shape[0], u.shape[1] + 1
+    w = np.zeros((n, dim))
+    remaining = np.ones(n)
+    for j in range(dim - 1):
+        # the j-th stick fraction follows a Beta(1, dim - 1 - j) distribution
+        fraction = 1.0 - (1.0 - u[:, j]) ** (1.0 / (dim - 1 - j))
+        w[:, j] = remaining * fraction
+        remaining = remaining - w[:, j]
+    w[:, -1] = remaining
+    return w
+
+
+class PreferenceSampler(object):
+
+    def __init__(self, dim, pool_size=10000, dist="dirichlet", p=0.01, seed=None, stratified=False):
+        """
+        constructor for class preference sampler
+        the sampler keeps a pool of quantized weight vectors which is generated and rounded in bulk.
+        in the stratified mode, each call returns a randomly shifted low-discrepancy set of weights, so that
+        even a small number of preferences covers the weight simplex.
+        :param dim: size of the weight vector
+        :param pool_size: number of weight vectors generated at once
+        :param dist: distribution to use, either 'gaussian' or 'dirichlet'
+        :param p: the quantization step
+        :param seed: random seed
+        :param stratified: True if we use the stratified (low-discrepancy) mode
+        """
+        self.dim = dim
+        self.pool_size = pool_size
+        self.dist = dist
+        self.p = p
+        self.stratified = stratified
+        self.rng = np.random.default_rng(seed)
+
+        # the generalized golden ratio used by the low-discrepancy sequence
+        phi = 2.0
+        for _ in range(32):
+            phi = (1.0 + phi) ** (1.0 / dim)
+        self.alpha = np.array([(1.0 / phi) ** (j + 1) for j in range(dim - 1)])
+
+        self.pool = None
+        self.position = 0
+        if not self.stratified:
+            self.refill()
+
+    def quantize(self, w):
+        """
+        method that rounds the weight vectors to the nearest multiple of the quantization step
+        :param w: an array of weight vectors
+        :return: an array of quantized weight vectors
+        """
+        return (np.round(w / self.p) * self.p).astype(np.float32)
+
+    def refill(self):
+        """
+        method that regenerates the pool of weight vectors
+        :return: None
+        """
+        if self.dist == "gaussian":
+            w = self.rng.standard_normal((self.pool_size, self.dim))
+            w = np.abs(w) / np.linalg.norm(w, ord=1, axis=1, keepdims=True)
+        elif self.dist == "dirichlet":
+            w = self.rng.dirichlet(np.ones(self.dim), self.pool_size)
+        else:
+            raise ValueError(f"Unknown distribution {self.dist}")
+        self.pool = self.quantize(w)
+        self.position = 0
+
+    def stratified_sample(self, n):
+        """
+        method that generates a randomly shifted low-discrepancy set of weight vectors
+        :param n: number of weight vectors
+        :return: an array of shape [n, dim]
+        """
+        shift = self.rng.random(self.dim - 1)
+        u = (shift + np.arange(1, n + 1).reshape(-1, 1) * self.alpha) % 1.0
+        return self.quantize(cube_to_simplex(u))
+
+    def sample(self, n=1):
+        """
+        method that samples weight vectors
+        :param n: number of weight vectors
+        :return: an array of shape [n, dim]
+        """
+        if self.stratified:
+            return self.stratified_sample(n)
+
+        samples = []
+        while n > 0:
+            if self.position >= len(self.pool):
+                self.refill()
+            chunk = self.pool[self.position:self.position + n]
+            self.position += len(chunk)
+            n -= len(chunk)
+            samples.append(chunk)
+        return np.concatenate(samples, axis=0)
+
+    def sample_from(self, memory, n):
+        """
+        method that samples (with replacement) weight vectors from a memory of previous preferences
+        :param memory: a sequence of weight vectors
+        :param n: number of weight vectors
+        :return: an array of shape [n, dim]
+        """
+        ids = self.rng.integers(0, len(memory), size=n)
+        return np.array([memory[i] for i in ids], dtype=np.float32)
+
+
 def create_cases(test_instances, num_cases=100, shuffle=False):
     """
     method that create a set of negotiation cases for the negotiation and emotional support scenarios.
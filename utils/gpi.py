@@ -0,0 +1,58 @@
+import torch
+
+
+def scalarize(q_values, preferences):
+    """
+    function that scalarizes multi-objective action values with preference vectors
+    :param q_values: a tensor of shape [N, n_actions, n_objectives]
+    :param preferences: a tensor of shape [N, n_objectives], one preference per row of q_values
+    :return: a tensor of shape [N, n_actions]
+    """
+    return torch.einsum('nak,nk->na', q_values, preferences)
+
+
+def gpi_scores(q_values, preferences, chunk_size=None):
+    """
+    function that computes the generalized policy improvement scores max_w w^T Q(s, a)
+    the preferences are processed in chunks so that the peak memory does not grow with the number of preferences
+    :param q_values: a tensor of shape [bs, n_actions, n_objectives]
+    :param preferences: a tensor of shape [n_preferences, n_objectives]
+    :param chunk_size: the number of preferences processed at once, all preferences if None
+    :return: a tensor of shape [bs, n_actions]
+    """
+    n_preferences = preferences.size(0)
+    if chunk_size is None:
+        chunk_size = n_preferences
+
+    scores = None
+    for start in range(0, n_preferences, chunk_size):
+        # bs, chunk_size, n_actions
+        chunk_scores = torch.einsum('bak,nk->bna', q_values, preferences[start:start + chunk_size])
+        chunk_scores = chunk_scores.max(dim=1)[0]
+        scores = chunk_scores if scores is None else torch.maximum(scores, chunk_scores)
+    return scores
+
+
+def envelope_scores(q_values, preferences, eps=1e-8):
+    """
+    function that computes the scores used to select the greedy actions of the envelope update
+    i.e. the scalarized action values weighted by the cosine similarity between the preference and the action values
+    :param q_values: a tensor of shape [N, n_actions, n_objectives]
+    :param preferences: a tensor of shape [N, n_objectives], one preference per row of q_values
+    :param eps: a small value to avoid division by zero
+    :return: a tensor of shape [N, n_actions]
+    """
+    scores = scalarize(q_values, preferences)
+    norms = q_values.norm(dim=-1).clamp(min=eps) * preferences.norm(dim=-1, keepdim=True).clamp(min=eps)
+    return scores * (scores / norms)
+
+
+def gather_action_values(q_values, actions):
+    """
+    function that collects the multi-objective values of the given actions
+    :param q_values: a tensor of shape [N, n_actions, n_objectives]
+    :param actions: a tensor of shape [N] which contains action ids
+    :return: a tensor of shape [N, n_objectives]
+    """
+    index = actions.view(-1, 1, 1).expand(-1, 1, q_values.size(-1))
+    return q_values.gather(1, index).squeeze(1)
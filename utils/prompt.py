@@ -1,11 +1,17 @@
 import os
 import copy
+import math
+import asyncio
+from statistics import NormalDist
 
 from dotenv import load_dotenv
+from loguru import logger
 import openai
+import aiohttp
 
 from googleapiclient import discovery
 import json
+import threading
 
 import transformers
 from transformers import pipeline
@@ -19,18 +25,18 @@ from tenacity import (
 )  # for exponential backoff
 
 from config.constants import LLM_MODEL, LLAMA3, CHATGPT, LLAMA3_MODEL
+from utils.cache import LLMResponseCache, PrefixKVCache
 
 load_dotenv()
 
 
-@retry(
+# the backoff policy of the llm requests
+llm_retry = retry(
     retry=retry_if_exception_type((openai.error.APIError, openai.error.APIConnectionError, openai.error.RateLimitError,
                                    openai.error.ServiceUnavailableError, openai.error.Timeout)),
     wait=wait_random_exponential(multiplier=1, max=60),
     stop=stop_after_attempt(10)
 )
-def chat_completion_with_backoff(**kwargs):
-    return openai.ChatCompletion.create(**kwargs)
 
 
 # load the environment variables
@@ -41,22 +47,288 @@ API_KEY = os.getenv("API_KEY")
 MODEL = LLM_MODEL
 openai.api_key = API_KEY
 
+
+class TokenBucket(object):
+
+    def __init__(self, rate, capacity=None):
+        """
+        constructor for class token bucket
+        the bucket is refilled with rate tokens per second, each request consumes one token.
+        :param rate: the number of requests per second
+        :param capacity: the maximum burst size, equal to the rate if None
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.last_time = None
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """
+        method that waits until a token is available and consumes it
+        :return: None
+        """
+        async with self.lock:
+            loop = asyncio.get_running_loop()
+            while True:
+                now = loop.time()
+                if self.last_time is not None:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.last_time) * self.rate)
+                self.last_time = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AsyncLLMClient(object):
+
+    def __init__(self, max_in_flight=16, requests_per_second=None, api_base=None, api_key=None):
+        """
+        constructor for class async llm client
+        the client runs an event loop in a background thread and sends the chat completion requests over a pooled
+        http session. the number of in-flight requests is capped and the request rate is limited by a token bucket.
+        failed requests are retried with the same backoff policy as the synchronous calls.
+        :param max_in_flight: the maximum number of concurrent requests
+        :param requests_per_second: the maximum request rate, no rate limit if None
+        :param api_base: the base url of an openai-compatible server, the openai api if None
+        :param api_key: the api key, the default api key if None
+        """
+        self.max_in_flight = max_in_flight
+        self.requests_per_second = requests_per_second
+        self.api_base = api_base
+        self.api_key = api_key
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+        # the session, the semaphore and the bucket are bound to the event loop of the client
+        self.session, self.semaphore, self.bucket = self.run(self.setup())
+
+    async def setup(self):
+        """
+        method that creates the pooled http session, the in-flight semaphore and the token bucket
+        :return: the session, the semaphore and the token bucket
+        """
+        session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.max_in_flight))
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        bucket = TokenBucket(self.requests_per_second) if self.requests_per_second is not None else None
+        return session, semaphore, bucket
+
+    def run(self, coroutine):
+        """
+        method that runs a coroutine on the event loop of the client and waits for its result
+        :param coroutine: the coroutine
+        :return: the result of the coroutine
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    @llm_retry
+    async def create(self, **kwargs):
+        """
+        method that sends a single chat completion request, retried with backoff
+        :param kwargs: the parameters of the chat completion request
+        :return: the chat completion response
+        """
+        if self.bucket is not None:
+            await self.bucket.acquire()
+        async with self.semaphore:
+            openai.aiosession.set(self.session)
+            return await openai.ChatCompletion.acreate(**kwargs)
+
+    async def chat_completion(self, **kwargs):
+        """
+        method that sends a chat completion request
+        :param kwargs: the parameters of the chat completion request
+        :return: the chat completion response
+        """
+        if self.api_base is not None:
+            kwargs.setdefault("api_base", self.api_base)
+        if self.api_key is not None:
+            kwargs.setdefault("api_key", self.api_key)
+        return await self.create(**kwargs)
+
+    async def chat_completions(self, requests):
+        """
+        method that sends several chat completion requests concurrently
+        :param requests: a list of dictionaries, each contains the parameters of a request
+        :return: a list of responses, aligned with the given requests
+        """
+        return await asyncio.gather(*[self.chat_completion(**kwargs) for kwargs in requests])
+
+    def chat_completion_sync(self, **kwargs):
+        """
+        synchronous wrapper of the chat completion method, safe to call from any thread
+        :param kwargs: the parameters of the chat completion request
+        :return: the chat completion response
+        """
+        return self.run(self.chat_completion(**kwargs))
+
+    def chat_completions_sync(self, requests):
+        """
+        synchronous wrapper of the chat completions method, safe to call from any thread
+        :param requests: a list of dictionaries, each contains the parameters of a request
+        :return: a list of responses, aligned with the given requests
+        """
+        return self.run(self.chat_completions(requests))
+
+    def close(self):
+        """
+        method that closes the http session and stops the event loop
+        :return: None
+        """
+        self.run(self.session.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+# the async llm client, a process-wide singleton created on its first use
+# configured by the LLM_MAX_IN_FLIGHT, LLM_REQUESTS_PER_SECOND and LLM_API_BASE variables
+llm_client = None
+llm_client_lock = threading.Lock()
+
+
+def get_llm_client():
+    """
+    function that returns the async llm client, the client is created on the first call
+    :return: an instance of the async llm client
+    """
+    global llm_client
+    if llm_client is None:
+        with llm_client_lock:
+            if llm_client is None:
+                requests_per_second = os.getenv("LLM_REQUESTS_PER_SECOND")
+                llm_client = AsyncLLMClient(
+                    max_in_flight=int(os.getenv("LLM_MAX_IN_FLIGHT", 16)),
+                    requests_per_second=float(requests_per_second) if requests_per_second is not None else None,
+                    api_base=os.getenv("LLM_API_BASE")
+                )
+    return llm_client
+
+
+def chat_completion_with_backoff(**kwargs):
+    # synchronous call through the async llm client
+    return get_llm_client().chat_completion_sync(**kwargs)
+
 # API for toxicity evaluation
 PERSPECTIVE_API_KEY = os.getenv('PERSPECTIVE_KEY')
 
-# llama3 pipeline
-llama_pipeline = transformers.pipeline(
-    "text-generation",
-    model=LLAMA3_MODEL,
-    model_kwargs={"torch_dtype": torch.bfloat16},
-    device_map="auto",
-)
-terminators = [
-    llama_pipeline.tokenizer.eos_token_id,
-    llama_pipeline.tokenizer.convert_tokens_to_ids("<|eot_id|>")
-]
+# persistent cache of the (near) deterministic llm responses
+# the cache is disabled unless the LLM_CACHE_PATH variable is set or enable_llm_cache is called
+llm_cache = None
+
+
+def enable_llm_cache(db_path, max_entries=1000000, max_temperature=0.01):
+    """
+    function that enables the persistent llm response cache
+    :param db_path: the path to the sqlite database
+    :param max_entries: the maximum number of cached responses
+    :param max_temperature: calls with a higher temperature are never cached
+    :return: the llm response cache
+    """
+    global llm_cache
+    llm_cache = LLMResponseCache(db_path, max_entries=max_entries, max_temperature=max_temperature)
+    return llm_cache
+
+
+def lookup_llm_cache(model, prompt, temperature, max_token, n=1):
+    """
+    function that looks up the cached responses of a llm call
+    :param model: the name of the llm
+    :param prompt: the input prompt
+    :param temperature: the prompting temperature
+    :param max_token: the maximum number of output tokens
+    :param n: the number of samples
+    :return: the cache key, None if the call is not cached, and the cached responses, None if it is a miss
+    """
+    if llm_cache is None or not llm_cache.is_cacheable(temperature):
+        return None, None
+    key = llm_cache.make_key(model, prompt, temperature, max_token, n)
+    return key, llm_cache.get(key)
+
+
+if os.getenv("LLM_CACHE_PATH") is not None:
+    enable_llm_cache(os.getenv("LLM_CACHE_PATH"))
+
+# the prefix kv cache of the llama3 model
+# the cache is disabled unless the LLAMA3_PREFIX_CACHE_BYTES variable is set or enable_prefix_cache is called
+prefix_cache = None
+
+
+def enable_prefix_cache(max_bytes):
+    """
+    function that enables the prefix kv cache of the llama3 model
+    :param max_bytes: the memory budget of the cached past key values
+    :return: the prefix kv cache
+    """
+    global prefix_cache
+    prefix_cache = PrefixKVCache(max_bytes)
+    return prefix_cache
+
+
+if os.getenv("LLAMA3_PREFIX_CACHE_BYTES") is not None:
+    enable_prefix_cache(int(os.getenv("LLAMA3_PREFIX_CACHE_BYTES")))
+
+# the llm and the sentiment analysis pipelines
+# the pipelines are process-wide singletons created on their first use
+llama_pipeline = None
+terminators = None
+sentiment_analysis = None
+pipeline_lock = threading.Lock()
 
-sentiment_analysis = pipeline(model="cardiffnlp/twitter-roberta-base-sentiment")
+
+def get_llama_pipeline():
+    """
+    function that returns the llama3 pipeline, the pipeline is loaded on the first call
+    :return: the llama3 pipeline and the list of terminator token ids
+    """
+    global llama_pipeline, terminators
+    if llama_pipeline is None:
+        with pipeline_lock:
+            if llama_pipeline is None:
+                # llama3 pipeline
+                new_pipeline = transformers.pipeline(
+                    "text-generation",
+                    model=LLAMA3_MODEL,
+                    model_kwargs={"torch_dtype": torch.bfloat16},
+                    device_map="auto",
+                )
+                terminators = [
+                    new_pipeline.tokenizer.eos_token_id,
+                    new_pipeline.tokenizer.convert_tokens_to_ids("<|eot_id|>")
+                ]
+                # batched generation requires a padding token
+                # prompts are left-padded since the model generates on the right
+                new_pipeline.tokenizer.pad_token_id = new_pipeline.tokenizer.eos_token_id
+                new_pipeline.tokenizer.padding_side = "left"
+                llama_pipeline = new_pipeline
+    return llama_pipeline, terminators
+
+
+def get_sentiment_analysis():
+    """
+    function that returns the sentiment analysis pipeline, the pipeline is loaded on the first call
+    :return: the sentiment analysis pipeline
+    """
+    global sentiment_analysis
+    if sentiment_analysis is None:
+        with pipeline_lock:
+            if sentiment_analysis is None:
+                sentiment_analysis = pipeline(model="cardiffnlp/twitter-roberta-base-sentiment")
+    return sentiment_analysis
+
+
+def warm_up(model_type=LLAMA3, use_sentiment=False):
+    """
+    function that loads the pipelines ahead of the first llm call
+    :param model_type: the type of the llm, the llama3 pipeline is only loaded for the llama3 model
+    :param use_sentiment: True if we load the sentiment analysis pipeline else False
+    :return: None
+    """
+    if model_type == LLAMA3:
+        get_llama_pipeline()
+    if use_sentiment:
+        get_sentiment_analysis()
 
 
 def call_llama3_model(prompt, temperature=0.0, max_token=30, n_return_sequences=1):
@@ -67,6 +339,17 @@ def call_llama3_model(prompt, temperature=0.0, max_token=30, n_return_sequences=
     :param max_token: max gen tokens
     :return:
     """
+    key, cached_responses = lookup_llm_cache(LLAMA3_MODEL, prompt, temperature, max_token, n_return_sequences)
+    if cached_responses is not None:
+        return cached_responses if n_return_sequences > 1 else cached_responses[0]
+
+    if prefix_cache is not None:
+        responses = call_llama3_model_with_prefix_cache(prompt, temperature, max_token, n_return_sequences)
+        if key is not None:
+            llm_cache.put(key, responses)
+        return responses if n_return_sequences > 1 else responses[0]
+
+    llama_pipeline, terminators = get_llama_pipeline()
     response = llama_pipeline(
         prompt,
         max_new_tokens=max_token,
@@ -76,10 +359,113 @@ def call_llama3_model(prompt, temperature=0.0, max_token=30, n_return_sequences=
         top_p=0.9,
         num_return_sequences=n_return_sequences
     )
+    responses = [x["generated_text"][-1]["content"] for x in response]
+    if key is not None:
+        llm_cache.put(key, responses)
     if n_return_sequences > 1:
-        return [x["generated_text"][-1]["content"] for x in response]
+        return responses
     else:
-        return response[0]["generated_text"][-1]["content"]
+        return responses[0]
+
+
+def call_llama3_model_batch(prompts, temperature=0.0, max_token=30, n_return_sequences=1, batch_size=None):
+    """
+    function that calls the llama3 model on a list of prompts in padded batches
+    :param prompts: a list of chat prompts
+    :param temperature: the prompting temperature
+    :param max_token: max gen tokens
+    :param n_return_sequences: the number of generated sequences per prompt
+    :param batch_size: the number of prompts per forward pass, all prompts at once if None
+    :return: a list of lists of generated responses, aligned with the given prompts
+    """
+    if len(prompts) == 0:
+        return []
+    # with the prefix cache, prompts are generated one by one on top of their cached prefixes
+    if prefix_cache is not None:
+        return [call_llama3_model_with_prefix_cache(prompt, temperature, max_token, n_return_sequences)
+                for prompt in prompts]
+    llama_pipeline, terminators = get_llama_pipeline()
+    outputs = llama_pipeline(
+        prompts,
+        batch_size=batch_size if batch_size is not None else len(prompts),
+        max_new_tokens=max_token,
+        eos_token_id=terminators,
+        pad_token_id=llama_pipeline.tokenizer.pad_token_id,
+        do_sample=True,
+        temperature=temperature,
+        top_p=0.9,
+        num_return_sequences=n_return_sequences
+    )
+    return [[x["generated_text"][-1]["content"] for x in output] for output in outputs]
+
+
+def get_message_boundaries(tokenizer, prompt, token_ids):
+    """
+    function that computes the end positions of the chat messages in the token ids of a prompt
+    the llama3 chat template closes every message with an <|eot_id|> token, so the boundaries are found
+    in one pass over the token ids of the whole prompt.
+    :param tokenizer: the tokenizer of the llm
+    :param prompt: a list of chat messages
+    :param token_ids: the token ids of the whole prompt
+    :return: a list of prefix lengths, one per message of the prompt, an empty list if the messages
+    can not be located, e.g. if a message contains the end-of-turn token itself
+    """
+    end_of_turn_id = tokenizer.convert_tokens_to_ids("<|eot_id|>")
+    boundaries = [i + 1 for i, token_id in enumerate(token_ids) if token_id == end_of_turn_id]
+    if len(boundaries) != len(prompt):
+        return []
+    return boundaries
+
+
+def call_llama3_model_with_prefix_cache(prompt, temperature=0.0, max_token=30, n_return_sequences=1):
+    """
+    function that calls the llama3 model, reusing the past key values of the longest cached prompt prefix
+    the past key values of the prompt without its last message are cached for the following calls, since
+    prompts of the next turn extend the dialogue history but usually end with a different instruction.
+    :param prompt: a list of chat messages
+    :param temperature: the prompting temperature
+    :param max_token: max gen tokens
+    :param n_return_sequences: the number of generated sequences
+    :return: a list of generated responses
+    """
+    llama_pipeline, terminators = get_llama_pipeline()
+    tokenizer, model = llama_pipeline.tokenizer, llama_pipeline.model
+    token_ids = tokenizer.apply_chat_template(prompt, tokenize=True, add_generation_prompt=True)
+    boundaries = get_message_boundaries(tokenizer, prompt, token_ids)
+
+    # the longest cached prefix, the cache returns its own copy of the past key values
+    start, past_key_values = prefix_cache.longest_prefix(token_ids, boundaries)
+    if past_key_values is None:
+        past_key_values = transformers.DynamicCache()
+
+    with torch.no_grad():
+        # encode the prompt up to its last message and cache the past key values
+        end = boundaries[-2] if len(boundaries) > 1 else None
+        if end is not None and end > start:
+            input_ids = torch.tensor([token_ids[start:end]], device=model.device)
+            model(input_ids=input_ids, past_key_values=past_key_values, use_cache=True)
+            prefix_cache.put(token_ids[:end], past_key_values)
+
+        # only the remaining suffix of the prompt is encoded during generation
+        prefix_length = past_key_values.get_seq_length()
+        input_ids = torch.tensor([token_ids], device=model.device)
+        responses = []
+        for _ in range(n_return_sequences):
+            outputs = model.generate(
+                input_ids=input_ids,
+                attention_mask=torch.ones_like(input_ids),
+                past_key_values=past_key_values,
+                max_new_tokens=max_token,
+                eos_token_id=terminators,
+                pad_token_id=tokenizer.pad_token_id,
+                do_sample=True,
+                temperature=temperature,
+                top_p=0.9,
+            )
+            responses.append(tokenizer.decode(outputs[0, len(token_ids):], skip_special_tokens=True))
+            # generation appends to the past key values in place, drop the keys and values of this sample
+            past_key_values.crop(prefix_length)
+    return responses
 
 
 def reformat_demonstration(demonstration, is_agent_start=False):
@@ -112,44 +498,126 @@ def call_llm(prompt, n=1, temperature=0.0, max_token=10, model_type='chatgpt'):
     :param model_type: the name of the large language mdoel
     :return:
     """
-    responses = []
-    # call llm for n times
-    for i in range(n):
-        # the llm is the chatgpt model
-        if model_type == CHATGPT:
-            # call the llm with backoff
-            assert 1 == 0
-            response = chat_completion_with_backoff(
-                model=MODEL,
-                messages=prompt,
-                temperature=temperature,
-                max_tokens=max_token
-            )
+    # both llms are served by the batched implementation, so that the caching, the retries and the
+    # sampling of the n responses are identical for single and batched calls
+    return call_llm_batch([prompt], n=n, temperature=temperature, max_token=max_token, model_type=model_type)[0]
 
-            responses.append(response.choices[0]['message']['content'])
-        # the llm is the llama 3 model
-        elif model_type == LLAMA3:
-            # do something here
-            responses.append(call_llama3_model(prompt, temperature, max_token))
-    return responses
 
+def call_llm_batch(prompts, n=1, temperature=0.0, max_token=10, model_type='chatgpt'):
+    """
+    function that calls llm on a list of prompts
+    for chatgpt, the n samples of a prompt are drawn in one request using the n parameter.
+    for llama3, all prompts are sent to the pipeline in one padded batch.
+    :param prompts: a list of input prompts
+    :param n: number of samples per prompt
+    :param temperature: the temperature we use to prompt the llm
+    :param max_token: the maximum number of output tokens
+    :param model_type: the name of the large language mdoel
+    :return: a list of lists of responses, aligned with the given prompts
+    """
+    if model_type == CHATGPT:
+        model = MODEL
+    elif model_type == LLAMA3:
+        model = LLAMA3_MODEL
+    else:
+        raise Exception("Invalid LLM model type ...")
+
+    # look up the cached responses
+    # only the missed prompts are sent to the llm
+    keys = []
+    results = []
+    for prompt in prompts:
+        key, cached_responses = lookup_llm_cache(model, prompt, temperature, max_token, n)
+        keys.append(key)
+        results.append(cached_responses)
+    missed_ids = [idx for idx, result in enumerate(results) if result is None]
+    missed_prompts = [prompts[idx] for idx in missed_ids]
+
+    # the llm is the chatgpt model
+    # the requests of all missed prompts are sent concurrently
+    if model_type == CHATGPT:
+        requests = [{"model": MODEL, "messages": prompt, "temperature": temperature, "max_tokens": max_token, "n": n}
+                    for prompt in missed_prompts]
+        responses = []
+        for response in get_llm_client().chat_completions_sync(requests):
+            responses.append([choice['message']['content'] for choice in response.choices])
+    # the llm is the llama 3 model
+    else:
+        responses = call_llama3_model_batch(missed_prompts, temperature, max_token, n_return_sequences=n)
 
-def get_llm_based_assessment_for_recommendation(target_topic, simulated_conversation,
-                                                demonstration=None,
-                                                n=10,
-                                                temperature=1.1,
-                                                max_tokens=50,
-                                                profile_description=None,
-                                                model_type='chatgpt'):
+    for idx, response in zip(missed_ids, responses):
+        results[idx] = response
+        if keys[idx] is not None:
+            llm_cache.put(keys[idx], response)
+    return results
+
+
+def wilson_interval(n_positive, n_samples, confidence=0.95):
     """
-    function that computes an target-driven assessment given the current conversation
-    :param target_topic: the target item
-    :param simulated_conversation: the generated conversation
-    :param demonstration: an demonstrative example
-    :param n: the number of times we prompt the model
+    function that computes the wilson score interval of a vote fraction
+    :param n_positive: the number of positive votes
+    :param n_samples: the number of votes
+    :param confidence: the confidence level of the interval
+    :return: the lower and upper bounds of the interval
+    """
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    p = n_positive / n_samples
+    denominator = 1 + z * z / n_samples
+    centre = (p + z * z / (2 * n_samples)) / denominator
+    half_width = z * math.sqrt(p * (1 - p) / n_samples + z * z / (4 * n_samples * n_samples)) / denominator
+    return centre - half_width, centre + half_width
+
+
+def sequential_vote(prompts, is_positive, n=10, temperature=1.1, max_tokens=20, model_type='chatgpt',
+                    confidence=0.95, round_size=2, threshold=0.5):
+    """
+    function that draws the votes of several prompts in rounds, and stops sampling a prompt once the vote is decided
+    i.e. once the confidence interval of its vote fraction lies entirely above or below the threshold.
+    the remaining prompts of each round are sent in one batched llm call.
+    :param prompts: a list of input prompts
+    :param is_positive: a function that maps a response to True if it is a positive vote
+    :param n: the maximum number of votes per prompt
     :param temperature: the temperature used to prompt the llm
     :param max_tokens: the maximal number of tokens used to prompt the llm
-    :return:
+    :param model_type: the name of the large language mdoel
+    :param confidence: the confidence level of the stopping rule
+    :param round_size: the number of votes drawn per prompt in each round
+    :param threshold: the vote fraction that separates the two outcomes
+    :return: a list of lists of responses, aligned with the given prompts
+    """
+    all_responses = [[] for _ in prompts]
+    live_ids = list(range(len(prompts)))
+    while len(live_ids) > 0:
+        n_round = min(round_size, n - len(all_responses[live_ids[0]]))
+        outputs = call_llm_batch([prompts[idx] for idx in live_ids], n=n_round, temperature=temperature,
+                                 max_token=max_tokens, model_type=model_type)
+        next_live_ids = []
+        for idx, responses in zip(live_ids, outputs):
+            all_responses[idx].extend(responses)
+            n_samples = len(all_responses[idx])
+            n_positive = sum([1 for response in all_responses[idx] if is_positive(response)])
+            lower, upper = wilson_interval(n_positive, n_samples, confidence)
+            # the vote is decided or the budget is used up
+            if lower > threshold or upper < threshold or n_samples >= n:
+                continue
+            next_live_ids.append(idx)
+        live_ids = next_live_ids
+
+    logger.info(f"Judge samples used: {[len(responses) for responses in all_responses]} (max {n} per conversation)")
+    return all_responses
+
+
+# the answer of the recommendation judge if the user accepted the target item
+ACCEPT_STRING = "accept"
+REJECT_STRING = "reject"
+
+
+def construct_recommendation_assessment_prompt(target_topic, simulated_conversation):
+    """
+    function that constructs the prompt used to assess if the user accepted the target item
+    :param target_topic: the target item
+    :param simulated_conversation: the generated conversation
+    :return: a list of messages
     """
     # messages = []
     # if demonstration is not None:
@@ -166,8 +634,8 @@ def get_llm_based_assessment_for_recommendation(target_topic, simulated_conversa
     #                                       is_agent_start=demonstration['goal_type_list'][0] == 'Greetings'):
     #         messages.append(utt)
 
-    accept_string = "accept"
-    reject_string = "reject"
+    accept_string = ACCEPT_STRING
+    reject_string = REJECT_STRING
 
     system_instruction_2 = f"""
     Based on the given conversation, please decide whether the user accepted the item: {target_topic} at the end of the conversation.
@@ -204,48 +672,96 @@ def get_llm_based_assessment_for_recommendation(target_topic, simulated_conversa
     messages.append(
         {'role': 'user', 'content': system_instruction_3}
     )
+    return messages
 
-    responses = []
 
-    # prompt llm for n times
-    if model_type == CHATGPT:
-        for i in range(n):
-            # calling the chat gpt
-            response = chat_completion_with_backoff(
-                model=MODEL,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens
-            )
-            responses.append(response.choices[0]['message']['content'])
-    # calling the llama 3
-    elif model_type == LLAMA3:
-        responses.extend(call_llama3_model(messages, temperature, max_tokens, n_return_sequences=n))
+def get_llm_based_assessment_for_recommendation(target_topic, simulated_conversation,
+                                                demonstration=None,
+                                                n=10,
+                                                temperature=1.1,
+                                                max_tokens=50,
+                                                profile_description=None,
+                                                model_type='chatgpt',
+                                                early_stopping=False,
+                                                confidence=0.95):
+    """
+    function that computes an target-driven assessment given the current conversation
+    :param target_topic: the target item
+    :param simulated_conversation: the generated conversation
+    :param demonstration: an demonstrative example
+    :param n: the number of times we prompt the model
+    :param temperature: the temperature used to prompt the llm
+    :param max_tokens: the maximal number of tokens used to prompt the llm
+    :param early_stopping: True if we stop sampling once the majority vote is decided
+    :param confidence: the confidence level of the early stopping rule
+    :return: the assessment, and the number of samples used if early stopping is enabled
+    """
+    outputs = get_llm_based_assessments_for_recommendation([target_topic], [simulated_conversation],
+                                                           n=n,
+                                                           temperature=temperature,
+                                                           max_tokens=max_tokens,
+                                                           model_type=model_type,
+                                                           early_stopping=early_stopping,
+                                                           confidence=confidence)
+    if early_stopping:
+        assessments, n_samples = outputs
+        return assessments[0], n_samples[0]
+    return outputs[0]
+
+
+def get_llm_based_assessments_for_recommendation(target_topics, simulated_conversations,
+                                                 n=10,
+                                                 temperature=1.1,
+                                                 max_tokens=50,
+                                                 model_type='chatgpt',
+                                                 early_stopping=False,
+                                                 confidence=0.95):
+    """
+    function that computes the target-driven assessments of a list of conversations in one batched llm call
+    the n votes of each conversation are sampled in the same request.
+    with early stopping, the votes are drawn in rounds until the majority vote of each conversation is decided.
+    :param target_topics: a list of target items
+    :param simulated_conversations: a list of generated conversations
+    :param n: the number of times we prompt the model
+    :param temperature: the temperature used to prompt the llm
+    :param max_tokens: the maximal number of tokens used to prompt the llm
+    :param early_stopping: True if we stop sampling once the majority vote is decided
+    :param confidence: the confidence level of the early stopping rule
+    :return: a list of assessments, i.e. the fraction of votes which say that the user accepted the target item,
+    and the list of numbers of samples used if early stopping is enabled
+    """
+    prompts = [construct_recommendation_assessment_prompt(target_topic, simulated_conversation)
+               for target_topic, simulated_conversation in zip(target_topics, simulated_conversations)]
+
+    def is_accepted(response):
+        return response.lower() == ACCEPT_STRING.lower()
+
+    if early_stopping:
+        all_responses = sequential_vote(prompts, is_accepted, n=n, temperature=temperature, max_tokens=max_tokens,
+                                        model_type=model_type, confidence=confidence)
+    else:
+        all_responses = call_llm_batch(prompts, n=n, temperature=temperature, max_token=max_tokens,
+                                       model_type=model_type)
 
     # convert the text-based assessment to scalar based assessment
-    # processing the llm's outputs
-    # convert the text-based assessment to scalar based assessment
-    is_successful = 0
-    for response in responses:
-        if response.lower() == accept_string.lower():
-            is_successful += 1
+    assessments = []
+    for responses in all_responses:
+        is_successful = 0
+        for response in responses:
+            if is_accepted(response):
+                is_successful += 1
+        assessments.append(float(is_successful) / len(responses))
 
-    return float(is_successful) / n
+    if early_stopping:
+        return assessments, [len(responses) for responses in all_responses]
+    return assessments
 
 
-def get_llm_based_assessment_for_negotiation(simulated_conversation,
-                                             n=10,
-                                             temperature=1.1,
-                                             max_tokens=20,
-                                             model_type='chatgpt'
-                                             ):
+def construct_negotiation_assessment_prompt(simulated_conversation):
     """
-    function that assesses if there is a deal between the user and the system in a negotiation conversation
-    :param simulated_conversation: 
-    :param n:
-    :param temperature: 
-    :param max_tokens: 
-    :return:
+    function that constructs the prompt used to assess if there is a deal in a negotiation conversation
+    :param simulated_conversation: the simulated conversation between the seller and the buyer
+    :return: a list of messages
     """
     # the reward computation function for negotiation scenario
     # the following code is borrowed from the PPDPP official implementation
@@ -282,40 +798,55 @@ def get_llm_based_assessment_for_negotiation(simulated_conversation,
                             Question: Have they reached a deal? 
                             Answer: """
                 }]
-    
+    return messages
 
-    responses = []
-    # prompt llm for n times
-    if model_type == CHATGPT:
-        for i in range(n):
-            # calling the chat gpt
-            response = chat_completion_with_backoff(
-                model=MODEL,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens
-            )
-            responses.append(response.choices[0]['message']['content'])
-    else:
-        responses.extend(call_llama3_model(messages, temperature, max_tokens, n_return_sequences=n))
-    # convert the text-based assessment to scalar based assessment
-    # processing the llm's outputs
-    return responses
+
+def get_llm_based_assessment_for_negotiation(simulated_conversation,
+                                             n=10,
+                                             temperature=1.1,
+                                             max_tokens=20,
+                                             model_type='chatgpt'
+                                             ):
+    """
+    function that assesses if there is a deal between the user and the system in a negotiation conversation
+    :param simulated_conversation: 
+    :param n:
+    :param temperature: 
+    :param max_tokens: 
+    :return:
+    """
+    return get_llm_based_assessments_for_negotiation([simulated_conversation],
+                                                     n=n,
+                                                     temperature=temperature,
+                                                     max_tokens=max_tokens,
+                                                     model_type=model_type)[0]
+
+
+def get_llm_based_assessments_for_negotiation(simulated_conversations,
+                                              n=10,
+                                              temperature=1.1,
+                                              max_tokens=20,
+                                              model_type='chatgpt'):
+    """
+    function that assesses a list of negotiation conversations in one batched llm call
+    the n votes of each conversation are sampled in the same request.
+    :param simulated_conversations: a list of simulated conversations between the seller and the buyer
+    :param n: the number of times we prompt the model
+    :param temperature: the temperature used to prompt the llm
+    :param max_tokens: the maximal number of tokens used to prompt the llm
+    :return: a list of lists of text-based assessments, aligned with the given conversations
+    """
+    prompts = [construct_negotiation_assessment_prompt(simulated_conversation)
+               for simulated_conversation in simulated_conversations]
+    return call_llm_batch(prompts, n=n, temperature=temperature, max_token=max_tokens, model_type=model_type)
 
 
-def get_llm_based_assessment_for_emotional_support(state,
-                                                   simulated_conversation,
-                                                   n=10,
-                                                   temperature=1.1,
-                                                   max_tokens=20,
-                                                   model_type='chatgpt'):
+def construct_emotional_support_assessment_prompt(state, simulated_conversation):
     """
-    function that assesses if the supporter successfully confront the seeker in a emotional support conversation
+    function that constructs the prompt used to assess if the emotional issue of the seeker has been solved
+    :param state: the current state of the conversation
     :param simulated_conversation: the simulated conversation between the seeker and the supporter
-    :param n: the number of prompting the LLMs
-    :param temperature: the temperature used for prompting the LLMs
-    :param max_tokens: the maximal number of tokens generated by the LLMs
-    :return:
+    :return: a list of messages
     """
     # the reward computation function for emotional support conversation
     # the following code is borrowed from the PPDPP official implementation
@@ -336,26 +867,49 @@ def get_llm_based_assessment_for_emotional_support(state,
                             "The following is a conversation about %s regarding %s: %s\nQuestion: Has the Patient's issue been solved? Answer: " % (
                                 state['task_background']['emotion_type'], state['task_background']['problem_type'],
                                 dial)}]
+    return messages
 
-    responses = []
-    # prompt llm for n times
-    if model_type == CHATGPT:
-        for i in range(n):
-            # calling the chat gpt
-            response = chat_completion_with_backoff(
-                model=MODEL,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens
-            )
-            responses.append(response.choices[0]['message']['content'])
-    # calling the llama 3
-    elif model_type == LLAMA3:
-        responses.extend(call_llama3_model(messages, temperature, max_tokens, n_return_sequences=n))
 
-    # convert the text-based assessment to scalar based assessment
-    # processing the llm's outputs
-    return responses
+def get_llm_based_assessment_for_emotional_support(state,
+                                                   simulated_conversation,
+                                                   n=10,
+                                                   temperature=1.1,
+                                                   max_tokens=20,
+                                                   model_type='chatgpt'):
+    """
+    function that assesses if the supporter successfully confront the seeker in a emotional support conversation
+    :param simulated_conversation: the simulated conversation between the seeker and the supporter
+    :param n: the number of prompting the LLMs
+    :param temperature: the temperature used for prompting the LLMs
+    :param max_tokens: the maximal number of tokens generated by the LLMs
+    :return:
+    """
+    return get_llm_based_assessments_for_emotional_support([state], [simulated_conversation],
+                                                           n=n,
+                                                           temperature=temperature,
+                                                           max_tokens=max_tokens,
+                                                           model_type=model_type)[0]
+
+
+def get_llm_based_assessments_for_emotional_support(states,
+                                                    simulated_conversations,
+                                                    n=10,
+                                                    temperature=1.1,
+                                                    max_tokens=20,
+                                                    model_type='chatgpt'):
+    """
+    function that assesses a list of emotional support conversations in one batched llm call
+    the n votes of each conversation are sampled in the same request.
+    :param states: a list of states of the conversations
+    :param simulated_conversations: a list of simulated conversations between the seeker and the supporter
+    :param n: the number of prompting the LLMs
+    :param temperature: the temperature used for prompting the LLMs
+    :param max_tokens: the maximal number of tokens generated by the LLMs
+    :return: a list of lists of text-based assessments, aligned with the given conversations
+    """
+    prompts = [construct_emotional_support_assessment_prompt(state, simulated_conversation)
+               for state, simulated_conversation in zip(states, simulated_conversations)]
+    return call_llm_batch(prompts, n=n, temperature=temperature, max_token=max_tokens, model_type=model_type)
 
 
 def get_toxicity_assessment_for_emotional_support(generated_system_utt):
@@ -388,5 +942,5 @@ def get_user_sentiment_for_item_recommendation(generated_user_utterance):
     :param generated_user_utterance: the generated utterance of the user
     :return:
     """
-    sentiment = sentiment_analysis(generated_user_utterance)
+    sentiment = get_sentiment_analysis()(generated_user_utterance)
     return sentiment
@@ -0,0 +1,89 @@
+import copy
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class RolloutEngine(object):
+
+    def __init__(self, game, generation_method, n_workers=1):
+        """
+        constructor for class rollout engine
+        the engine runs several episodes concurrently. At each turn, the policy is called once for all live
+        episodes and the llm-bound game steps (response generation, user simulation, reward) are fanned out
+        to a thread pool.
+        :param game: an instance of the game class
+        :param generation_method: the response generation method
+        :param n_workers: the maximum number of game steps executed concurrently
+        """
+        self.game = game
+        self.generation_method = generation_method
+        self.n_workers = max(1, n_workers)
+
+    def rollout(self, cases, simulators, ws, policy, on_episode_start=None, on_transition=None,
+                on_episode_end=None):
+        """
+        method that runs one episode per (case, simulator, preference) triple
+        callbacks are always invoked from the calling thread in the order of the given episodes,
+        therefore consumers observe the same order regardless of the number of workers.
+        :param cases: a list of cases (target items or situations), one per episode
+        :param simulators: a list of user simulators, one per episode, the game steps of episodes which share a
+        simulator are serialized
+        :param ws: a list of preference vectors, one per episode
+        :param policy: a function that maps a list of states and a list of preference vectors to a list of actions
+        :param on_episode_start: a callback (episode_id, state) called after the game is reset
+        :param on_transition: a callback (episode_id, old_state, action, state, reward, done, o_done)
+        :param on_episode_end: a callback (episode_id, final_state) called when the episode is terminated
+        :return: the list of final states in the order of the given episodes
+        """
+        assert len(cases) == len(simulators) == len(ws)
+        n_episodes = len(cases)
+
+        # one lock per simulator, a simulator is not safe to be used by two concurrent episodes
+        simulator_locks = {id(simulator): threading.Lock() for simulator in simulators}
+
+        def reset(case, simulator):
+            with simulator_locks[id(simulator)]:
+                return self.game.reset(case, simulator)
+
+        with ThreadPoolExecutor(max_workers=self.n_workers) as executor:
+            # reset the games
+            # constructing the initial states s(0)
+            states = list(executor.map(reset, cases, simulators))
+            for episode_id, (state, w) in enumerate(zip(states, ws)):
+                # assign the preference weight vector
+                state['w'] = w
+                if on_episode_start is not None:
+                    on_episode_start(episode_id, state)
+
+            live_episodes = list(range(n_episodes))
+            while len(live_episodes) > 0:
+                # predict the actions of all live episodes in one batch
+                # a ~ \pi(a|s,w)
+                actions = policy([states[i] for i in live_episodes], [ws[i] for i in live_episodes])
+                old_states = [copy.deepcopy(states[i]) for i in live_episodes]
+
+                # employing the actions to observe the next states and the corresponding rewards
+                # the llm calls of all live episodes are issued concurrently
+                def step(episode_id, action):
+                    with simulator_locks[id(simulators[episode_id])]:
+                        return self.game.step(states[episode_id], action, self.generation_method,
+                                              simulators[episode_id])
+
+                outputs = list(executor.map(step, live_episodes, actions))
+
+                next_live_episodes = []
+                for episode_id, old_state, action, (state, reward, done, o_done) in zip(live_episodes, old_states,
+                                                                                       actions, outputs):
+                    states[episode_id] = state
+                    if on_transition is not None:
+                        on_transition(episode_id, old_state, action, state, reward, done, o_done)
+
+                    # the episode is terminated
+                    if done:
+                        if on_episode_end is not None:
+                            on_episode_end(episode_id, state)
+                    else:
+                        next_live_episodes.append(episode_id)
+                live_episodes = next_live_episodes
+
+        return states
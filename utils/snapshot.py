@@ -0,0 +1,403 @@
+import os
+import copy
+import json
+import shutil
+import hashlib
+from collections import defaultdict
+from collections.abc import Sequence
+
+import numpy as np
+from loguru import logger
+
+from utils.context import PrefixView, FrozenDict, to_serializable
+
+# bump the version whenever the processing of the datasets or the snapshot format changes
+# so that snapshots created by older code are not loaded anymore.
+SNAPSHOT_VERSION = 2
+
+# the kinds of the instance fields
+MISSING = 0
+# a json value in the string table
+VALUE = 1
+# an object which is shared by several instances (e.g. the task background) in the object table
+SHARED = 2
+# a prefix view over an object of the object table (e.g. the utterances of a conversation)
+PREFIX = 3
+
+# the tags of the objects in the object table
+PLAIN_OBJECT = 0
+FROZEN_DICT = 1
+# a list of frozen dictionaries, e.g. the utterances of a conversation
+FROZEN_LIST = 2
+
+
+def config_hash(dataset_config):
+    """
+    function that computes a stable hash of the dataset config and the raw data files
+    the size and the modification time of the data files are included, so that editing a raw file
+    invalidates the snapshot.
+    :param dataset_config: the configuration of the dataset
+    :return: a hex string
+    """
+    params = vars(dataset_config)
+    data_files = {}
+    for k, v in params.items():
+        if k.endswith("_data_path") and isinstance(v, str) and os.path.exists(v):
+            stat = os.stat(v)
+            data_files[k] = [stat.st_size, stat.st_mtime_ns]
+    content = json.dumps([dataset_config.__class__.__name__, params, data_files], sort_keys=True, default=str)
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()[:16]
+
+
+def save_string_table(path, name, strings):
+    """
+    function that saves a list of strings as an uint8 array of the concatenated utf-8 encoded strings
+    and an int64 array of offsets
+    :param path: the directory of the snapshot
+    :param name: the name of the table
+    :param strings: a list of strings
+    :return: None
+    """
+    encoded = [x.encode("utf-8") for x in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(x) for x in encoded])
+    np.save(os.path.join(path, f"{name}.data.npy"), np.frombuffer(b"".join(encoded), dtype=np.uint8))
+    np.save(os.path.join(path, f"{name}.offsets.npy"), offsets)
+
+
+class StringTable(Sequence):
+
+    def __init__(self, path, name):
+        """
+        constructor for class string table
+        a read-only sequence of strings stored in a memory-mapped byte array and an offset array
+        :param path: the directory of the snapshot
+        :param name: the name of the table
+        """
+        self.data = np.load(os.path.join(path, f"{name}.data.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, f"{name}.offsets.npy"), mmap_mode="r")
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return self.data[start:end].tobytes().decode("utf-8")
+
+
+def restore_object(tag, value):
+    """
+    function that restores an object of the object table from its decoded json value
+    :param tag: the tag of the object
+    :param value: the decoded json value
+    :return: the restored object
+    """
+    if tag == FROZEN_DICT:
+        return FrozenDict(value)
+    if tag == FROZEN_LIST:
+        return [FrozenDict(x) for x in value]
+    return value
+
+
+class SnapshotColumn(Sequence):
+
+    def __init__(self, n_records, fields, kinds, refs, ends, strings, objects):
+        """
+        constructor for class snapshot column
+        a read-only sequence of instances stored column-wise: each field of the instances is stored as an array of
+        kinds, an array of references to the string table or the object table and an array of prefix ends.
+        instances are only restored when they are accessed, prefix views and shared objects point to the objects of
+        the object table, which are restored once and shared by all instances.
+        :param n_records: the number of instances
+        :param fields: the list of field names
+        :param kinds: a list of int8 arrays, one per field
+        :param refs: a list of int64 arrays, one per field
+        :param ends: a list of int64 arrays, one per field
+        :param strings: the string table of the json values
+        :param objects: a function that returns the i-th restored object of the object table
+        """
+        self.fields = fields
+        self.kinds = kinds
+        self.refs = refs
+        self.ends = ends
+        self.strings = strings
+        self.objects = objects
+        self.records = [None] * n_records
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        record = self.records[index]
+        if record is None:
+            record = {}
+            for j, field in enumerate(self.fields):
+                kind, ref = self.kinds[j][index], int(self.refs[j][index])
+                if kind == VALUE:
+                    record[field] = json.loads(self.strings[ref])
+                elif kind == SHARED:
+                    record[field] = self.objects(ref)
+                elif kind == PREFIX:
+                    record[field] = PrefixView(self.objects(ref), int(self.ends[j][index]))
+            self.records[index] = record
+        return record
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(list(self), memo)
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+
+class SnapshotWriter(object):
+
+    def __init__(self):
+        """
+        constructor for class snapshot writer
+        the writer encodes lists of instances column-wise. json values are deduplicated in a string table, objects
+        which are shared by several instances (e.g. the task background and the sources of the prefix views) are
+        stored once in an object table.
+        """
+        self.strings = []
+        self.string_ids = {}
+        self.objects = []
+        self.object_tags = []
+        self.object_ids = {}
+        # the shared objects have to be kept alive while their ids are used as keys
+        self.shared = []
+
+    def add_string(self, string):
+        """
+        method that adds a string to the string table
+        :param string: the json string of a value
+        :return: the index of the string
+        """
+        if string not in self.string_ids:
+            self.string_ids[string] = len(self.strings)
+            self.strings.append(string)
+        return self.string_ids[string]
+
+    def add_object(self, obj):
+        """
+        method that adds a shared object to the object table
+        :param obj: a list or a dictionary
+        :return: the index of the object, None if it can not be stored faithfully
+        """
+        if id(obj) in self.object_ids:
+            return self.object_ids[id(obj)]
+        if isinstance(obj, FrozenDict):
+            tag = FROZEN_DICT
+        elif isinstance(obj, list) and len(obj) > 0 and all(isinstance(x, FrozenDict) for x in obj):
+            tag = FROZEN_LIST
+        else:
+            tag = PLAIN_OBJECT
+        string = self.encode(obj)
+        if string is None or restore_object(tag, json.loads(string)) != obj:
+            return None
+        self.object_ids[id(obj)] = len(self.objects)
+        self.shared.append(obj)
+        self.objects.append(string)
+        self.object_tags.append(tag)
+        return self.object_ids[id(obj)]
+
+    @staticmethod
+    def encode(value):
+        """
+        method that encodes a value as a json string
+        :param value: the value
+        :return: the json string, None if the value can not be stored faithfully
+        """
+        try:
+            string = json.dumps(value, default=to_serializable)
+        except (TypeError, ValueError):
+            return None
+        # json converts tuples and sets to lists and non-string keys to strings
+        if json.loads(string) != value:
+            return None
+        return string
+
+    def encode_column(self, records):
+        """
+        method that encodes a list of instances column-wise
+        :param records: a list of dictionaries
+        :return: the list of field names and the lists of kinds, refs and ends arrays, None if the records
+        can not be stored faithfully
+        """
+        # containers which are referenced by several instances are shared objects
+        counts = defaultdict(int)
+        for record in records:
+            for value in record.values():
+                if isinstance(value, (list, dict)):
+                    counts[id(value)] += 1
+
+        fields = []
+        for record in records:
+            for field in record:
+                if field not in fields:
+                    fields.append(field)
+
+        kinds = [np.zeros(len(records), dtype=np.int8) for _ in fields]
+        refs = [np.zeros(len(records), dtype=np.int64) for _ in fields]
+        ends = [np.zeros(len(records), dtype=np.int64) for _ in fields]
+        for i, record in enumerate(records):
+            for j, field in enumerate(fields):
+                if field not in record:
+                    continue
+                value = record[field]
+                if isinstance(value, PrefixView) and value.source is not None:
+                    kind, ref = PREFIX, self.add_object(value.source)
+                    ends[j][i] = value.end
+                elif isinstance(value, FrozenDict) or (isinstance(value, (list, dict)) and counts[id(value)] > 1):
+                    kind, ref = SHARED, self.add_object(value)
+                else:
+                    string = self.encode(value)
+                    kind, ref = VALUE, None if string is None else self.add_string(string)
+                if ref is None:
+                    logger.warning(f"The field {field} of an instance can not be stored faithfully")
+                    return None
+                kinds[j][i] = kind
+                refs[j][i] = ref
+        return fields, kinds, refs, ends
+
+
+class DatasetSnapshot(object):
+
+    def __init__(self, snapshot_dir, dataset_config, domain="all"):
+        """
+        constructor for class dataset snapshot
+        a snapshot stores the processed instances and the vocabularies of a dataset, keyed by the hash of the
+        dataset config and the domain. lists of instances are stored column-wise as arrays of references to a string
+        table of json values and to a table of shared objects, e.g. the utterances, goals and task background of each
+        conversation are stored once. the arrays are memory-mapped on loading and thus shared between processes on
+        the same host.
+        :param snapshot_dir: the directory of the snapshots
+        :param dataset_config: the configuration of the dataset
+        :param domain: the domain of the dataset
+        """
+        name = f"{dataset_config.dataset_name}-{domain}-v{SNAPSHOT_VERSION}-{config_hash(dataset_config)}"
+        self.path = os.path.join(snapshot_dir, name)
+        self.dataset_config = dataset_config
+
+    def exists(self):
+        """
+        method that checks if the snapshot exists
+        :return: True if the snapshot exists else False
+        """
+        return os.path.exists(os.path.join(self.path, "meta.json"))
+
+    def save(self, dataset):
+        """
+        method that saves the attributes of a processed dataset to the snapshot
+        :param dataset: an instance of the dataset class
+        :return: True if the snapshot is created else False
+        """
+        meta = {"version": SNAPSHOT_VERSION, "columns": {}, "attributes": {}, "config_attributes": []}
+        writer = SnapshotWriter()
+        columns = {}
+        for k, v in vars(dataset).items():
+            if v is self.dataset_config:
+                meta['config_attributes'].append(k)
+            elif isinstance(v, list) and len(v) > 0 and all(isinstance(x, dict) for x in v):
+                column = writer.encode_column(v)
+                if column is None:
+                    logger.warning(f"Attribute {k} of the dataset can not be stored, skip creating the snapshot")
+                    return False
+                columns[k] = column
+            else:
+                try:
+                    meta['attributes'][k] = json.loads(json.dumps(v, default=to_serializable))
+                except TypeError:
+                    logger.warning(f"Attribute {k} of the dataset can not be stored, skip creating the snapshot")
+                    return False
+                # json converts tuples and sets to lists, which can not be restored faithfully
+                if meta['attributes'][k] != v:
+                    logger.warning(f"Attribute {k} of the dataset can not be stored, skip creating the snapshot")
+                    return False
+
+        # write to a temporary directory, then rename it so that parallel jobs never see a partial snapshot
+        tmp_path = f"{self.path}.tmp{os.getpid()}"
+        os.makedirs(tmp_path, exist_ok=True)
+        save_string_table(tmp_path, "strings", writer.strings)
+        save_string_table(tmp_path, "objects", writer.objects)
+        np.save(os.path.join(tmp_path, "objects.tags.npy"), np.array(writer.object_tags, dtype=np.int8))
+        for k, (fields, kinds, refs, ends) in columns.items():
+            for j in range(len(fields)):
+                np.save(os.path.join(tmp_path, f"{k}.{j}.kinds.npy"), kinds[j])
+                np.save(os.path.join(tmp_path, f"{k}.{j}.refs.npy"), refs[j])
+                np.save(os.path.join(tmp_path, f"{k}.{j}.ends.npy"), ends[j])
+            meta['columns'][k] = {"n_records": len(getattr(dataset, k)), "fields": fields}
+
+        with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        try:
+            os.rename(tmp_path, self.path)
+        except OSError:
+            # another job has created the snapshot in the meantime
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        return True
+
+    def load(self, dataset_class):
+        """
+        method that restores a dataset from the snapshot without re-processing the raw data
+        :param dataset_class: the class of the dataset
+        :return: an instance of the dataset class
+        """
+        with open(os.path.join(self.path, "meta.json"), "r") as f:
+            meta = json.load(f)
+        assert meta['version'] == SNAPSHOT_VERSION
+
+        dataset = dataset_class.__new__(dataset_class)
+        for k in meta['config_attributes']:
+            setattr(dataset, k, self.dataset_config)
+        for k, v in meta['attributes'].items():
+            setattr(dataset, k, v)
+
+        strings = StringTable(self.path, "strings")
+        objects = StringTable(self.path, "objects")
+        tags = np.load(os.path.join(self.path, "objects.tags.npy"))
+        # the shared objects are restored once, on their first access
+        restored = {}
+
+        def get_object(i):
+            if i not in restored:
+                restored[i] = restore_object(tags[i], json.loads(objects[i]))
+            return restored[i]
+
+        for k, column in meta['columns'].items():
+            fields = column['fields']
+            arrays = {}
+            for name in ["kinds", "refs", "ends"]:
+                arrays[name] = [np.load(os.path.join(self.path, f"{k}.{j}.{name}.npy"), mmap_mode="r")
+                                for j in range(len(fields))]
+            setattr(dataset, k, SnapshotColumn(column['n_records'], fields, arrays['kinds'], arrays['refs'],
+                                               arrays['ends'], strings, get_object))
+        return dataset
+
+
+def load_or_create_dataset(dataset_class, dataset_config, snapshot_dir="", domain="all", overwrite=False):
+    """
+    function that loads the processed dataset from its snapshot, or processes the dataset and creates the snapshot
+    :param dataset_class: the class of the dataset
+    :param dataset_config: the configuration of the dataset
+    :param snapshot_dir: the directory of the snapshots, snapshots are disabled if it is empty
+    :param domain: the domain of the dataset
+    :param overwrite: True if we re-create the snapshot
+    :return: an instance of the dataset class
+    """
+    if not snapshot_dir:
+        return dataset_class(dataset_config)
+
+    snapshot = DatasetSnapshot(snapshot_dir, dataset_config, domain=domain)
+    if snapshot.exists() and not overwrite:
+        logger.info(f"Loading the processed dataset from {snapshot.path} ......")
+        return snapshot.load(dataset_class)
+
+    dataset = dataset_class(dataset_config)
+    if overwrite:
+        shutil.rmtree(snapshot.path, ignore_errors=True)
+    os.makedirs(snapshot_dir, exist_ok=True)
+    if snapshot.save(dataset):
+        logger.info(f"Saved the processed dataset to {snapshot.path}")
+    return dataset
@@ -1,5 +1,9 @@
+import os
 import random
 import json
+import hashlib
+import importlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import torch.random
 import yaml
@@ -9,194 +13,486 @@ import argparse
 import numpy as np
 from tqdm import tqdm
 from fastchat.model import add_model_args
-
-# datasets for recommendation
-from dataset.rec_datasets.durecdial import DuRecdial
-from dataset.rec_datasets.inspired import Inspired
-# datasets for negotiation
-from dataset.neg_datasets.bargain import CraiglistBargain
-
-# datasets for emotional support
-from dataset.es_datasets.esc import ESConv
+from loguru import logger
 
 from config.constants import *
 
 from config.config import RecommendationGameConfig, DatasetConfigForRecommendation, DatasetConfigForNegotiation, \
     NegotiationGameConfig, EmotionalSupportGameConfig, DatasetConfigForEmotionalSupport
 
-from base.game import RecommendationGame, NegotiationGame, EmotionalSupportGame
+
+class LazyImport(object):
+
+    def __init__(self, path):
+        """
+        constructor for class lazy import
+        the object refers to a class by its dotted import path, the module is only imported on lookup.
+        :param path: the dotted import path, e.g. baselines.BERT.model.BERTModel
+        """
+        self.path = path
+
+    def resolve(self):
+        """
+        method that imports the module and returns the referred object
+        :return: the referred object
+        """
+        module_path, name = self.path.rsplit('.', 1)
+        return getattr(importlib.import_module(module_path), name)
+
+
+def resolve_package(package):
+    """
+    function that resolves the lazy imports of a registered package
+    :param package: a list of config file paths, prompts and lazy imports
+    :return: the list where every lazy import is replaced by the referred object
+    """
+    return [x.resolve() if isinstance(x, LazyImport) else x for x in package]
+
+
+def lookup_registry(registry, scenario, names):
+    """
+    function that looks up a list of registered packages by their names
+    :param registry: the registry, a dictionary of scenario -> name -> package
+    :param scenario: the scenario we are considering
+    :param names: a list of names
+    :return: a list of resolved packages
+    """
+    # pre-processing for coding convenience
+    if not isinstance(names, list):
+        names = [names]
+    if scenario not in registry:
+        raise Exception("Invalid scenario !!!")
+    return [resolve_package(registry[scenario][name]) for name in names]
+
+
+# datasets
+DATASET_REGISTRY = {
+    RECOMMENDATION: {
+        DURECDIAL: [
+            DURECDIAL_CONFIG_PATH,
+            LazyImport('dataset.rec_datasets.durecdial.DuRecdial'),
+            LazyImport('config.config.DatasetConfigForRecommendation')
+
+        ],
+        INSPIRED: [
+            INSPIRED_CONFIG_PATH,
+            LazyImport('dataset.rec_datasets.inspired.Inspired'),
+            LazyImport('config.config.DatasetConfigForRecommendation')
+        ]
+    },
+    NEGOTIATION: {
+        CRAIGSLIST_BARGAIN: [
+            CRAIGSLIST_BARGAIN_CONFIG_PATH,
+            LazyImport('dataset.neg_datasets.bargain.CraiglistBargain'),
+            LazyImport('config.config.DatasetConfigForNegotiation')
+        ]
+    },
+    EMOTIONAL_SUPPORT: {
+        ES_CONV: [
+            ES_CONV_CONFIG_PATH,
+            LazyImport('dataset.es_datasets.esc.ESConv'),
+            LazyImport('config.config.DatasetConfigForEmotionalSupport')
+        ]
+    }
+}
 
 # policy models
-# BERT
-from baselines.BERT.pipeline import BERTPipelineForRecommendation
-from baselines.BERT.model import BERTModel
-from baselines.BERT.trainer import BERTTrainer
-from baselines.BERT.config import BERTConfig
-# BART
-from baselines.BART.pipeline import BARTPipelineForRecommendation
-from baselines.BART.model import BARTModel
-from baselines.BART.trainer import BARTTrainer
-from baselines.BART.config import BARTConfig
-# PPDPP
-from baselines.PPDPP.pipeline import PPDPPPipelineForRecommendation, PPDPPPipelineForNegotiation, \
-    PPDPPPipelineForEmotionalSupport
-from baselines.PPDPP.model import PPDPPModel
-from baselines.PPDPP.trainer import PPDPPTrainer
-from baselines.PPDPP.config import PPDPPConfigForRecommendation, PPDPPConfigForNegotiation, \
-    PPDPPConfigForEmotionalSupport
-
-# TRIP
-from baselines.TRIP.pipeline import TRIPPipelineForRecommendation, TRIPPipelineForNegotiation, \
-    TRIPPipelineForEmotionalSupport
-from baselines.TRIP.model import TRIPModel
-from baselines.TRIP.trainer import TRIPTrainer
-from baselines.TRIP.config import TRIPConfigForRecommendation, TRIPConfigForNegotiation, \
-    TRIPConfigForEmotionalSupport
-
-# DPDP
-from baselines.DPDP.pipeline import DPDPPipelineForRecommendation, DPDPPipelineForNegotiation, \
-    DPDPPipelineForEmotionalSupport
-from baselines.DPDP.model import DPDPModel
-from baselines.DPDP.trainer import DPDPTrainer
-from baselines.DPDP.config import DPDPConfigForRecommendation, DPDPConfigForNegotiation, \
-    DPDPConfigForEmotionalSupport
-
-
-# UNIMIND
-from baselines.UNIMIND.pipeline import UNIMINDPipelineForRecommendation
-from baselines.UNIMIND.model import UNIMINDModel
-from baselines.UNIMIND.trainer import UNIMINDTrainer
-from baselines.UNIMIND.config import UNIMINDConfigForRecommendation
-
-# RTCP
-from baselines.RTCP.pipeline import RTCPPipelineForRecommendation, RTCPPipelineForNegotiation, \
-    RTCPPipelineForEmotionalSupport
-from baselines.RTCP.model import RTCPModel
-from baselines.RTCP.trainer import RTCPTrainer
-from baselines.RTCP.config import RTCPConfigForRecommendation, RTCPConfigForNegotiation, \
-    RTCPConfigForEmotionalSupport
-
-# COLOR
-from baselines.COLOR.pipeline import COLORPipelineForRecommendation
-from baselines.COLOR.model import COLORModel
-from baselines.COLOR.trainer import COLORTrainer
-from baselines.COLOR.config import COLORConfigForRecommendation
-
-# MODPL
-from modpl.config import MODPLConfigForRecommendation, MODPLConfigForNegotiation, MODPLConfigForEmotionalSupport
-from modpl.trainer import MODPLTrainer
-from modpl.model import MODPLModel
-from modpl.pipeline import MODPLPipelineForRecommendation, MODPLPiplineForNegotiation, MODPLPiplineForEmotionalSupport
-
-# # Contextual NODPL
-# from modpl_new.config import ContextualMODPLConfigForRecommendation, ContextualMODPLConfigForNegotiation, \
-#     ContextualMODPLConfigForEmotionalSupport
-# from modpl_new.trainer import ContextualMODPLTrainer
-# from modpl_new.model import ContextualMODPLModel
-# from modpl_new.pipeline import ContextualMODPLPipelineForRecommendation, ContextualMODPLPipelineForNegotiation, \
-#     ContextualMODPLPipelineForEmotionalSupport
-
-# Contextual NODPL
-from modpl_new_ver2.config import ContextualMODPLConfigForRecommendation, ContextualMODPLConfigForNegotiation, \
-    ContextualMODPLConfigForEmotionalSupport
-from modpl_new_ver2.trainer import ContextualMODPLTrainer
-from modpl_new_ver2.model import ContextualMODPLModel
-from modpl_new_ver2.pipeline import ContextualMODPLPipelineForRecommendation, ContextualMODPLPipelineForNegotiation, \
-    ContextualMODPLPipelineForEmotionalSupport
-
-# SetMax PADPP
-from baselines.PADPP_smp.config import SetMaxPADPPConfigForRecommendation, SetMaxPADPPConfigForNegotiation, \
-    SetMaxPADPPConfigForEmotionalSupport
-from baselines.PADPP_smp.trainer import SetMaxPADPPTrainer
-from baselines.PADPP_smp.model import SetMaxPADPPModel
-from baselines.PADPP_smp.pipeline import SetMaxPADPPPipelineForNegotiation, SetMaxPADPPPipelineForRecommendation, \
-    SetMaxPADPPPipelineForEmotionalSupport
-
-
-# Min Dist PADPP
-from baselines.PADPP_min_dist.config import MinDistPADPPConfigForRecommendation, MinDistPADPPConfigForNegotiation, \
-    MinDistPADPPConfigForEmotionalSupport
-from baselines.PADPP_min_dist.trainer import MinDistPADPPTrainer
-from baselines.PADPP_min_dist.model import MinDistPADPPModel
-from baselines.PADPP_min_dist.pipeline import MinDistPADPPPipelineForNegotiation, MinDistPADPPPipelineForRecommendation, \
-    MinDistPADPPPipelineForEmotionalSupport
-
-
-# Deep Double Q Learning
-from baselines.DDQL.config import DDQLConfigForRecommendation, DDQLConfigForNegotiation, \
-    DDQLConfigForEmotionalSupport
-from baselines.DDQL.trainer import DDQLTrainer
-from baselines.DDQL.model import DDQLModel
-from baselines.DDQL.pipeline import DDQLPipelineForRecommendation, DDQLPipelineForNegotiation, \
-    DDQLPipelineForEmotionalSupport
-
-
-# Envelope MOQ
-from baselines.Envelope.config import EnvelopeConfigForRecommendation, EnvelopeConfigForNegotiation, \
-    EnvelopeConfigForEmotionalSupport
-from baselines.Envelope.trainer import EnvelopeTrainer
-from baselines.Envelope.model import EnvelopeModel
-from baselines.Envelope.pipeline import EnvelopePipelineForRecommendation, EnvelopePipelineForNegotiation, \
-    EnvelopePipelineForEmotionalSupport
-
-
-# Pro_active Chain-of-thought (ProCOT)
-from baselines.ProCOT.config import ProCOTConfigForNegotiation, ProCOTConfigForEmotionalSupport
-from baselines.ProCOT.trainer import ProCOTTrainer
-from baselines.ProCOT.model import ProCOTModel
-from baselines.ProCOT.pipeline import ProCOTPipelineForNegotiation, ProCOTPipelineForEmotionalSupport
-
-# Standard Prompting (Standard)
-from baselines.Standard.config import StandardPromptConfigForNegotiation, StandardPromptConfigForEmotionalSupport
-from baselines.Standard.trainer import StandardPromptTrainer
-from baselines.Standard.model import StandardPromptModel
-from baselines.Standard.pipeline import StandardPromptPipelineForNegotiation, StandardPromptPipelineForEmotionalSupport
-
-# ICL_AIF model
-from baselines.ICL_AIF.config import ICLAIFConfigForNegotiation, ICLAIFConfigForEmotionalSupport
-from baselines.ICL_AIF.trainer import ICLAIFTrainer
-from baselines.ICL_AIF.model import ICLAIFModel
-from baselines.ICL_AIF.pipeline import ICLAIFPipelineForNegotiation, ICLAIFPipelineForEmotionalSupport
-
-# Proactive
-from baselines.Proactive.config import ProactiveConfigForNegotiation, ProactiveConfigForEmotionalSupport
-from baselines.Proactive.trainer import ProactiveTrainer
-from baselines.Proactive.model import ProactiveModel
-from baselines.Proactive.pipeline import ProactivePipelineForNegotiation, ProactivePipelineForEmotionalSupport
-
-# Ask-an-Expert
-from baselines.AnE.config import AnEConfigForNegotiation, AnEConfigForEmotionalSupport
-from baselines.AnE.trainer import AnETrainer
-from baselines.AnE.model import AnEModel
-from baselines.AnE.pipeline import AnEPipelineForNegotiation, AnEPipelineForEmotionalSupport
-
-# GDP-Zero
-from baselines.GDP_Zero.config import GDPZeroConfigForNegotiation, GDPZeroConfigForEmotionalSupport
-from baselines.GDP_Zero.trainer import GDPZeroTrainer
-from baselines.GDP_Zero.model import GDPZeroModel
-from baselines.GDP_Zero.pipeline import GDPZeroPipelineForNegotiation, GDPZeroPipelineForEmotionalSupport
-
-# metrics for evaluation
-from eval.metric import Accuracy, PrecisionRecallF1, Item_Freq, SR, OfflineMetric, OnlineMetric, DistN, AverageTurn, \
-    RougeN, BleuN, Fairness, SL_Ratio, Toxicity, User_Reward
-
-# user simulators
-from simulator.rec_simulator import RecommendationSimulator
-from simulator.neg_simulator import NegotiationSimulator
-from simulator.es_simulator import EmotionalSupportSimulator
-
-# utility classes for BART generation
-from text_gen.bart_generation import BARTGeneration, BARTGenerationConfig, BARTTrainerForGeneration, \
-    BARTModelForGeneration, BARTPipelineForGeneration
-
-from text_gen.chatgpt_generation import ChatGPTGeneration, ChatGPTConfigForGeneration
-from text_gen.vicuna_generation import VicunaGeneration, VicunaGenerationConfig
-from text_gen.llama3_generation import Llama3Generation, Llama3ConfigForGeneration
-
-# loggers
-from logger.file_logger import FileLogger
-from logger.terminal_logger import TerminalLogger
-from logger.wandb_logger import WanDBLogger
+MODEL_REGISTRY = {
+    RECOMMENDATION: {
+        BERT: [
+            BERT_CONFIG_PATH,
+            LazyImport('baselines.BERT.config.BERTConfig'),
+            LazyImport('baselines.BERT.model.BERTModel'),
+            LazyImport('baselines.BERT.pipeline.BERTPipelineForRecommendation'),
+            LazyImport('baselines.BERT.trainer.BERTTrainer'),
+        ],
+        BART: [
+            BART_CONFIG_PATH,
+            LazyImport('baselines.BART.config.BARTConfig'),
+            LazyImport('baselines.BART.model.BARTModel'),
+            LazyImport('baselines.BART.pipeline.BARTPipelineForRecommendation'),
+            LazyImport('baselines.BART.trainer.BARTTrainer'),
+        ],
+        # PPDPP model
+        PPDPP: [
+            PPDPP_CONFIG_PATH_FOR_RECOMMENDATION,
+            LazyImport('baselines.PPDPP.config.PPDPPConfigForRecommendation'),
+            LazyImport('baselines.PPDPP.model.PPDPPModel'),
+            LazyImport('baselines.PPDPP.pipeline.PPDPPPipelineForRecommendation'),
+            LazyImport('baselines.PPDPP.trainer.PPDPPTrainer')
+        ],
+        # DPDP
+        DPDP: [
+            DPDP_CONFIG_PATH_FOR_RECOMMENDATION,
+            LazyImport('baselines.DPDP.config.DPDPConfigForRecommendation'),
+            LazyImport('baselines.DPDP.model.DPDPModel'),
+            LazyImport('baselines.DPDP.pipeline.DPDPPipelineForRecommendation'),
+            LazyImport('baselines.DPDP.trainer.DPDPTrainer')
+        ],
+        # TRIP model
+        TRIP: [
+            TRIP_CONFIG_PATH_FOR_RECOMMENDATION,
+            LazyImport('baselines.TRIP.config.TRIPConfigForRecommendation'),
+            LazyImport('baselines.TRIP.model.TRIPModel'),
+            LazyImport('baselines.TRIP.pipeline.TRIPPipelineForRecommendation'),
+            LazyImport('baselines.TRIP.trainer.TRIPTrainer')
+        ],
+        # unimind model
+        UNIMIND: [
+            UNIMIND_CONFIG_PATH_FOR_RECOMMENDATION,
+            LazyImport('baselines.UNIMIND.config.UNIMINDConfigForRecommendation'),
+            LazyImport('baselines.UNIMIND.model.UNIMINDModel'),
+            LazyImport('baselines.UNIMIND.pipeline.UNIMINDPipelineForRecommendation'),
+            LazyImport('baselines.UNIMIND.trainer.UNIMINDTrainer')
+        ],
+        # color model
+        COLOR: [
+            COLOR_CONFIG_PATH_FOR_RECOMMENDATION,
+            LazyImport('baselines.COLOR.config.COLORConfigForRecommendation'),
+            LazyImport('baselines.COLOR.model.COLORModel'),
+            LazyImport('baselines.COLOR.pipeline.COLORPipelineForRecommendation'),
+            LazyImport('baselines.COLOR.trainer.COLORTrainer')
+        ],
+        # RTCP model
+        RTCP: [
+            RTCP_CONFIG_PATH_FOR_RECOMMENDATION,
+            LazyImport('baselines.RTCP.config.RTCPConfigForRecommendation'),
+            LazyImport('baselines.RTCP.model.RTCPModel'),
+            LazyImport('baselines.RTCP.pipeline.RTCPPipelineForRecommendation'),
+            LazyImport('baselines.RTCP.trainer.RTCPTrainer')
+        ],
+        # preference-enhanced model
+        MODPL: [
+            MODPL_CONFIG_PATH_FOR_RECOMMENDATION,
+            LazyImport('modpl.config.MODPLConfigForRecommendation'),
+            LazyImport('modpl.model.MODPLModel'),
+            LazyImport('modpl.pipeline.MODPLPipelineForRecommendation'),
+            LazyImport('modpl.trainer.MODPLTrainer')
+        ],
+        # contextual MODPL
+        CONTEXTUAL_MODPL: [
+            CONTEXTUAL_MODPL_CONFIG_PATH_FOR_RECOMMENDATION,
+            LazyImport('modpl_new_ver2.config.ContextualMODPLConfigForRecommendation'),
+            LazyImport('modpl_new_ver2.model.ContextualMODPLModel'),
+            LazyImport('modpl_new_ver2.pipeline.ContextualMODPLPipelineForRecommendation'),
+            LazyImport('modpl_new_ver2.trainer.ContextualMODPLTrainer')
+        ],
+        # DDQL
+        DDQL: [
+            DDQL_CONFIG_PATH_FOR_RECOMMENDATION,
+            LazyImport('baselines.DDQL.config.DDQLConfigForRecommendation'),
+            LazyImport('baselines.DDQL.model.DDQLModel'),
+            LazyImport('baselines.DDQL.pipeline.DDQLPipelineForRecommendation'),
+            LazyImport('baselines.DDQL.trainer.DDQLTrainer')
+        ]
+    },
+    NEGOTIATION: {
+        # PPDPP model
+        PPDPP: [
+            PPDPP_CONFIG_PATH_FOR_NEGOTIATION,
+            LazyImport('baselines.PPDPP.config.PPDPPConfigForNegotiation'),
+            LazyImport('baselines.PPDPP.model.PPDPPModel'),
+            LazyImport('baselines.PPDPP.pipeline.PPDPPPipelineForNegotiation'),
+            LazyImport('baselines.PPDPP.trainer.PPDPPTrainer')
+        ],
+        # trip
+        TRIP: [
+            TRIP_CONFIG_PATH_FOR_NEGOTIATION,
+            LazyImport('baselines.TRIP.config.TRIPConfigForNegotiation'),
+            LazyImport('baselines.TRIP.model.TRIPModel'),
+            LazyImport('baselines.TRIP.pipeline.TRIPPipelineForNegotiation'),
+            LazyImport('baselines.TRIP.trainer.TRIPTrainer')
+        ],
+        # DPDP
+        DPDP: [
+            DPDP_CONFIG_PATH_FOR_NEGOTIATION,
+            LazyImport('baselines.DPDP.config.DPDPConfigForNegotiation'),
+            LazyImport('baselines.DPDP.model.DPDPModel'),
+            LazyImport('baselines.DPDP.pipeline.DPDPPipelineForNegotiation'),
+            LazyImport('baselines.DPDP.trainer.DPDPTrainer')
+        ],
+        # ddql
+        DDQL: [
+            DDQL_CONFIG_PATH_FOR_NEGOTIATION,
+            LazyImport('baselines.DDQL.config.DDQLConfigForNegotiation'),
+            LazyImport('baselines.DDQL.model.DDQLModel'),
+            LazyImport('baselines.DDQL.pipeline.DDQLPipelineForNegotiation'),
+            LazyImport('baselines.DDQL.trainer.DDQLTrainer')
+        ],
+        # envelope
+        ENVELOPE: [
+            ENVELOPE_CONFIG_PATH_FOR_NEGOTIATION,
+            LazyImport('baselines.Envelope.config.EnvelopeConfigForNegotiation'),
+            LazyImport('baselines.Envelope.model.EnvelopeModel'),
+            LazyImport('baselines.Envelope.pipeline.EnvelopePipelineForNegotiation'),
+            LazyImport('baselines.Envelope.trainer.EnvelopeTrainer')
+        ],
+        # RTCP model
+        RTCP: [
+            RTCP_CONFIG_PATH_FOR_NEGOTIATION,
+            LazyImport('baselines.RTCP.config.RTCPConfigForNegotiation'),
+            LazyImport('baselines.RTCP.model.RTCPModel'),
+            LazyImport('baselines.RTCP.pipeline.RTCPPipelineForNegotiation'),
+            LazyImport('baselines.RTCP.trainer.RTCPTrainer')
+        ],
+        # preference-enhanced model
+        # multi-objective dialogue policy learning
+        MODPL: [
+            MODPL_CONFIG_PATH_FOR_NEGOTIATION,
+            LazyImport('modpl.config.MODPLConfigForNegotiation'),
+            LazyImport('modpl.model.MODPLModel'),
+            LazyImport('modpl.pipeline.MODPLPiplineForNegotiation'),
+            LazyImport('modpl.trainer.MODPLTrainer')
+        ],
+        # contextual modpl for negotiation
+        CONTEXTUAL_MODPL: [
+            CONTEXTUAL_MODPL_CONFIG_PATH_FOR_NEGOTIATION,
+            LazyImport('modpl_new_ver2.config.ContextualMODPLConfigForNegotiation'),
+            LazyImport('modpl_new_ver2.model.ContextualMODPLModel'),
+            LazyImport('modpl_new_ver2.pipeline.ContextualMODPLPipelineForNegotiation'),
+            LazyImport('modpl_new_ver2.trainer.ContextualMODPLTrainer')
+        ],
+        # Set max PADPP
+        SMP_PADPP: [
+            SMP_PADPP_CONFIG_PATH_FOR_NEGOTIATION,
+            LazyImport('baselines.PADPP_smp.config.SetMaxPADPPConfigForNegotiation'),
+            LazyImport('baselines.PADPP_smp.model.SetMaxPADPPModel'),
+            LazyImport('baselines.PADPP_smp.pipeline.SetMaxPADPPPipelineForNegotiation'),
+            LazyImport('baselines.PADPP_smp.trainer.SetMaxPADPPTrainer')
+        ],
+        # Min dist PADPP
+        MIN_DIST_PADPP: [
+            MIN_DIST_PADPP_CONFIG_PATH_FOR_NEGOTIATION,
+            LazyImport('baselines.PADPP_min_dist.config.MinDistPADPPConfigForNegotiation'),
+            LazyImport('baselines.PADPP_min_dist.model.MinDistPADPPModel'),
+            LazyImport('baselines.PADPP_min_dist.pipeline.MinDistPADPPPipelineForNegotiation'),
+            LazyImport('baselines.PADPP_min_dist.trainer.MinDistPADPPTrainer')
+        ],
+
+        # proactive chain of though (ProCOT) for negotiation
+        PRO_COT: [
+            PRO_COT_CONFIG_PATH,
+            LazyImport('baselines.ProCOT.config.ProCOTConfigForNegotiation'),
+            LazyImport('baselines.ProCOT.model.ProCOTModel'),
+            LazyImport('baselines.ProCOT.pipeline.ProCOTPipelineForNegotiation'),
+            LazyImport('baselines.ProCOT.trainer.ProCOTTrainer')
+        ],
+        # standard prompting for negotiation
+        STANDARD: [
+            STANDARD_CONFIG_PATH,
+            LazyImport('baselines.Standard.config.StandardPromptConfigForNegotiation'),
+            LazyImport('baselines.Standard.model.StandardPromptModel'),
+            LazyImport('baselines.Standard.pipeline.StandardPromptPipelineForNegotiation'),
+            LazyImport('baselines.Standard.trainer.StandardPromptTrainer')
+        ],
+        # ICL_AIF for negotiation
+        ICL_AIF: [
+            ICL_AIF_CONFIG_PATH,
+            LazyImport('baselines.ICL_AIF.config.ICLAIFConfigForNegotiation'),
+            LazyImport('baselines.ICL_AIF.model.ICLAIFModel'),
+            LazyImport('baselines.ICL_AIF.pipeline.ICLAIFPipelineForNegotiation'),
+            LazyImport('baselines.ICL_AIF.trainer.ICLAIFTrainer')
+        ],
+        # Proactive prompting for negotiation
+        PROACTIVE: [
+            PROACTIVE_CONFIG_PATH,
+            LazyImport('baselines.Proactive.config.ProactiveConfigForNegotiation'),
+            LazyImport('baselines.Proactive.model.ProactiveModel'),
+            LazyImport('baselines.Proactive.pipeline.ProactivePipelineForNegotiation'),
+            LazyImport('baselines.Proactive.trainer.ProactiveTrainer')
+        ],
+        # Ask-an-expert for negotiation
+        ANE: [
+            ANE_CONFIG_PATH,
+            LazyImport('baselines.AnE.config.AnEConfigForNegotiation'),
+            LazyImport('baselines.AnE.model.AnEModel'),
+            LazyImport('baselines.AnE.pipeline.AnEPipelineForNegotiation'),
+            LazyImport('baselines.AnE.trainer.AnETrainer')
+        ],
+        # GDP-Zero for negotiation
+        GDP_ZERO: [
+            GDP_ZERO_CONFIG_PATH_FOR_NEGOTIATION,
+            LazyImport('baselines.GDP_Zero.config.GDPZeroConfigForNegotiation'),
+            LazyImport('baselines.GDP_Zero.model.GDPZeroModel'),
+            LazyImport('baselines.GDP_Zero.pipeline.GDPZeroPipelineForNegotiation'),
+            LazyImport('baselines.GDP_Zero.trainer.GDPZeroTrainer')
+        ]
+    },
+    EMOTIONAL_SUPPORT: {
+        # PPDPP model
+        PPDPP: [
+            PPDPP_CONFIG_PATH_FOR_EMOTIONAL_SUPPORT,
+            LazyImport('baselines.PPDPP.config.PPDPPConfigForEmotionalSupport'),
+            LazyImport('baselines.PPDPP.model.PPDPPModel'),
+            LazyImport('baselines.PPDPP.pipeline.PPDPPPipelineForEmotionalSupport'),
+            LazyImport('baselines.PPDPP.trainer.PPDPPTrainer')
+        ],
+        # RTCP model
+        RTCP: [
+            RTCP_CONFIG_PATH_FOR_EMOTIONAL_SUPPORT,
+            LazyImport('baselines.RTCP.config.RTCPConfigForEmotionalSupport'),
+            LazyImport('baselines.RTCP.model.RTCPModel'),
+            LazyImport('baselines.RTCP.pipeline.RTCPPipelineForEmotionalSupport'),
+            LazyImport('baselines.RTCP.trainer.RTCPTrainer')
+        ],
+        # multi-objective dialogue policy learning
+        MODPL: [
+            MODPL_CONFIG_PATH_FOR_EMOTIONAL_SUPPORT,
+            LazyImport('modpl.config.MODPLConfigForEmotionalSupport'),
+            LazyImport('modpl.model.MODPLModel'),
+            LazyImport('modpl.pipeline.MODPLPiplineForEmotionalSupport'),
+            LazyImport('modpl.trainer.MODPLTrainer')
+        ],
+        # contextual modpl for emotional support conversation
+        CONTEXTUAL_MODPL: [
+            CONTEXTUAL_MODPL_CONFIG_PATH_FOR_EMOTIONAL_SUPPORT,
+            LazyImport('modpl_new_ver2.config.ContextualMODPLConfigForEmotionalSupport'),
+            LazyImport('modpl_new_ver2.model.ContextualMODPLModel'),
+            LazyImport('modpl_new_ver2.pipeline.ContextualMODPLPipelineForEmotionalSupport'),
+            LazyImport('modpl_new_ver2.trainer.ContextualMODPLTrainer')
+        ],
+        # Proactive chain of thought for emotional support conversation
+        PRO_COT: [
+            PRO_COT_CONFIG_PATH,
+            LazyImport('baselines.ProCOT.config.ProCOTConfigForEmotionalSupport'),
+            LazyImport('baselines.ProCOT.model.ProCOTModel'),
+            LazyImport('baselines.ProCOT.pipeline.ProCOTPipelineForEmotionalSupport'),
+            LazyImport('baselines.ProCOT.trainer.ProCOTTrainer')
+        ],
+
+        # Standard prompting for emotional support
+        STANDARD: [
+            STANDARD_CONFIG_PATH,
+            LazyImport('baselines.Standard.config.StandardPromptConfigForEmotionalSupport'),
+            LazyImport('baselines.Standard.model.StandardPromptModel'),
+            LazyImport('baselines.Standard.pipeline.StandardPromptPipelineForEmotionalSupport'),
+            LazyImport('baselines.Standard.trainer.StandardPromptTrainer')
+        ],
+        # ICL_AIF for emotional support conversation
+        ICL_AIF: [
+            ICL_AIF_CONFIG_PATH,
+            LazyImport('baselines.ICL_AIF.config.ICLAIFConfigForEmotionalSupport'),
+            LazyImport('baselines.ICL_AIF.model.ICLAIFModel'),
+            LazyImport('baselines.ICL_AIF.pipeline.ICLAIFPipelineForEmotionalSupport'),
+            LazyImport('baselines.ICL_AIF.trainer.ICLAIFTrainer')
+        ],
+        # Proactive prompting for emotional support
+        PROACTIVE: [
+            PROACTIVE_CONFIG_PATH,
+            LazyImport('baselines.Proactive.config.ProactiveConfigForEmotionalSupport'),
+            LazyImport('baselines.Proactive.model.ProactiveModel'),
+            LazyImport('baselines.Proactive.pipeline.ProactivePipelineForEmotionalSupport'),
+            LazyImport('baselines.Proactive.trainer.ProactiveTrainer')
+        ],
+        # Ask an Expert for emotional support
+        ANE: [
+            ANE_CONFIG_PATH,
+            LazyImport('baselines.AnE.config.AnEConfigForEmotionalSupport'),
+            LazyImport('baselines.AnE.model.AnEModel'),
+            LazyImport('baselines.AnE.pipeline.AnEPipelineForEmotionalSupport'),
+            LazyImport('baselines.AnE.trainer.AnETrainer')
+        ],
+        # GDP_Zero for emotional support
+        GDP_ZERO: [
+            GDP_ZERO_CONFIG_PATH_FOR_EMOTIONAL_SUPPORT,
+            LazyImport('baselines.GDP_Zero.config.GDPZeroConfigForEmotionalSupport'),
+            LazyImport('baselines.GDP_Zero.model.GDPZeroModel'),
+            LazyImport('baselines.GDP_Zero.pipeline.GDPZeroPipelineForEmotionalSupport'),
+            LazyImport('baselines.GDP_Zero.trainer.GDPZeroTrainer')
+
+        ]
+    }
+}
+
+# text generation models
+GENERATION_REGISTRY = {
+    RECOMMENDATION: {
+        BART_GENERATION: [
+            BART_GENERATION_CONFIG_PATH,
+            LazyImport('text_gen.bart_generation.BARTGenerationConfig'),
+            LazyImport('text_gen.bart_generation.BARTModelForGeneration'),
+            LazyImport('text_gen.bart_generation.BARTTrainerForGeneration'),
+            LazyImport('text_gen.bart_generation.BARTPipelineForGeneration'),
+            LazyImport('text_gen.bart_generation.BARTGeneration'),
+        ],
+        CHATGPT: [
+            CHATGPT_GENERATION_CONFIG_PATH,
+            CHATGPT_PROMPT_FOR_RECOMMENDATION,
+            LazyImport('text_gen.chatgpt_generation.ChatGPTConfigForGeneration'),
+            LazyImport('text_gen.chatgpt_generation.ChatGPTGeneration')
+        ],
+        VICUNA: [
+            VICUNA_GENERATION_CONFIG_PATH,
+            VICUNA_PROMPT_FOR_RECOMMENDATION,
+            LazyImport('text_gen.vicuna_generation.VicunaGenerationConfig'),
+            LazyImport('text_gen.vicuna_generation.VicunaGeneration')
+        ],
+        LLAMA3: [
+            LLAMA3_GENERATION_CONFIG_PATH,
+            LLAMA3_PROMPT_FOR_RECOMMENDATION,
+            LazyImport('text_gen.llama3_generation.Llama3ConfigForGeneration'),
+            LazyImport('text_gen.llama3_generation.Llama3Generation')
+        ]
+    },
+    NEGOTIATION: {
+        BART_GENERATION: [
+            BART_GENERATION_CONFIG_PATH,
+            LazyImport('text_gen.bart_generation.BARTGenerationConfig'),
+            LazyImport('text_gen.bart_generation.BARTModelForGeneration'),
+            LazyImport('text_gen.bart_generation.BARTTrainerForGeneration'),
+            LazyImport('text_gen.bart_generation.BARTPipelineForGeneration'),
+            LazyImport('text_gen.bart_generation.BARTGeneration'),
+
+        ],
+        CHATGPT: [
+            CHATGPT_GENERATION_CONFIG_PATH,
+            CHATGPT_PROMPT_FOR_NEGOTIATION,
+            LazyImport('text_gen.chatgpt_generation.ChatGPTConfigForGeneration'),
+            LazyImport('text_gen.chatgpt_generation.ChatGPTGeneration')
+        ],
+        VICUNA: [
+            VICUNA_GENERATION_CONFIG_PATH,
+            VICUNA_PROMPT_FOR_NEGOTIATION,
+            LazyImport('text_gen.vicuna_generation.VicunaGenerationConfig'),
+            LazyImport('text_gen.vicuna_generation.VicunaGeneration')
+        ],
+        LLAMA3: [
+            LLAMA3_GENERATION_CONFIG_PATH,
+            LLAMA3_PROMPT_FOR_NEGOTIATION,
+            LazyImport('text_gen.llama3_generation.Llama3ConfigForGeneration'),
+            LazyImport('text_gen.llama3_generation.Llama3Generation')
+        ]
+    },
+    EMOTIONAL_SUPPORT: {
+        BART_GENERATION: [
+            BART_GENERATION_CONFIG_PATH,
+            LazyImport('text_gen.bart_generation.BARTGenerationConfig'),
+            LazyImport('text_gen.bart_generation.BARTModelForGeneration'),
+            LazyImport('text_gen.bart_generation.BARTTrainerForGeneration'),
+            LazyImport('text_gen.bart_generation.BARTPipelineForGeneration'),
+            LazyImport('text_gen.bart_generation.BARTGeneration'),
+
+        ],
+        CHATGPT: [
+            CHATGPT_GENERATION_CONFIG_PATH,
+            CHATGPT_PROMPT_FOR_EMOTIONAL_SUPPORT,
+            LazyImport('text_gen.chatgpt_generation.ChatGPTConfigForGeneration'),
+            LazyImport('text_gen.chatgpt_generation.ChatGPTGeneration')
+        ],
+        VICUNA: [
+            VICUNA_GENERATION_CONFIG_PATH,
+            VICUNA_PROMPT_FOR_EMOTIONAL_SUPPORT,
+            LazyImport('text_gen.vicuna_generation.VicunaGenerationConfig'),
+            LazyImport('text_gen.vicuna_generation.VicunaGeneration')
+        ],
+        LLAMA3: [
+            LLAMA3_GENERATION_CONFIG_PATH,
+            LLAMA3_PROMPT_FOR_EMOTIONAL_SUPPORT,
+            LazyImport('text_gen.llama3_generation.Llama3ConfigForGeneration'),
+            LazyImport('text_gen.llama3_generation.Llama3Generation')
+        ]
+    }
+}
 
 
 def set_seed(seed):
@@ -230,6 +526,8 @@ def parse_args():
     parser.add_argument("--gen_models", type=str, default='bart', help="names of models")
     parser.add_argument("--metrics", type=str, help="names of metrics")
     parser.add_argument('--overwrite_sim', action='store_true', help='if we overwrite the saved user simulators')
+    parser.add_argument("--snapshot_dir", type=str, default="", help="the directory of the processed dataset snapshots")
+    parser.add_argument('--overwrite_snapshot', action='store_true', help='if we overwrite the saved dataset snapshot')
     
     # arguments fro recommendation training
     parser.add_argument("--domain", default = 'movie', type=str, help="the name of the domain of consideration")
@@ -347,403 +645,18 @@ def get_datasets_by_names(scenario, dataset_names):
     :param dataset_names: a list containing the names of datasets
     :return: a list of dataset classes and their configuration file path.
     """
-    # pre-processing for coding convenience
-    if not isinstance(dataset_names, list):
-        dataset_names = [dataset_names]
-
-    if scenario == RECOMMENDATION:
-        dataset_dict = {
-            DURECDIAL: [
-                DURECDIAL_CONFIG_PATH,
-                DuRecdial,
-                DatasetConfigForRecommendation
-
-            ],
-            INSPIRED: [
-                INSPIRED_CONFIG_PATH,
-                Inspired,
-                DatasetConfigForRecommendation
-            ]
-        }
-        # collecting datasets
-        datasets = []
-        for name in dataset_names:
-            datasets.append(dataset_dict[name])
-        return datasets
-    # negotiation scenario
-    elif scenario == NEGOTIATION:
-        dataset_dict = {
-            CRAIGSLIST_BARGAIN: [
-                CRAIGSLIST_BARGAIN_CONFIG_PATH,
-                CraiglistBargain,
-                DatasetConfigForNegotiation
-            ]
-        }
-        # collecting datasets
-        datasets = []
-        for name in dataset_names:
-            datasets.append(dataset_dict[name])
-        return datasets
-    # emotional support scenario
-    elif scenario == EMOTIONAL_SUPPORT:
-        dataset_dict = {
-            ES_CONV: [
-                ES_CONV_CONFIG_PATH,
-                ESConv,
-                DatasetConfigForEmotionalSupport
-            ]
-        }
-        # collecting datasets
-        datasets = []
-        for name in dataset_names:
-            datasets.append(dataset_dict[name])
-        return datasets
-    else:
-        raise Exception("Invalid scenario !!!")
+    return lookup_registry(DATASET_REGISTRY, scenario, dataset_names)
 
 
 def get_model_by_names(scenario, model_names):
     """
     function that returns a set of models by their names
+    only the modules of the requested models are imported
     :param scenario: the scenario we are considering
     :param model_names: a list of model names
     :return: a list of model classes
     """
-    # pre-processing for coding convenience
-    if not isinstance(model_names, list):
-        model_names = [model_names]
-    # recommendation scenario
-    if scenario == RECOMMENDATION:
-        model_dict = {
-            BERT: [
-                BERT_CONFIG_PATH,
-                BERTConfig,
-                BERTModel,
-                BERTPipelineForRecommendation,
-                BERTTrainer,
-            ],
-            BART: [
-                BART_CONFIG_PATH,
-                BARTConfig,
-                BARTModel,
-                BARTPipelineForRecommendation,
-                BARTTrainer,
-            ],
-            # PPDPP model
-            PPDPP: [
-                PPDPP_CONFIG_PATH_FOR_RECOMMENDATION,
-                PPDPPConfigForRecommendation,
-                PPDPPModel,
-                PPDPPPipelineForRecommendation,
-                PPDPPTrainer
-            ],
-            # DPDP 
-            DPDP: [
-                DPDP_CONFIG_PATH_FOR_RECOMMENDATION,
-                DPDPConfigForRecommendation,
-                DPDPModel,
-                DPDPPipelineForRecommendation,
-                DPDPTrainer
-            ],
-            # TRIP model
-            TRIP: [
-                TRIP_CONFIG_PATH_FOR_RECOMMENDATION,
-                TRIPConfigForRecommendation,
-                TRIPModel,
-                TRIPPipelineForRecommendation,
-                TRIPTrainer
-            ],
-            # unimind model
-            UNIMIND: [
-                UNIMIND_CONFIG_PATH_FOR_RECOMMENDATION,
-                UNIMINDConfigForRecommendation,
-                UNIMINDModel,
-                UNIMINDPipelineForRecommendation,
-                UNIMINDTrainer
-            ],
-            # color model
-            COLOR: [
-                COLOR_CONFIG_PATH_FOR_RECOMMENDATION,
-                COLORConfigForRecommendation,
-                COLORModel,
-                COLORPipelineForRecommendation,
-                COLORTrainer
-            ],
-            # RTCP model
-            RTCP: [
-                RTCP_CONFIG_PATH_FOR_RECOMMENDATION,
-                RTCPConfigForRecommendation,
-                RTCPModel,
-                RTCPPipelineForRecommendation,
-                RTCPTrainer
-            ],
-            # preference-enhanced model
-            MODPL: [
-                MODPL_CONFIG_PATH_FOR_RECOMMENDATION,
-                MODPLConfigForRecommendation,
-                MODPLModel,
-                MODPLPipelineForRecommendation,
-                MODPLTrainer
-            ],
-            # contextual MODPL
-            CONTEXTUAL_MODPL: [
-                CONTEXTUAL_MODPL_CONFIG_PATH_FOR_RECOMMENDATION,
-                ContextualMODPLConfigForRecommendation,
-                ContextualMODPLModel,
-                ContextualMODPLPipelineForRecommendation,
-                ContextualMODPLTrainer
-            ],
-            # DDQL
-            DDQL: [
-                DDQL_CONFIG_PATH_FOR_RECOMMENDATION,
-                DDQLConfigForRecommendation,
-                DDQLModel,
-                DDQLPipelineForRecommendation,
-                DDQLTrainer
-            ]
-
-        }
-        # collect model packages
-        models = []
-        for name in model_names:
-            models.append(model_dict[name])
-        return models
-    # the negotiation scenario
-    # remember to change the model class to negotiation
-    elif scenario == NEGOTIATION:
-        model_dict = {
-            # PPDPP model
-            PPDPP: [
-                PPDPP_CONFIG_PATH_FOR_NEGOTIATION,
-                PPDPPConfigForNegotiation,
-                PPDPPModel,
-                PPDPPPipelineForNegotiation,
-                PPDPPTrainer
-            ],
-            # trip
-            TRIP: [
-                TRIP_CONFIG_PATH_FOR_NEGOTIATION,
-                TRIPConfigForNegotiation,
-                TRIPModel,
-                TRIPPipelineForNegotiation,
-                TRIPTrainer
-            ],
-            # DPDP 
-            DPDP: [
-                DPDP_CONFIG_PATH_FOR_NEGOTIATION,
-                DPDPConfigForNegotiation,
-                DPDPModel,
-                DPDPPipelineForNegotiation,
-                DPDPTrainer
-            ],
-            # ddql
-            DDQL: [
-                DDQL_CONFIG_PATH_FOR_NEGOTIATION,
-                DDQLConfigForNegotiation,
-                DDQLModel,
-                DDQLPipelineForNegotiation,
-                DDQLTrainer
-            ],
-            # envelope
-            ENVELOPE: [
-                ENVELOPE_CONFIG_PATH_FOR_NEGOTIATION,
-                EnvelopeConfigForNegotiation,
-                EnvelopeModel,
-                EnvelopePipelineForNegotiation,
-                EnvelopeTrainer
-            ],
-            # RTCP model
-            RTCP: [
-                RTCP_CONFIG_PATH_FOR_NEGOTIATION,
-                RTCPConfigForNegotiation,
-                RTCPModel,
-                RTCPPipelineForNegotiation,
-                RTCPTrainer
-            ],
-            # preference-enhanced model
-            # multi-objective dialogue policy learning
-            MODPL: [
-                MODPL_CONFIG_PATH_FOR_NEGOTIATION,
-                MODPLConfigForNegotiation,
-                MODPLModel,
-                MODPLPiplineForNegotiation,
-                MODPLTrainer
-            ],
-            # contextual modpl for negotiation
-            CONTEXTUAL_MODPL: [
-                CONTEXTUAL_MODPL_CONFIG_PATH_FOR_NEGOTIATION,
-                ContextualMODPLConfigForNegotiation,
-                ContextualMODPLModel,
-                ContextualMODPLPipelineForNegotiation,
-                ContextualMODPLTrainer
-            ],
-            # Set max PADPP
-            SMP_PADPP: [
-                SMP_PADPP_CONFIG_PATH_FOR_NEGOTIATION,
-                SetMaxPADPPConfigForNegotiation,
-                SetMaxPADPPModel,
-                SetMaxPADPPPipelineForNegotiation,
-                SetMaxPADPPTrainer
-            ],   
-            # Min dist PADPP
-            MIN_DIST_PADPP: [
-                MIN_DIST_PADPP_CONFIG_PATH_FOR_NEGOTIATION,
-                MinDistPADPPConfigForNegotiation,
-                MinDistPADPPModel,
-                MinDistPADPPPipelineForNegotiation,
-                MinDistPADPPTrainer
-            ],
-            
-            # proactive chain of though (ProCOT) for negotiation
-            PRO_COT: [
-                PRO_COT_CONFIG_PATH,
-                ProCOTConfigForNegotiation,
-                ProCOTModel,
-                ProCOTPipelineForNegotiation,
-                ProCOTTrainer
-            ],
-            # standard prompting for negotiation
-            STANDARD: [
-                STANDARD_CONFIG_PATH,
-                StandardPromptConfigForNegotiation,
-                StandardPromptModel,
-                StandardPromptPipelineForNegotiation,
-                StandardPromptTrainer
-            ],
-            # ICL_AIF for negotiation
-            ICL_AIF: [
-                ICL_AIF_CONFIG_PATH,
-                ICLAIFConfigForNegotiation,
-                ICLAIFModel,
-                ICLAIFPipelineForNegotiation,
-                ICLAIFTrainer
-            ],
-            # Proactive prompting for negotiation
-            PROACTIVE: [
-                PROACTIVE_CONFIG_PATH,
-                ProactiveConfigForNegotiation,
-                ProactiveModel,
-                ProactivePipelineForNegotiation,
-                ProactiveTrainer
-            ],
-            # Ask-an-expert for negotiation
-            ANE: [
-                ANE_CONFIG_PATH,
-                AnEConfigForNegotiation,
-                AnEModel,
-                AnEPipelineForNegotiation,
-                AnETrainer
-            ],
-            # GDP-Zero for negotiation
-            GDP_ZERO: [
-                GDP_ZERO_CONFIG_PATH_FOR_NEGOTIATION,
-                GDPZeroConfigForNegotiation,
-                GDPZeroModel,
-                GDPZeroPipelineForNegotiation,
-                GDPZeroTrainer
-            ]
-        }
-
-        # collect model packages
-        models = []
-        for name in model_names:
-            models.append(model_dict[name])
-        return models
-    # emotional support conversation
-    elif scenario == EMOTIONAL_SUPPORT:
-        model_dict = {
-            # PPDPP model
-            PPDPP: [
-                PPDPP_CONFIG_PATH_FOR_EMOTIONAL_SUPPORT,
-                PPDPPConfigForEmotionalSupport,
-                PPDPPModel,
-                PPDPPPipelineForEmotionalSupport,
-                PPDPPTrainer
-            ],
-            # RTCP model
-            RTCP: [
-                RTCP_CONFIG_PATH_FOR_EMOTIONAL_SUPPORT,
-                RTCPConfigForEmotionalSupport,
-                RTCPModel,
-                RTCPPipelineForEmotionalSupport,
-                RTCPTrainer
-            ],
-            # multi-objective dialogue policy learning
-            MODPL: [
-                MODPL_CONFIG_PATH_FOR_EMOTIONAL_SUPPORT,
-                MODPLConfigForEmotionalSupport,
-                MODPLModel,
-                MODPLPiplineForEmotionalSupport,
-                MODPLTrainer
-            ],
-            # contextual modpl for emotional support conversation
-            CONTEXTUAL_MODPL: [
-                CONTEXTUAL_MODPL_CONFIG_PATH_FOR_EMOTIONAL_SUPPORT,
-                ContextualMODPLConfigForEmotionalSupport,
-                ContextualMODPLModel,
-                ContextualMODPLPipelineForEmotionalSupport,
-                ContextualMODPLTrainer
-            ],
-            # Proactive chain of thought for emotional support conversation
-            PRO_COT: [
-                PRO_COT_CONFIG_PATH,
-                ProCOTConfigForEmotionalSupport,
-                ProCOTModel,
-                ProCOTPipelineForEmotionalSupport,
-                ProCOTTrainer
-            ],
-
-            # Standard prompting for emotional support
-            STANDARD: [
-                STANDARD_CONFIG_PATH,
-                StandardPromptConfigForEmotionalSupport,
-                StandardPromptModel,
-                StandardPromptPipelineForEmotionalSupport,
-                StandardPromptTrainer
-            ],
-            # ICL_AIF for emotional support conversation
-            ICL_AIF: [
-                ICL_AIF_CONFIG_PATH,
-                ICLAIFConfigForEmotionalSupport,
-                ICLAIFModel,
-                ICLAIFPipelineForEmotionalSupport,
-                ICLAIFTrainer
-            ],
-            # Proactive prompting for emotional support
-            PROACTIVE: [
-                PROACTIVE_CONFIG_PATH,
-                ProactiveConfigForEmotionalSupport,
-                ProactiveModel,
-                ProactivePipelineForEmotionalSupport,
-                ProactiveTrainer
-            ],
-            # Ask an Expert for emotional support
-            ANE: [
-                ANE_CONFIG_PATH,
-                AnEConfigForEmotionalSupport,
-                AnEModel,
-                AnEPipelineForEmotionalSupport,
-                AnETrainer
-            ],
-            # GDP_Zero for emotional support
-            GDP_ZERO: [
-                GDP_ZERO_CONFIG_PATH_FOR_EMOTIONAL_SUPPORT,
-                GDPZeroConfigForEmotionalSupport,
-                GDPZeroModel,
-                GDPZeroPipelineForEmotionalSupport,
-                GDPZeroTrainer
-
-            ]
-        }
-
-        # collect model packages
-        models = []
-        for name in model_names:
-            models.append(model_dict[name])
-        return models
-
-    else:
-        raise Exception("Invalid scenario !!!")
+    return lookup_registry(MODEL_REGISTRY, scenario, model_names)
 
 
 def get_metrics_by_names(scenario, metric_names):
@@ -753,6 +666,10 @@ def get_metrics_by_names(scenario, metric_names):
     :param metric_names: a list contains metric's names
     :return: two lists which are offline and online metrics
     """
+    # metrics for evaluation
+    from eval.metric import Accuracy, PrecisionRecallF1, Item_Freq, SR, OfflineMetric, OnlineMetric, DistN, \
+        AverageTurn, RougeN, BleuN, Fairness, SL_Ratio, Toxicity, User_Reward
+
     # recommendation scenario
     if scenario == RECOMMENDATION:
         metric_dict = {
@@ -873,6 +790,12 @@ def get_scenario_by_name(name):
     :param name: the name of the scenario
     :return: a list of config file path and config class
     """
+    # games and user simulators
+    from base.game import RecommendationGame, NegotiationGame, EmotionalSupportGame
+    from simulator.rec_simulator import RecommendationSimulator
+    from simulator.neg_simulator import NegotiationSimulator
+    from simulator.es_simulator import EmotionalSupportSimulator
+
     # target-driven recommendation
     if name == RECOMMENDATION:
         return [RECOMMENDATION_CONFIG_PATH, RecommendationGameConfig, RecommendationGame, RecommendationSimulator]
@@ -894,6 +817,11 @@ def get_loggers_by_names(names, **kwargs):
     :param kwargs: keywords arguments
     :return: list of loggers
     """
+    # loggers
+    from logger.file_logger import FileLogger
+    from logger.terminal_logger import TerminalLogger
+    from logger.wandb_logger import WanDBLogger
+
     # pre-processing for coding convenience
     if not isinstance(names, list):
         names = [names]
@@ -923,169 +851,122 @@ def get_text_generation_model_by_name(scenario, names):
     :param names: the names of the generation model
     :return:
     """
-    # pre-processing for coding convenience
-    if not isinstance(names, list):
-        names = [names]
-    # recommendation scenario
-    if scenario == RECOMMENDATION:
-        generation_dict = {
-            BART_GENERATION: [
-                BART_GENERATION_CONFIG_PATH,
-                BARTGenerationConfig,
-                BARTModelForGeneration,
-                BARTTrainerForGeneration,
-                BARTPipelineForGeneration,
-                BARTGeneration,
-            ],
-            CHATGPT: [
-                CHATGPT_GENERATION_CONFIG_PATH,
-                CHATGPT_PROMPT_FOR_RECOMMENDATION,
-                ChatGPTConfigForGeneration,
-                ChatGPTGeneration
-            ],
-            VICUNA: [
-                VICUNA_GENERATION_CONFIG_PATH,
-                VICUNA_PROMPT_FOR_RECOMMENDATION,
-                VicunaGenerationConfig,
-                VicunaGeneration
-            ],
-            LLAMA3: [
-                LLAMA3_GENERATION_CONFIG_PATH,
-                LLAMA3_PROMPT_FOR_RECOMMENDATION,
-                Llama3ConfigForGeneration,
-                Llama3Generation
-            ]
-        }
-        # a list contains generation packages
-        generation_packages = []
-
-        # loop over text generation names
-        for name in names:
-            package = generation_dict[name]
-            generation_packages.append(package)
-
-        # return the generaton packages
-        return generation_packages
-
-    # negotiation dialogue
-    elif scenario == NEGOTIATION:
-        generation_dict = {
-            BART_GENERATION: [
-                BART_GENERATION_CONFIG_PATH,
-                BARTGenerationConfig,
-                BARTModelForGeneration,
-                BARTTrainerForGeneration,
-                BARTPipelineForGeneration,
-                BARTGeneration,
-
-            ],
-            CHATGPT: [
-                CHATGPT_GENERATION_CONFIG_PATH,
-                CHATGPT_PROMPT_FOR_NEGOTIATION,
-                ChatGPTConfigForGeneration,
-                ChatGPTGeneration
-            ],
-            VICUNA: [
-                VICUNA_GENERATION_CONFIG_PATH,
-                VICUNA_PROMPT_FOR_NEGOTIATION,
-                VicunaGenerationConfig,
-                VicunaGeneration
-            ],
-            LLAMA3: [
-                LLAMA3_GENERATION_CONFIG_PATH,
-                LLAMA3_PROMPT_FOR_NEGOTIATION,
-                Llama3ConfigForGeneration,
-                Llama3Generation
-            ]
-        }
-        # a list contains generation packages
-        generation_packages = []
+    return lookup_registry(GENERATION_REGISTRY, scenario, names)
 
-        # loop over text generation names
-        for name in names:
-            package = generation_dict[name]
-            generation_packages.append(package)
 
-        # return the generaton packages
-        return generation_packages
-
-    # emotional support conversation
-    elif scenario == EMOTIONAL_SUPPORT:
-        generation_dict = {
-            BART_GENERATION: [
-                BART_GENERATION_CONFIG_PATH,
-                BARTGenerationConfig,
-                BARTModelForGeneration,
-                BARTTrainerForGeneration,
-                BARTPipelineForGeneration,
-                BARTGeneration,
-
-            ],
-            CHATGPT: [
-                CHATGPT_GENERATION_CONFIG_PATH,
-                CHATGPT_PROMPT_FOR_EMOTIONAL_SUPPORT,
-                ChatGPTConfigForGeneration,
-                ChatGPTGeneration
-            ],
-            VICUNA: [
-                VICUNA_GENERATION_CONFIG_PATH,
-                VICUNA_PROMPT_FOR_EMOTIONAL_SUPPORT,
-                VicunaGenerationConfig,
-                VicunaGeneration
-            ],
-            LLAMA3: [
-                LLAMA3_GENERATION_CONFIG_PATH,
-                LLAMA3_PROMPT_FOR_EMOTIONAL_SUPPORT,
-                Llama3ConfigForGeneration,
-                Llama3Generation
-            ]
-        }
-        # a list contains generation packages
-        generation_packages = []
-
-        # loop over text generation names
-        for name in names:
-            package = generation_dict[name]
-            generation_packages.append(package)
-
-        # return the generaton packages
-        return generation_packages
-    else:
-        raise Exception('Invalid Scenario ......')
+def save_pickle_atomically(obj, file_path):
+    """
+    function that pickles an object to a temporary file and moves it to the given path
+    so that an interrupted run never leaves a partially written file
+    :param obj: the object
+    :param file_path: the path to the file
+    :return: None
+    """
+    tmp_path = f"{file_path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(obj, f)
+    os.replace(tmp_path, file_path)
 
 
-def create_user_simulators(simulator_class, user_profiles, saved_filed_path=None):
+def create_user_simulators(simulator_class, user_profiles, saved_filed_path=None, batch_size=16, n_workers=4):
     """
     function that create a set of user simulators by using given user profiles and scenario name
+    the persona descriptions are generated concurrently in batched llm calls. the generated descriptions are
+    checkpointed to disk so that an interrupted run resumes from the missing profiles.
     :param simulator_class: the class of the user simulator
     :param user_profiles: list contain user profiles
     :param saved_filed_path: Saved file path
+    :param batch_size: the number of persona descriptions generated in one llm call
+    :param n_workers: the number of concurrent llm calls
     :return: a list of instances of simulators
     """
-    # create a set of simulators
-    user_simulators = []
+    from utils.prompt import call_llm_batch
+    from simulator.store import save_simulator_store, get_simulator_store_path
+
+    # the checkpoint is only valid for the same list of user profiles
+    profiles_key = hashlib.sha1(repr(user_profiles).encode("utf-8")).hexdigest()
+    checkpoint_path = f"{saved_filed_path}.partial" if saved_filed_path is not None else None
+    descriptions = {}
+    if checkpoint_path is not None and os.path.exists(checkpoint_path):
+        with open(checkpoint_path, 'rb') as f:
+            checkpoint = pickle.load(f)
+        if checkpoint['profiles_key'] == profiles_key:
+            descriptions = checkpoint['descriptions']
+            logger.info(f"Resuming from {len(descriptions)} generated persona descriptions ......")
+
+    remaining_ids = [i for i in range(len(user_profiles)) if i not in descriptions]
+    batches = [remaining_ids[i: i + batch_size] for i in range(0, len(remaining_ids), batch_size)]
+
+    # the llama3 pipeline already batches the prompts on a single device
+    if simulator_class.model_type == LLAMA3:
+        n_workers = 1
+
+    def generate(batch_ids):
+        prompts = [simulator_class.construct_persona_prompt(user_profiles[i]) for i in batch_ids]
+        outputs = call_llm_batch(prompts, n=1,
+                                 temperature=simulator_class.temperature,
+                                 max_token=simulator_class.max_description_tokens,
+                                 model_type=simulator_class.model_type)
+        return batch_ids, [output[0] for output in outputs]
+
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        futures = [executor.submit(generate, batch_ids) for batch_ids in batches]
+        for future in tqdm(as_completed(futures), total=len(futures)):
+            batch_ids, outputs = future.result()
+            descriptions.update(zip(batch_ids, outputs))
+            # checkpoint the generated descriptions
+            if checkpoint_path is not None:
+                save_pickle_atomically({'profiles_key': profiles_key, 'descriptions': descriptions}, checkpoint_path)
 
     # create a set of simulator based on sampled dev user profiles
-    for profile in tqdm(user_profiles):
-        simulator = simulator_class(profile)
+    user_simulators = []
+    for i, profile in enumerate(user_profiles):
+        simulator = simulator_class(profile, user_profile_description=descriptions[i])
         user_simulators.append(simulator)
 
-    # save the user simulators to file
+    # save the profiles and persona descriptions to the simulator store
     if saved_filed_path is not None:
-        with open(saved_filed_path, 'wb') as f:
-            pickle.dump(user_simulators, f)
+        save_simulator_store(get_simulator_store_path(saved_filed_path), simulator_class, user_profiles,
+                             [descriptions[i] for i in range(len(user_profiles))])
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
     return user_simulators
 
 
-def load_user_simulators(simulator_file_path):
+def user_simulators_exist(simulator_file_path):
+    """
+    function that checks if the user simulators have been created
+    :param simulator_file_path: the path to the simulator file
+    :return: True if the simulator store or a legacy pickle file exists
+    """
+    from simulator.store import get_simulator_store_path
+    return os.path.exists(get_simulator_store_path(simulator_file_path)) or os.path.exists(simulator_file_path)
+
+
+def load_user_simulators(simulator_file_path, simulator_class=None, model_type=None, use_persona=False):
     """
     function that load user simulators from file
+    the simulators are lazily created from the simulator store, legacy pickle files are still supported.
     :param simulator_file_path: the path to the simulator file
-    :return: a list of instances of simulators
+    :param simulator_class: the class of the user simulator
+    :param model_type: the llm model type of the simulators
+    :param use_persona: True if the simulators use the persona descriptions
+    :return: a sequence of instances of simulators
     """
+    from simulator.store import SimulatorStore, get_simulator_store_path
+    store_path = get_simulator_store_path(simulator_file_path)
+    if simulator_class is not None and os.path.exists(store_path):
+        return SimulatorStore(store_path, simulator_class, model_type=model_type, use_persona=use_persona)
+
     with open(simulator_file_path, 'rb') as f:
         user_simulators = pickle.load(f)
-        return user_simulators
+    for simulator in user_simulators:
+        # set the model type
+        if model_type is not None:
+            simulator.set_model_type(model_type)
+        # set the flag of using persona
+        simulator.is_using_persona(use_persona)
+    return user_simulators
 
 
 def read_results(file_path):